@@ -0,0 +1,97 @@
+"""品質スコア・データ完成度・項目別充足率の一括計算（1 件ずつのスカラー計算 / NumPy の列形式）
+
+    python -m benchmarks.bench_analytics [--size 50000] [--unique 3000]
+
+合成した応答を解析した結果に、欠損・空リスト・短い文字列・プレースホルダ・型違いなどの崩れを混ぜ、
+unique 件を繰り返して size 件にする。スカラー版（calculate_response_quality / calculate_completeness と
+safe_get による項目ごとの集計）と src.analytics の結果が完全に一致することを確かめ、所要時間を比べる。
+"""
+import argparse
+import copy
+import random
+import time
+
+import numpy as np
+
+from benchmarks.bench_codec import make_response, TOPICS
+from src import analytics
+from src.data_processing import (
+    calculate_completeness, calculate_response_quality, parse_agent_response, safe_get,
+)
+
+# 崩れ方の候補（パス, 置き換える値）。None はキーの削除
+DEGRADATIONS = [
+    ("company_profile", None), ("company_profile", "企業情報なし"), ("company_profile.official_name", "株式会社A"),
+    ("company_profile.business_overview", "データ取得中..."), ("industry_analysis", {}),
+    ("industry_analysis.industry_name", "調査実行中"), ("current_challenges", []),
+    ("focus_area_analysis.current_initiatives", None), ("focus_area_analysis", []), ("best_practices", ""),
+    ("market_trends.key_trends", {}), ("industry_metrics", 0), ("industry_voice", ""), ("market_trends", None),
+    ("industry_analysis.industry_name", 12345), ("company_profile.official_name", "ちょうど十一文字の会社名です"),
+]
+
+
+def degrade(result, rng):
+    for path, value in rng.sample(DEGRADATIONS, rng.randint(0, 4)):
+        *parents, key = path.split(".")
+        node = result
+        for parent in parents:
+            node = node.get(parent) if isinstance(node, dict) else None
+        if not isinstance(node, dict):
+            continue
+        if value is None:
+            node.pop(key, None)
+        else:
+            node[key] = copy.deepcopy(value)
+    return result
+
+
+def make_results(size, unique, seed=0):
+    rng = random.Random(seed)
+    base = []
+    for index in range(unique):
+        result = parse_agent_response(make_response(rng, index), f"株式会社サンプル{index:05d}", rng.choice(TOPICS))
+        base.append(degrade(result, rng))
+    return [base[index % unique] for index in range(size)]
+
+
+def scalar_scores(results):
+    scores = [calculate_response_quality(result) for result in results]
+    completed = [calculate_completeness(result) for result in results]
+    filled = {field: sum(1 for result in results if safe_get(result, field, None)) for field in analytics.FIELDS}
+    return scores, completed, {field: count / len(results) for field, count in filled.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--unique", type=int, default=3000)
+    args = parser.parse_args()
+
+    results = make_results(args.size, args.unique)
+    print(f"{len(results)} 件（異なる結果 {args.unique} 件）")
+
+    started = time.perf_counter()
+    scores, completed, rates = scalar_scores(results)
+    scalar_sec = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matrix = analytics.flatten_results(results)
+    flatten_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    batch_scores = analytics.quality_scores(matrix)
+    batch_completed = analytics.completeness(matrix)
+    batch_rates = analytics.fill_rates(matrix)
+    compute_sec = time.perf_counter() - started
+
+    assert batch_scores.tolist() == scores, "品質スコアがスカラー版と一致しません"
+    assert batch_completed.tolist() == completed, "データ完成度がスカラー版と一致しません"
+    assert all(abs(batch_rates[field] - rates[field]) < 1e-12 for field in analytics.FIELDS), "充足率が一致しません"
+    values, counts = np.unique(batch_scores, return_counts=True)
+    print("  スカラー版と一致（スコアの分布: " + ", ".join(f"{v:g}: {c}" for v, c in zip(values, counts)) + "）")
+    print(f"  スカラー版        {scalar_sec * 1000:8.1f} ms（{len(results) / scalar_sec:9,.0f} 件/秒）")
+    print(f"  列形式（展開込み） {(flatten_sec + compute_sec) * 1000:8.1f} ms（{len(results) / (flatten_sec + compute_sec):9,.0f} 件/秒）"
+          f"  展開 {flatten_sec * 1000:.1f} ms・集計 {compute_sec * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
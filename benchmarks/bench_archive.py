@@ -0,0 +1,72 @@
+"""調査結果アーカイブの検索ベンチマーク（数万件のレポート）
+
+    python -m benchmarks.bench_archive [--size 30000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_agent import SAMPLE_RESPONSE
+from src.archive import ResearchArchive
+from src.data_processing import parse_agent_response
+
+TOPICS = ["生成AI", "DX推進", "人材不足", "サプライチェーン", "脱炭素", "セキュリティ", "データ基盤", "海外展開"]
+ISSUES = ["の遅れ", "への対応", "の高度化", "コストの増大", "人材の確保", "ガバナンス整備"]
+
+
+def make_result(rng, base):
+    result = dict(base)
+    result["current_challenges"] = [
+        {"specific_issue": rng.choice(TOPICS) + rng.choice(ISSUES), "business_impact": "収益性に影響"}
+        for _ in range(3)
+    ]
+    result["raw_response"] = SAMPLE_RESPONSE + " " + " ".join(rng.choice(TOPICS) for _ in range(20))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=30_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = parse_agent_response(SAMPLE_RESPONSE, "サンプル株式会社", "生成AI活用状況")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = ResearchArchive(os.path.join(tmp_dir, "archive.db"))
+        started = time.perf_counter()
+        batch = []
+        for i in range(args.size):
+            batch.append((f"企業{i:05d}株式会社", rng.choice(TOPICS), make_result(rng, base)))
+            if len(batch) == 1000:
+                archive.save_many(batch)
+                batch = []
+        if batch:
+            archive.save_many(batch)
+        print(f"insert: {args.size} reports in {time.perf_counter() - started:.1f}s "
+              f"(fts={archive.fts_enabled}, db={os.path.getsize(archive.path) / 1e6:.0f}MB)")
+
+        cases = [
+            ("challenges", "生成AI"),
+            (None, "サプライチェーン"),
+            ("target", "企業01234"),
+            (None, "DX"),  # 3 文字未満 → LIKE フォールバック
+        ]
+        for field, query in cases:
+            timings = []
+            hits = 0
+            for _ in range(args.queries):
+                t0 = time.perf_counter()
+                hits = len(archive.search(query, field=field, limit=50))
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            print(f"search {query!r} field={field}: hits={hits} "
+                  f"median={statistics.median(timings):.2f}ms p95={timings[int(len(timings) * 0.95)]:.2f}ms")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""入力補完インデックスの構築時間・メモリ・検索レイテンシ
+
+    python -m benchmarks.bench_autocomplete [--size 1000000] [--queries 2000]
+
+カタカナ・漢字（読みがな付き）・英字の合成企業名 size 件でインデックスを作り、
+1〜4 文字の前方一致・ローマ字入力・1 文字違いのあいまい入力・完全一致（正規化名の解決）のレイテンシを測る。
+比較として、名前の一覧を先頭から走査する前方一致（従来の辞書走査に相当）も測る。
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from src.autocomplete import AutocompleteIndex, romaji_key, search_key
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワンガギグゲゴザジズゼゾダデドバビブベボパピプペポ"
+KANJI = [("三", "さん"), ("日", "にち"), ("本", "ほん"), ("東", "とう"), ("西", "にし"), ("北", "きた"), ("大", "だい"),
+         ("中", "なか"), ("山", "やま"), ("川", "かわ"), ("田", "た"), ("電", "でん"), ("新", "しん"), ("光", "ひかり"),
+         ("和", "わ"), ("海", "かい"), ("空", "くう"), ("産", "さん"), ("化", "か"), ("成", "せい")]
+SUFFIXES = [("商事", "しょうじ"), ("工業", "こうぎょう"), ("銀行", "ぎんこう"), ("電機", "でんき"), ("製薬", "せいやく"),
+            ("ホールディングス", "ほーるでぃんぐす"), ("", "")]
+LATIN = "abcdefghijklmnoprstuvwyz"
+
+
+def make_records(size, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for index in range(size):
+        kind = index % 3
+        if kind == 0:
+            name = "".join(rng.choices(KATAKANA, k=rng.randint(3, 7)))
+            records.append({"name": name + rng.choice(["", "", "株式会社"]), "aliases": [], "readings": []})
+        elif kind == 1:
+            parts = rng.choices(KANJI, k=rng.randint(2, 3))
+            suffix, suffix_reading = rng.choice(SUFFIXES)
+            records.append({
+                "name": "".join(part for part, _ in parts) + suffix,
+                "aliases": [],
+                "readings": ["".join(reading for _, reading in parts) + suffix_reading],
+            })
+        else:
+            name = "".join(rng.choices(LATIN, k=rng.randint(4, 9))).capitalize()
+            records.append({"name": name + rng.choice(["", " Inc.", " Corp."]), "aliases": [], "readings": []})
+    return records
+
+
+def typo(text, rng):
+    position = rng.randrange(len(text))
+    return text[:position] + text[position + 1:] if rng.random() < 0.5 else \
+        text[:position] + rng.choice(KATAKANA) + text[position + 1:]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (f"p50 {statistics.median(samples) * 1000:6.3f} ms  "
+            f"p99 {samples[int(len(samples) * 0.99) - 1] * 1000:6.3f} ms  max {samples[-1] * 1000:6.3f} ms")
+
+
+def timed(function, inputs):
+    samples = []
+    for value in inputs:
+        started = time.perf_counter()
+        function(value)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    records = make_records(args.size)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index = AutocompleteIndex(
+        (record["name"], [*record["aliases"], *record["readings"]], 1.0 + rng.random()) for record in records)
+    build_sec = time.perf_counter() - started
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    stats = index.stats()
+    print(f"{stats['names']:,} 件・キー {stats['keys']:,} 個: 構築 {build_sec:.1f}s、"
+          f"索引 {stats['index_bytes'] / 1e6:.0f}MB（構築時の RSS 増加 {peak / 1e6:.0f}MB）")
+
+    sample = rng.sample(records, args.queries)
+    katakana = [record["name"] for record in sample if record["name"][0] in KATAKANA and len(record["name"]) >= 3]
+    readings = [record["readings"][0] for record in sample if record["readings"]]
+    cases = {
+        "前方一致 1 文字": [name[:1] for name in katakana],
+        "前方一致 2〜4 文字": [name[:rng.randint(2, 4)] for name in katakana],
+        "ローマ字（読み）": [romaji_key(search_key(reading))[:5] for reading in readings],
+        "あいまい（1 文字違い）": [typo(name, rng) for name in katakana],
+        "完全一致の解決": [record["name"] for record in sample],
+    }
+    for label, inputs in cases.items():
+        function = index.canonical if label == "完全一致の解決" else index.suggest
+        samples = timed(function, inputs)
+        print(f"  {label:<14} {len(inputs):5d} 件  {percentiles(samples)}")
+
+    hits = sum(1 for name in katakana if any(s["name"] == name for s in index.suggest(typo(name, rng))))
+    print(f"  あいまい入力で元の名前が候補に入った割合: {hits / len(katakana):.0%}")
+
+    names = [record["name"] for record in records]
+    scan = lambda prefix: [name for name in names if search_key(name).startswith(prefix)][:8]
+    samples = timed(scan, [search_key(name[:2]) for name in katakana[:5]])
+    print(f"  参考: 全件走査の前方一致          {percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""バックフィル（再解析・再スコアリング）のスループット計測
+
+    python -m benchmarks.bench_backfill [--size 10000] [--workers N]
+
+JSON 形式とテキスト形式（テキスト抽出経路）の応答を半々で含むアーカイブを作り、
+src.backfill.backfill_archive で全件を再処理する。
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_agent import SAMPLE_RESPONSE
+from src.archive import ResearchArchive
+from src.backfill import backfill_archive
+
+TEXT_RESPONSE = (
+    "サンプル株式会社は1985年設立、従業員数は12,000人、売上高は3,500億円。"
+    "業界はIT・通信業界で、市場規模は2兆円。課題としてはDX人材の不足が挙げられる。"
+    "生成AI活用の取り組みでは業務効率30%改善を実現した。"
+) * 10
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "archive.db")
+        archive = ResearchArchive(path)
+        started = time.perf_counter()
+        batch = []
+        for i in range(args.size):
+            raw = SAMPLE_RESPONSE if rng.random() < 0.5 else TEXT_RESPONSE
+            batch.append((f"企業{i:06d}", "生成AI活用状況", {"raw_response": raw, "research_status": "completed"}))
+            if len(batch) == 1000:
+                archive.save_many(batch)
+                batch = []
+        if batch:
+            archive.save_many(batch)
+        archive.close()
+        print(f"setup: {args.size} reports in {time.perf_counter() - started:.1f}s")
+
+        stats = backfill_archive(path, chunk_size=args.chunk_size, max_workers=args.workers)
+        print(f"backfill: {stats['processed']} reports, {len(stats['failed'])} failed, "
+              f"{stats['elapsed_sec']:.1f}s, {stats['per_second']:.0f}/s, workers={stats['workers']}")
+        print(f"estimated time for 100k: {100_000 / max(stats['per_second'], 1e-9) / 60:.1f} min")
+
+        archive = ResearchArchive(path)
+        print(f"verify: search('DX人材', challenges) -> {len(archive.search('DX人材', field='challenges', limit=5))} hits")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""保存データの圧縮率と読み書きスループット（非圧縮 JSON / gzip / zstd / zstd＋学習辞書）
+
+    python -m benchmarks.bench_codec [--size 2000] [--archive data/research_archive.db]
+
+応答（raw_response）と、それを含む解析済み結果の JSON（Blob ストアに保存される形）を対象に、
+前半で辞書を学習し、学習に使っていない後半で 1 件ずつ圧縮・展開したときの合計サイズと速度を比べる。
+既定では合成した応答（共通のキー・定型文に、応答ごとに固有の記述を混ぜたもの）を使い、
+--archive を指定するとアーカイブ内の実データを使う。
+最後に Blob ストアへの書き込みと、LRU を使わない読み出し（ファイルから逐次展開）を圧縮なし／ありで比べる。
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import zstandard as zstd
+
+from src import blob_store
+from src.codec import Codec
+from src.data_processing import parse_agent_response
+
+INDUSTRIES = ["EC業界", "製造業", "金融業界", "小売業界", "物流業界", "医療・ヘルスケア", "通信業界", "不動産業界"]
+TOPICS = ["生成AI", "DX推進", "人材不足", "サプライチェーン", "脱炭素", "セキュリティ", "データ基盤", "海外展開",
+          "顧客体験", "業務自動化", "コスト削減", "新規事業"]
+ISSUES = ["の遅れ", "への対応", "の高度化", "コストの増大", "人材の確保", "ガバナンス整備", "の標準化", "の効果測定"]
+IMPACTS = ["高", "中", "低"]
+ADVANTAGES = ["ブランド力", "価格競争力", "顧客基盤", "技術力", "販売網", "データ活用力"]
+COMPANIES = ["Google", "Microsoft", "Amazon", "トヨタ自動車", "ソニーグループ", "ユニクロ", "楽天グループ", "日立製作所"]
+NOT_FOUND = "情報が見つかりませんでした"
+# 応答ごとに固有の記述（固有名詞・具体的な経緯など）の代わりに、常用漢字相当の範囲から作る語
+_KANJI = [chr(code) for code in range(0x4E00, 0x4E00 + 2500)]
+_PARTICLES = ["の", "を", "に", "が", "で", "と", "は", "へ", "から", "による", "として"]
+
+
+def unique_prose(rng, sentences):
+    words = lambda n: "".join(rng.choice(_PARTICLES) + "".join(rng.choices(_KANJI, k=rng.randint(2, 4)))
+                              for _ in range(n))
+    return "".join(words(rng.randint(6, 12)) + "。" for _ in range(sentences))
+
+
+def make_response(rng, index):
+    """エージェントの応答に似た JSON ブロック＋前置き"""
+    topic = rng.choice(TOPICS)
+    data = {
+        "company_profile": {
+            "official_name": f"株式会社サンプル{index:05d}",
+            "established_year": f"{rng.randint(1900, 2020)}年",
+            "employees": f"{rng.randint(50, 90000):,}人",
+            "revenue": f"{rng.randint(10, 30000):,}億円" if rng.random() > 0.1 else NOT_FOUND,
+            "business_overview": f"{rng.choice(INDUSTRIES)}において{rng.choice(TOPICS)}と{rng.choice(TOPICS)}を軸に事業を展開",
+        },
+        "industry_analysis": {
+            "industry_name": rng.choice(INDUSTRIES),
+            "market_size": f"{rng.randint(1, 90)}.{rng.randint(0, 9)}兆円",
+            "top5_companies": [
+                {"rank": rank, "company": f"企業{rng.randint(1, 999)}", "market_share": f"{rng.randint(2, 35)}%",
+                 "competitive_advantage": rng.choice(ADVANTAGES)}
+                for rank in range(1, 6)
+            ],
+        },
+        "current_challenges": [
+            {"specific_issue": f"{rng.choice(TOPICS)}{rng.choice(ISSUES)}により{rng.choice(TOPICS)}の展開が遅れている",
+             "business_impact": rng.choice(IMPACTS)}
+            for _ in range(rng.randint(2, 5))
+        ],
+        "focus_area_analysis": {
+            "current_initiatives": [
+                {"initiative": f"{rng.choice(TOPICS)}を活用した{rng.choice(TOPICS)}の取り組み",
+                 "results": {"quantitative": f"{rng.choice(['応答時間', '処理件数', '工数', '売上'])}"
+                                             f"{rng.randint(5, 60)}%{rng.choice(['短縮', '増加', '削減', '向上'])}"}}
+                for _ in range(rng.randint(1, 4))
+            ],
+        },
+        "best_practices": [
+            {"company": rng.choice(COMPANIES), "results": f"{rng.choice(TOPICS)}で生産性{rng.randint(5, 50)}%向上"}
+            for _ in range(rng.randint(1, 3))
+        ],
+        "market_trends": {
+            "key_trends": [
+                {"trend_name": f"{rng.choice(TOPICS)}の本格導入",
+                 "description": f"{rng.choice(['大手', '中堅企業', '海外企業'])}を中心に{rng.choice(TOPICS)}への投資が加速"}
+                for _ in range(rng.randint(2, 4))
+            ],
+        },
+        "industry_metrics": {
+            "efficiency_improvement": f"{rng.randint(5, 60)}%",
+            "cost_reduction": f"{rng.randint(5, 40)}%" if rng.random() > 0.3 else NOT_FOUND,
+            "revenue_increase": f"{rng.randint(1, 30)}%",
+        },
+        "industry_voice": f"{topic}の活用は今後{rng.randint(2, 10)}年で業界標準になるとの見方が多い。"
+                          + unique_prose(rng, 2),
+        "analysis_notes": unique_prose(rng, rng.randint(8, 16)),
+    }
+    body = json.dumps(data, ensure_ascii=False, indent=2)
+    return (f"{data['company_profile']['official_name']}について、{topic}の観点から調査しました。"
+            f"Web検索の結果をもとに以下のJSON形式で整理しています。\n\n```json\n{body}\n```\n\n"
+            "※ 数値は公開情報に基づく推定値を含みます。最新の情報は各社の公式発表をご確認ください。")
+
+
+def synthetic_payloads(size, seed=0):
+    rng = random.Random(seed)
+    raws, results = [], []
+    for index in range(size):
+        raw = make_response(rng, index)
+        result = parse_agent_response(raw, f"株式会社サンプル{index:05d}", rng.choice(TOPICS))
+        result["raw_response"] = raw
+        raws.append(raw.encode("utf-8"))
+        results.append(blob_store._serialize(result))
+    return raws, results
+
+
+def archive_payloads(path, size):
+    from src.archive import ResearchArchive
+
+    archive = ResearchArchive(path)
+    raws, results = [], []
+    for row in archive.recent(size):
+        _, _, result = archive.get_result(row["id"])
+        raws.append((result.get("raw_response") or "").encode("utf-8"))
+        results.append(blob_store._serialize(result))
+    archive.close()
+    return raws, results
+
+
+def measure(name, encode, decode, samples):
+    if encode is None:
+        return f"  {name:<18} ratio  1.00  avg {sum(map(len, samples)) / len(samples) / 1024:6.1f}KB"
+    started = time.perf_counter()
+    encoded = [encode(sample) for sample in samples]
+    write_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in encoded:
+        decode(data)
+    read_sec = time.perf_counter() - started
+    raw_bytes = sum(map(len, samples))
+    stored = sum(map(len, encoded))
+    return (f"  {name:<18} ratio {raw_bytes / stored:5.2f}  avg {stored / len(samples) / 1024:6.1f}KB  "
+            f"write {raw_bytes / write_sec / 1e6:7.1f}MB/s  read {raw_bytes / read_sec / 1e6:7.1f}MB/s")
+
+
+def bench_formats(label, samples, dict_dir):
+    half = len(samples) // 2
+    train, test = samples[:half], samples[half:]
+    print(f"{label}: {len(test)} 件（平均 {sum(map(len, test)) / len(test) / 1024:.1f}KB）、辞書の学習 {len(train)} 件")
+    print(measure("json (plain)", None, None, test))
+    print(measure("gzip -6", lambda d: gzip.compress(d, 6), gzip.decompress, test))
+    for level in (3, 6):
+        compressor, decompressor = zstd.ZstdCompressor(level=level), zstd.ZstdDecompressor()
+        print(measure(f"zstd -{level}", compressor.compress, decompressor.decompress, test))
+    for level in (3, 6):
+        codec = Codec(os.path.join(dict_dir, f"{label}-{level}"), level=level)
+        codec.train(train)
+        print(measure(f"zstd -{level} + dict", lambda d: codec.encode(d, sample=False), codec.decode, test))
+
+
+def bench_blob_store(results, dict_dir, tmp_dir):
+    """Blob ストア経由の書き込みと、LRU を使わない読み出し"""
+    print(f"blob store: {len(results)} 件の解析済み結果（LRU なし＝ファイルから読み出し）")
+    for label, enabled in (("plain", False), ("zstd + dict", True)):
+        codec = Codec(os.path.join(dict_dir, "blob"), enabled=enabled)
+        codec.train(results[: len(results) // 2])
+        root = os.path.join(tmp_dir, f"blobs-{label}")
+        store = blob_store.BlobStore(root, cache_bytes=0, codec=codec)
+        values = [json.loads(data[1:]) for data in results]
+        started = time.perf_counter()
+        digests = [store.put(value) for value in values]
+        write_sec = time.perf_counter() - started
+        started = time.perf_counter()
+        for digest in digests:
+            store.get(digest)
+        read_sec = time.perf_counter() - started
+        disk = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+        print(f"  {label:<12} disk {disk / 1e6:6.1f}MB  put {len(values) / write_sec:7.0f}/s  "
+              f"get {len(values) / read_sec:7.0f}/s")
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--archive", help="合成データの代わりにアーカイブの実データを使う")
+    args = parser.parse_args()
+
+    raws, results = archive_payloads(args.archive, args.size) if args.archive else synthetic_payloads(args.size)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dict_dir = os.path.join(tmp_dir, "dicts")
+        bench_formats("raw_response", raws, dict_dir)
+        bench_formats("result (blob payload)", results, dict_dir)
+        bench_blob_store(results, dict_dir, tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
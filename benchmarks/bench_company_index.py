@@ -0,0 +1,77 @@
+"""企業名インデックスのベンチマーク（10万件マスタ）
+
+    python -m benchmarks.bench_company_index [--size 100000]
+"""
+import argparse
+import random
+import time
+
+from src.company_index import CompanyIndex, DEFAULT_COMPANIES
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+KANJI = "日本東京大阪中央電気通信工業製作化学商事建設鉄道銀行保険物産重工自動車精機"
+SUFFIXES = ["株式会社", "ホールディングス", "グループ", "", "", ""]
+REGIONS = ["domestic", "overseas"]
+
+
+def make_records(size, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    records = []
+    while len(records) < size:
+        alphabet = KATAKANA if rng.random() < 0.5 else KANJI
+        name = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 8))) + rng.choice(SUFFIXES)
+        if name in names:
+            continue
+        names.add(name)
+        records.append({"name": name, "aliases": [], "industry": f"業界{len(records) % 50}", "region": rng.choice(REGIONS)})
+    return records
+
+
+def typo(name, rng):
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    chars[i] = rng.choice(KATAKANA + KANJI)
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    records = DEFAULT_COMPANIES + make_records(args.size)
+    start = time.perf_counter()
+    index = CompanyIndex(records)
+    build_sec = time.perf_counter() - start
+    print(f"build: {len(records):,} records in {build_sec:.2f}s")
+
+    # 本文照合（O(text)）: 実在名を埋め込んだ約100KBのテキスト
+    sample = rng.sample(records, 500)
+    text = "。".join(f"{r['name']}は{KANJI[:10]}分野で取り組みを進めている" for r in sample) * 5
+    start = time.perf_counter()
+    found = index.find_in_text(text)
+    elapsed = time.perf_counter() - start
+    print(f"find_in_text: {len(text):,} chars, {len(found):,} hits, {elapsed * 1000:.1f}ms ({len(text) / elapsed / 1e6:.2f} Mchar/s)")
+
+    start = time.perf_counter()
+    for r in sample:
+        index.classify_region(r["name"] + "の事例")
+    elapsed = time.perf_counter() - start
+    print(f"classify_region: {elapsed / len(sample) * 1e6:.1f}us/call")
+
+    # あいまい解決: 1文字置換した名前から正式名称を引けるか
+    queries = rng.sample(records[len(DEFAULT_COMPANIES):], args.queries)
+    hits = 0
+    start = time.perf_counter()
+    for r in queries:
+        result = index.resolve(typo(r["name"], rng), limit=1)
+        hits += bool(result and result[0][0]["name"] == r["name"])
+    elapsed = time.perf_counter() - start
+    print(f"resolve (fuzzy): {elapsed / len(queries) * 1e3:.2f}ms/query, top1 accuracy {hits / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    main()
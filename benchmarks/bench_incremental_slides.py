@@ -0,0 +1,107 @@
+"""再調査時のスライド描画量（全件描画 / 入力の変わらないスライド・デッキを再利用）
+
+    python -m benchmarks.bench_incremental_slides [--size 300] [--changed 0.4]
+
+ウォッチリストの一括更新を模して、size 組の結果を一度キャッシュへ登録したあと再調査する。
+再調査では changed の割合の組で market_trends（スライド2のみに影響）が変わり、
+残りは応答の本文以外（raw_response・検索回数）だけが変わる。
+各組の HTML / PPTX 生成にかかった時間と、実際に描画したスライド・デッキの数を比べる。
+"""
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_codec import make_response, TOPICS
+from src import blob_store, result_cache, slide_export, slide_generator
+from src.data_processing import parse_agent_response
+
+
+class RenderCounter:
+    """描画関数の呼び出し回数を数える"""
+
+    def __init__(self, module, name):
+        self.module, self.name, self.calls = module, name, 0
+        self.original = getattr(module, name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return self.original(*args, **kwargs)
+
+        setattr(module, name, counted)
+
+    def take(self):
+        calls, self.calls = self.calls, 0
+        return calls
+
+
+def make_batch(size, seed=0):
+    rng = random.Random(seed)
+    batch = []
+    for index in range(size):
+        raw = make_response(rng, index)
+        result = parse_agent_response(raw, f"株式会社サンプル{index:05d}", rng.choice(TOPICS))
+        result["raw_response"] = raw
+        batch.append((f"株式会社サンプル{index:05d}", rng.choice(TOPICS), result))
+    return batch
+
+
+def refreshed(batch, changed, seed=1):
+    rng = random.Random(seed)
+    updated = []
+    for target, focus_area, result in batch:
+        result = copy.deepcopy(result)
+        result["raw_response"] += "\n（再調査）"
+        result["search_count"] = result.get("search_count", 0) + 1
+        if rng.random() < changed:
+            result["market_trends"]["key_trends"].insert(
+                0, {"trend_name": f"{rng.choice(TOPICS)}の再編", "description": "直近の調査で新たに確認された動き"})
+        updated.append((target, focus_area, result))
+    return updated
+
+
+def render_batch(batch, cache, fragment_store, slides, decks):
+    started = time.perf_counter()
+    for target, focus_area, result in batch:
+        cache.put(
+            target, focus_area, result,
+            slide_html=slide_generator.generate_html_slides(result, target, focus_area, fragment_store=fragment_store),
+            slide_pptx=slide_export.render_deck_bytes(result, target, focus_area, fmt="pptx",
+                                                      fragment_store=fragment_store),
+            source="benchmark",
+        )
+    return time.perf_counter() - started, slides.take(), decks.take()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--changed", type=float, default=0.4, help="再調査で内容が変わる組の割合")
+    args = parser.parse_args()
+
+    batch = make_batch(args.size)
+    update = refreshed(batch, args.changed)
+    slides = RenderCounter(slide_generator, "render_slide")
+    decks = RenderCounter(slide_export, "build_pptx")
+    total_slides = args.size * len(slide_generator.SLIDE_RENDERERS)
+    print(f"{args.size} 組を再調査（内容が変わる割合 {args.changed:.0%}、各 {len(slide_generator.SLIDE_RENDERERS)} 枚）")
+
+    for label, incremental in (("全件描画", False), ("差分のみ描画", True)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.environ["BLOB_STORE_PATH"] = os.path.join(tmp_dir, "blobs")
+            blob_store._store = None
+            cache = result_cache.ResultCache(os.path.join(tmp_dir, "cache.db"))
+            store = cache if incremental else None
+            render_batch(batch, cache, store, slides, decks)
+            elapsed, slide_calls, deck_calls = render_batch(update, cache, store, slides, decks)
+            changed = sum(1 for target, focus_area, _ in update if cache.latest_changes(target, focus_area)["changes"])
+            print(f"  {label}: {elapsed:6.2f}s（{elapsed / args.size * 1000:5.1f} ms/組）  "
+                  f"HTML スライド {slide_calls:4d}/{total_slides}  PPTX デッキ {deck_calls:4d}/{args.size}  "
+                  f"差分のあった組 {changed}")
+            blob_store._store = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""最終アシスタント応答の取得コスト比較（全件昇順走査 vs 最新1件取得）
+
+    python -m benchmarks.bench_message_fetch [--latency 0.02]
+"""
+import argparse
+import time
+
+from azure.ai.agents.models import ListSortOrder
+
+from benchmarks.fake_agent import FakeProject
+from src.azure_agent import fetch_latest_assistant_text
+
+
+def legacy_fetch(project, thread_id):
+    """変更前の実装: 昇順で全メッセージを走査して最後の応答を採用"""
+    agent_response = None
+    for message in project.agents.messages.list(thread_id=thread_id, order=ListSortOrder.ASCENDING):
+        if message.role == "assistant" and message.text_messages:
+            agent_response = message.text_messages[-1].text.value
+    return agent_response
+
+
+def measure(history_size, latency, fetch, run_filter=True):
+    project = FakeProject(history_size=history_size, request_latency=latency, supports_run_filter=run_filter)
+    thread = project.agents.threads.create()
+    run = project.agents.runs.create_and_process(thread_id=thread.id, agent_id="agent", polling_interval=0)
+    project.stats.counts.clear()
+    started = time.perf_counter()
+    text = fetch(project, thread.id, run.id)
+    elapsed = time.perf_counter() - started
+    assert text == project.response_text
+    return elapsed, project.stats.get("messages.list.pages"), project.stats.get("messages.list.items")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02, help="1ページ取得あたりの擬似遅延（秒）")
+    args = parser.parse_args()
+
+    print(f"{'history':>8} | {'legacy ms':>10} {'pages':>6} {'items':>7} | {'latest ms':>10} {'pages':>6} {'items':>7} | {'no run filter ms':>16} {'pages':>6}")
+    for history_size in (10, 100, 1_000, 10_000):
+        legacy = measure(history_size, args.latency, lambda p, t, r: legacy_fetch(p, t))
+        latest = measure(history_size, args.latency, fetch_latest_assistant_text)
+        fallback = measure(history_size, args.latency, fetch_latest_assistant_text, run_filter=False)
+        print(f"{history_size:>8} | {legacy[0] * 1000:>10.1f} {legacy[1]:>6} {legacy[2]:>7} | "
+              f"{latest[0] * 1000:>10.1f} {latest[1]:>6} {latest[2]:>7} | {fallback[0] * 1000:>16.1f} {fallback[1]:>6}")
+
+
+if __name__ == "__main__":
+    main()
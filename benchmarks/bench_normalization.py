@@ -0,0 +1,63 @@
+"""数値正規化のベンチマークと回帰チェック
+
+    python -m benchmarks.bench_normalization [--rows 200000]
+"""
+import argparse
+import re
+import time
+
+import pandas as pd
+
+from src.data_processing import AMOUNT_PATTERN
+from src.normalization import normalize_numeric_series
+
+# (入力, 値, 単位)
+CASES = [
+    ("3千億円", 3e11, "JPY"),
+    ("2千億円", 2e11, "JPY"),
+    ("2百億円", 2e10, "JPY"),
+    ("1兆2千億円", 1.2e12, "JPY"),
+    ("1兆2000億円", 1.2e12, "JPY"),
+    ("5千万円", 5e7, "JPY"),
+    ("百億円", 1e10, "JPY"),
+    ("三千五百人", 3500, "persons"),
+    ("3〜5億円", 4e8, "JPY"),
+    ("40-70%", 55, "percent"),
+    ("-5%", -5, "percent"),
+    ("▲5%", -5, "percent"),
+    ("△3億円", -3e8, "JPY"),
+    ("-1.2億円", -1.2e8, "JPY"),
+    ("2024年度 1兆2000億円", 1.2e12, "JPY"),
+    ("2025年までに40%向上", 40, "percent"),
+]
+
+AMOUNT_CASES = ["2千億円", "3千億円", "1兆2千億円", "1兆2,000億円", "5百万円"]
+
+
+def check():
+    series = pd.Series([text for text, _, _ in CASES])
+    result = normalize_numeric_series(series)
+    for (text, value, unit), got, got_unit in zip(CASES, result["value"], result["unit"]):
+        assert abs(got - value) <= abs(value) * 1e-9, f"{text}: {got} != {value}"
+        assert got_unit == unit, f"{text}: 単位 {got_unit} != {unit}"
+    for text in AMOUNT_CASES:
+        assert re.fullmatch(AMOUNT_PATTERN, text), f"AMOUNT_PATTERN が {text} に一致しません"
+    print(f"check: {len(CASES) + len(AMOUNT_CASES)} cases ok")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+    check()
+
+    texts = [text for text, _, _ in CASES]
+    series = pd.Series([texts[i % len(texts)] for i in range(args.rows)])
+    start = time.perf_counter()
+    normalize_numeric_series(series)
+    elapsed = time.perf_counter() - start
+    print(f"normalize: {args.rows:,} rows in {elapsed * 1000:.0f}ms ({args.rows / elapsed / 1e3:.0f}k rows/s)")
+
+
+if __name__ == "__main__":
+    main()
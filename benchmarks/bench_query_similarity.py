@@ -0,0 +1,112 @@
+"""調査観点の言い換えに対するキャッシュのヒット率と検索レイテンシ（完全一致のみ / 類似一致あり）
+
+    python -m benchmarks.bench_query_similarity [--targets 2000] [--per-target 5] [--queries 4000]
+
+targets 社 × per-target 件の調査観点（観点ごとに言い換えの一覧を持ち、その 1 つ目）を結果キャッシュへ登録し、
+次の 2 種類の要求を混ぜて投げる。
+- 言い換え: 登録済みの観点を別の表現（日本語の言い換え・英語）にしたもの。登録済みの結果が返るべき
+- 別の観点: 登録していない観点、または登録済みの観点と語を共有するが意味の違う観点。何も返らないべき
+しきい値ごとに、言い換えのうち正しい結果が返った割合（再現率）と、返した結果のうち正しいものの割合（適合率）を出す。
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src import blob_store, result_cache
+
+# 同じ調査観点の言い換え（先頭を登録し、残りで要求する）
+FAMILIES = [
+    ["生成AI活用状況", "生成AIの活用", "Generative AI adoption", "生成AIの導入状況", "GenAI utilization", "生成AIの利活用",
+     "生成AI活用の現状", "生成AIの活用度合い"],
+    ["DX推進の取り組み", "DX推進", "デジタルトランスフォーメーションの推進", "Digital transformation initiatives",
+     "デジタル変革の取り組み", "DXの取り組み状況", "DX推進の現状"],
+    ["人材育成", "人材育成の取り組み", "Talent development", "人材開発", "人材の育成状況", "人材育成施策"],
+    ["サステナビリティ", "サステナビリティの取り組み", "Sustainability", "サスティナビリティ推進", "サステナビリティ施策"],
+    ["クラウド移行", "クラウドへの移行", "Cloud migration", "クラウド化の状況", "クラウド移行の進捗"],
+    ["業務効率化", "業務効率化の取り組み", "Operational efficiency", "業務の効率化", "業務効率化施策"],
+    ["海外展開", "海外進出", "Global expansion", "海外展開の状況", "グローバル展開", "海外事業展開"],
+    ["デジタルマーケティング", "Digital marketing", "デジタルマーケティングの取り組み", "デジタル・マーケティング",
+     "デジタルマーケティング施策"],
+    ["新規事業開発", "New business development", "新規事業の開発", "新規事業開発の状況", "新規事業の開発状況"],
+    ["働き方改革", "Work style reform", "働き方改革の取り組み", "働き方の改革", "働き方改革の現状"],
+    ["サイバーセキュリティ対策", "Cybersecurity対策", "セキュリティ対策", "サイバーセキュリティ対策の状況",
+     "セキュリティ対策の現状"],
+    ["データ活用", "データの利活用", "データ利用状況", "Data utilization", "データ活用の現状"],
+]
+# 登録済みの観点と語を共有するが、別の調査になる観点
+HARD_NEGATIVES = [
+    "生成AIの規制対応", "AIガバナンス", "DX人材育成", "クラウド料金", "海外拠点の人材採用", "マーケティング予算",
+    "新規事業の撤退", "セキュリティ人材", "データセンター投資", "働き方に関する訴訟", "生成AIのリスク管理",
+    "サステナビリティ報告の開示", "業務効率化ツールの価格", "生成AI利用規制",
+]
+
+
+def make_queries(targets, stored, count, rng):
+    """(target, focus_area, 正解の登録済み観点または None) の一覧"""
+    queries = []
+    for _ in range(count):
+        target = rng.choice(targets)
+        families = stored[target]
+        if rng.random() < 0.5:
+            family = rng.choice(families)
+            queries.append((target, rng.choice(family[1:]), family[0]))
+        elif rng.random() < 0.5:
+            unused = [family for family in FAMILIES if family not in families]
+            queries.append((target, rng.choice(rng.choice(unused)) if unused else rng.choice(HARD_NEGATIVES), None))
+        else:
+            queries.append((target, rng.choice(HARD_NEGATIVES), None))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", type=int, default=2000)
+    parser.add_argument("--per-target", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=4000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    targets = [f"ベンチ商事{index:05d}" for index in range(args.targets)]
+    stored = {target: rng.sample(FAMILIES, args.per_target) for target in targets}
+    queries = make_queries(targets, stored, args.queries, rng)
+    paraphrases = sum(1 for *_, expected in queries if expected)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["BLOB_STORE_PATH"] = os.path.join(tmp_dir, "blobs")
+        blob_store._store = None
+        cache = result_cache.ResultCache(os.path.join(tmp_dir, "cache.db"))
+        for target, families in stored.items():
+            for family in families:
+                cache.put(target, family[0], {"focus_area_analysis": {"focus": family[0]}}, source="benchmark")
+        started = time.perf_counter()
+        cache._similarity_index()
+        print(f"{len(cache._query_index)} 件の観点を索引（構築 {(time.perf_counter() - started) * 1000:.0f} ms）、"
+              f"要求 {len(queries)} 件（うち言い換え {paraphrases} 件）")
+
+        exact = sum(1 for target, focus_area, _ in queries if cache.lookup(target, focus_area, record=False))
+        print(f"  完全一致のみ: ヒット率 {exact / len(queries):.1%}")
+
+        for threshold in (0.3, 0.4, 0.5, 0.6, 0.75, 0.9):
+            correct = wrong = 0
+            samples = []
+            for target, focus_area, expected in queries:
+                started = time.perf_counter()
+                found = cache.lookup(target, focus_area, record=False) or \
+                    cache.find_similar(target, focus_area, threshold=threshold, record=False)
+                samples.append(time.perf_counter() - started)
+                if found and found["focus_area"] == expected:
+                    correct += 1
+                elif found:
+                    wrong += 1
+            samples.sort()
+            print(f"  しきい値 {threshold:.2f}: ヒット率 {(correct + wrong) / len(queries):5.1%}  "
+                  f"再現率 {correct / paraphrases:5.1%}  適合率 {correct / max(correct + wrong, 1):6.1%}  "
+                  f"p50 {statistics.median(samples) * 1000:.2f} ms  p99 {samples[int(len(samples) * 0.99) - 1] * 1000:.2f} ms")
+        blob_store._store = None
+
+
+if __name__ == "__main__":
+    main()
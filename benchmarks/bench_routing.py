@@ -0,0 +1,116 @@
+"""複数バックエンドへのルーティングのスループット・フェイルオーバー計測
+
+    python -m benchmarks.bench_routing [--jobs 120] [--run-ms 200]
+
+フェイクのエンドポイントごとにサーバー側の同時実行上限（超えると 429）を設け、
+スケジューラ（同時実行数 = 全バックエンドの上限の合計）＋ルーター経由でバッチを流す。
+- scale: バックエンド 1 / 2 / 3 台でのスループット
+- skewed: 1 台だけレイテンシが 3 倍のときの振り分け
+- failover: バッチの途中で 1 台が全要求に 429 を返し始めたときの完了件数と振り分け
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.fake_agent import FakeHttpError, FakeProject
+from src.routing import Backend, BackendRouter
+from src.scheduler import AgentScheduler
+
+
+class FakeDeployment:
+    """同時実行上限つきのフェイクデプロイメント"""
+
+    def __init__(self, name, run_sec, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.project = FakeProject(f"fake://{name}", run_duration=run_sec)
+        self.running = 0
+        self.throttle_all = False
+        self.lock = threading.Lock()
+
+    def run(self, poll_sec):
+        with self.lock:
+            if self.throttle_all or self.running >= self.capacity:
+                raise FakeHttpError(429, "Too Many Requests", retry_after=1)
+            self.running += 1
+        try:
+            agents = self.project.agents
+            thread = agents.threads.create()
+            run = agents.runs.create_and_process(thread_id=thread.id, agent_id="agent", polling_interval=poll_sec)
+            return run.status
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def simulate(deployments, jobs, poll_sec, capacity, on_progress=None):
+    backends = [Backend(d.name, f"fake://{d.name}", "agent", capacity) for d in deployments]
+    by_name = {d.name: d for d in deployments}
+    router = BackendRouter(backends)
+    scheduler = AgentScheduler(max_concurrency=router.total_concurrency, interactive_reserve=0)
+    remaining = list(range(jobs))
+    lock = threading.Lock()
+    results = {"completed": 0, "failed": 0}
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                job = remaining.pop()
+            if on_progress:
+                on_progress(jobs - job)
+            try:
+                with scheduler.slot("batch-user", "batch", estimated_tokens=1):
+                    router.execute(lambda backend: by_name[backend.name].run(poll_sec))
+                key = "completed"
+            except Exception:
+                key = "failed"
+            with lock:
+                results[key] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(router.total_concurrency + 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return dict(results, elapsed_sec=elapsed, throughput=results["completed"] / elapsed,
+                per_backend={b["name"]: (b["successes"], b["throttled"]) for b in router.status()})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=120)
+    parser.add_argument("--run-ms", type=float, default=200)
+    parser.add_argument("--capacity", type=int, default=4, help="1 デプロイメントあたりの同時実行上限")
+    args = parser.parse_args()
+    run_sec = args.run_ms / 1000
+    poll_sec = run_sec / 10
+
+    print("scale (successes, 429) per backend")
+    for count in (1, 2, 3):
+        deployments = [FakeDeployment(f"region{i}", run_sec, args.capacity) for i in range(count)]
+        report = simulate(deployments, args.jobs, poll_sec, args.capacity)
+        print(f"  {count} backend(s): {report['throughput']:6.1f} runs/s, {report['elapsed_sec']:.1f}s, "
+              f"failed {report['failed']}, {report['per_backend']}")
+
+    deployments = [FakeDeployment("fast0", run_sec, args.capacity), FakeDeployment("fast1", run_sec, args.capacity),
+                   FakeDeployment("slow", run_sec * 3, args.capacity)]
+    report = simulate(deployments, args.jobs, poll_sec, args.capacity)
+    print(f"skewed: {report['throughput']:6.1f} runs/s, failed {report['failed']}, {report['per_backend']}")
+
+    deployments = [FakeDeployment(f"region{i}", run_sec, args.capacity) for i in range(3)]
+
+    def throttle_midway(done):
+        if done >= args.jobs // 3:
+            deployments[0].throttle_all = True
+
+    report = simulate(deployments, args.jobs, poll_sec, args.capacity, on_progress=throttle_midway)
+    print(f"failover (region0 throttled after {args.jobs // 3} jobs): completed {report['completed']}/{args.jobs}, "
+          f"failed {report['failed']}, {report['throughput']:.1f} runs/s, {report['per_backend']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""run 完了待ちの追加レイテンシとポーリング回数（固定間隔 vs 適応的）
+
+    python -m benchmarks.bench_run_polling [--samples 200] [--latency-ms 30]
+
+フェイクエンドポイント（仮想時計）で run の所要時間を変えながら、
+完了を検知するまでの余計な待ち時間（検知時刻 − 実際の完了時刻）と runs.get の回数を比較する。
+- fixed-1s: SDK の create_and_process（polling_interval=1 秒）
+- adaptive: src/run_polling.wait_for_run の既定設定
+- adaptive+hint: サーバーが実行中の応答に Retry-After: 2 を付ける場合
+"""
+import argparse
+import random
+import statistics
+
+from benchmarks.fake_agent import FakeProject
+from src.run_polling import wait_for_run
+
+RUN_DURATIONS_SEC = [0.5, 2, 5, 15, 45, 120]
+
+
+def measure(mode, base_duration, samples, latency, seed=0):
+    rng = random.Random(seed)
+    added, polls = [], []
+    for _ in range(samples):
+        duration = base_duration * rng.uniform(0.8, 1.2)
+        project = FakeProject(request_latency=latency, run_duration=duration, simulated_time=True,
+                              poll_hint_sec=2 if mode == "adaptive+hint" else None)
+        runs = project.agents.runs
+        thread = project.agents.threads.create()
+        if mode == "fixed-1s":
+            run = runs.create_and_process(thread_id=thread.id, agent_id="agent", polling_interval=1.0)
+        else:
+            run = runs.create(thread_id=thread.id, agent_id="agent")
+            run = wait_for_run(runs, thread.id, run, sleep=project._sleep, clock=project.clock)
+        assert run.status == "completed"
+        added.append(project.clock() - (run._started + run._duration))
+        polls.append(project.stats.get("runs.get"))
+    added.sort()
+    return {
+        "p50_ms": statistics.median(added) * 1000,
+        "p95_ms": added[int(len(added) * 0.95)] * 1000,
+        "polls": statistics.mean(polls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=30, help="1 リクエストあたりの擬似遅延")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    modes = ("fixed-1s", "adaptive", "adaptive+hint")
+    print(f"{'run':>6} | " + " | ".join(f"{mode:>13} p50/p95 ms  polls" for mode in modes))
+    for duration in RUN_DURATIONS_SEC:
+        cells = []
+        for mode in modes:
+            report = measure(mode, duration, args.samples, latency)
+            cells.append(f"{report['p50_ms']:8.0f}/{report['p95_ms']:6.0f} {report['polls']:6.1f}")
+        print(f"{duration:5.1f}s | " + " | ".join(f"{cell:>30}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""スケジューラの対話利用レイテンシ計測（大量バッチ投入下）
+
+    python -m benchmarks.bench_scheduler [--batch 500] [--run-ms 40]
+
+バッチ 500 件（投入スレッド 16 本）と、5 人の対話利用者からの周期的な要求を同時に流し、
+対話要求の待ち時間 p50/p95 を比較する。
+- fifo: 優先度・ユーザー区別なしの到着順（同時実行数のみ制限）
+- scheduled: interactive 優先・ユーザー単位ラウンドロビン・interactive 予約枠 1
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from src.scheduler import AgentScheduler
+
+
+def simulate(mode, batch_jobs, run_ms, concurrency, interactive_users, interactive_requests, seed=0):
+    scheduler = AgentScheduler(max_concurrency=concurrency, interactive_reserve=1 if mode == "scheduled" else 0)
+    rng = random.Random(seed)
+    durations = [rng.uniform(0.5, 1.5) * run_ms / 1000 for _ in range(batch_jobs + interactive_users * interactive_requests)]
+    interactive_waits = []
+    lock = threading.Lock()
+    batch_remaining = list(range(batch_jobs))
+
+    def run(user, priority, duration):
+        if mode == "fifo":
+            user, priority = "shared", "interactive"
+        started = time.perf_counter()
+        with scheduler.slot(user, priority, estimated_tokens=1000):
+            waited = time.perf_counter() - started
+            time.sleep(duration)
+        return waited
+
+    def batch_worker():
+        while True:
+            with lock:
+                if not batch_remaining:
+                    return
+                job = batch_remaining.pop()
+            run("batch-user", "batch", durations[job])
+
+    def interactive_user(index):
+        for i in range(interactive_requests):
+            time.sleep(run_ms / 1000 * 3)
+            waited = run(f"user{index}", "interactive", durations[batch_jobs + index * interactive_requests + i])
+            with lock:
+                interactive_waits.append(waited)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=batch_worker) for _ in range(16)]
+    threads += [threading.Thread(target=interactive_user, args=(i,)) for i in range(interactive_users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    interactive_waits.sort()
+    return {
+        "mode": mode,
+        "elapsed_sec": elapsed,
+        "interactive_p50_ms": statistics.median(interactive_waits) * 1000,
+        "interactive_p95_ms": interactive_waits[int(len(interactive_waits) * 0.95)] * 1000,
+        "metrics": scheduler.metrics(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--run-ms", type=float, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    for mode in ("fifo", "scheduled"):
+        report = simulate(mode, args.batch, args.run_ms, args.concurrency, args.users, args.requests)
+        print(f"{mode:9s} interactive wait p50={report['interactive_p50_ms']:.0f}ms "
+              f"p95={report['interactive_p95_ms']:.0f}ms, total {report['elapsed_sec']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
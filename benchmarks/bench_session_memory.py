@@ -0,0 +1,94 @@
+"""セッションペイロードのメモリ計測（200 セッション相当）
+
+    python -m benchmarks.bench_session_memory [--sessions 200]
+
+各セッションが調査結果（raw_response 約 100KB）と生成済みスライド HTML を持つ状況を、
+st.session_state に実体を保持する方式（inline）と Blob ストアにハッシュのみ保持する方式（blob）で
+それぞれ別プロセスで再現し、セッション数に対する RSS の推移を比較する。
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_agent import SAMPLE_RESPONSE
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def make_payloads(index):
+    from src.data_processing import parse_agent_response
+    from src.slide_generator import generate_slides_with_html
+
+    raw = SAMPLE_RESPONSE + f"\n補足資料 {index}: " + ("調査メモ" * 12_500)
+    result = parse_agent_response(raw, f"企業{index:04d}", "生成AI活用状況")
+    result["raw_response"] = raw
+    slide_result = generate_slides_with_html(result, f"企業{index:04d}", "生成AI活用状況")
+    return result, slide_result
+
+
+def simulate(mode, sessions, reruns, blob_dir):
+    from src.blob_store import BlobStore
+
+    store = BlobStore(blob_dir, cache_bytes=16 * 1024 * 1024)
+    session_states = []
+    samples = []
+    for index in range(sessions):
+        result, slide_result = make_payloads(index)
+        state = {}
+        if mode == "inline":
+            state["research_results"] = result
+            state["slide_result"] = slide_result
+        else:
+            state["research_results_ref"] = store.put(result)
+            state["slide_result_ref"] = store.put(slide_result)
+        session_states.append(state)
+        del result, slide_result
+
+        # 各セッションの再実行（画面描画のためにペイロードを参照する）
+        for _ in range(reruns):
+            if mode == "inline":
+                html = state["slide_result"]["html_content"]
+            else:
+                html = store.get(state["slide_result_ref"])["html_content"]
+            del html
+
+        if (index + 1) % max(1, sessions // 4) == 0:
+            gc.collect()
+            samples.append((index + 1, round(rss_mb(), 1)))
+    return {"mode": mode, "samples": samples, "blob_store": store.status() if mode == "blob" else None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--reruns", type=int, default=3)
+    parser.add_argument("--mode", choices=["inline", "blob"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with tempfile.TemporaryDirectory() as blob_dir:
+            print(json.dumps(simulate(args.mode, args.sessions, args.reruns, blob_dir)))
+        return
+
+    for mode in ("inline", "blob"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_session_memory", "--mode", mode,
+             "--sessions", str(args.sessions), "--reruns", str(args.reruns)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        series = ", ".join(f"{n}: {rss:.0f}MB" for n, rss in report["samples"])
+        print(f"{mode:6s} RSS by sessions -> {series}")
+        if report["blob_store"]:
+            print(f"       blob store: {report['blob_store']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""スライド一括書き出しのスループット計測（デッキ/分）
+
+    python -m benchmarks.bench_slide_export [--decks 200] [--workers 4] [--format pptx]
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from src.slide_export import export_decks
+
+SAMPLE_RESULT = {
+    "company_profile": {
+        "official_name": "株式会社サンプル",
+        "established_year": "2013年",
+        "employees": "2,000人",
+        "revenue": "1,720億円",
+        "business_overview": "フリマアプリを中心としたマーケットプレイス事業",
+    },
+    "industry_analysis": {
+        "industry_name": "EC業界",
+        "market_size": "2.4兆円",
+        "top5_companies": [
+            {"rank": i, "company": f"企業{i}", "market_share": f"{30 - i * 5}%", "competitive_advantage": "ブランド力"}
+            for i in range(1, 6)
+        ],
+    },
+    "current_challenges": [{"specific_issue": f"課題{i}", "business_impact": "中"} for i in range(3)],
+    "focus_area_analysis": {
+        "current_initiatives": [{"initiative": f"施策{i}", "results": {"quantitative": "20%改善"}} for i in range(3)]
+    },
+    "best_practices": [{"company": "Google", "results": "生産性30%向上"}, {"company": "楽天", "results": "CS応答半減"}],
+    "market_trends": {"key_trends": [{"trend_name": "生成AI", "description": "業務適用が拡大"}]},
+    "industry_metrics": {"efficiency_improvement": "40%", "revenue_increase": "20%"},
+    "industry_voice": "生成AIの導入は今後3年で業界標準になるとの見方が多い。",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--decks", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--format", default="pptx", choices=["pptx", "pdf", "html"])
+    args = parser.parse_args()
+
+    jobs = ((f"企業{i}", "生成AI活用", SAMPLE_RESULT) for i in range(args.decks))
+    with tempfile.TemporaryDirectory() as out_dir:
+        stats = export_decks(jobs, out_dir, fmt=args.format, max_workers=args.workers)
+        size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+    stats["failed"] = len(stats["failed"])
+    stats["total_bytes"] = size
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""ローカル検証用のフェイク Foundry エージェント
+
+AIProjectClient と同じ形（project.agents.get_agent / threads / messages / runs）を持ち、
+ネットワークなしで応答・遅延・ページング・スロットリングを再現する。
+ベンチマークと負荷試験から使用する。
+"""
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_PAGE_SIZE = 20
+
+SAMPLE_RESPONSE = """```json
+{
+  "company_profile": {"official_name": "株式会社サンプル", "established_year": "2013年", "employees": "2,000人",
+                      "revenue": "1,720億円", "business_overview": "フリマアプリを中心としたマーケットプレイス事業を展開"},
+  "industry_analysis": {"industry_name": "EC業界", "market_size": "2.4兆円",
+                        "top5_companies": [{"rank": 1, "company": "企業A", "market_share": "30%", "competitive_advantage": "ブランド力"}]},
+  "current_challenges": [{"specific_issue": "生成AI人材の不足により全社展開が遅れている", "business_impact": "中"}],
+  "focus_area_analysis": {"current_initiatives": [{"initiative": "カスタマーサポートへの生成AI導入", "results": {"quantitative": "応答時間30%短縮"}}]},
+  "best_practices": [{"company": "Google", "results": "開発生産性20%向上"}],
+  "market_trends": {"key_trends": [{"trend_name": "生成AIの業務適用", "description": "大手を中心に導入が加速"}]},
+  "industry_metrics": {"efficiency_improvement": "40%", "revenue_increase": "15%"},
+  "industry_voice": "生成AIの活用は今後3年で業界標準になるとの見方が多い。"
+}
+```"""
+
+
+class FakeHttpError(Exception):
+    """HttpResponseError 相当（status_code / Retry-After を持つ）"""
+
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(
+            status_code=status_code,
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else {},
+        )
+
+
+class FakeStats:
+    """呼び出し回数の集計"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name, n=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def get(self, name):
+        return self.counts.get(name, 0)
+
+
+def _message(message_id, role, text, run_id=None):
+    return SimpleNamespace(
+        id=message_id,
+        role=role,
+        run_id=run_id,
+        text_messages=[SimpleNamespace(text=SimpleNamespace(value=text))],
+    )
+
+
+class _Threads:
+    def __init__(self, project):
+        self._project = project
+
+    def create(self, **kwargs):
+        project = self._project
+        project._sleep(project.request_latency)
+        project.stats.add("threads.create")
+        thread_id = f"thread_{next(project._ids)}"
+        messages = []
+        for i in range(project.history_size):
+            role = "user" if i % 2 == 0 else "assistant"
+            messages.append(_message(f"msg_{next(project._ids)}", role, f"過去のメッセージ {i}", run_id=f"old_run_{i // 2}"))
+        project.threads[thread_id] = messages
+        return SimpleNamespace(id=thread_id)
+
+    def delete(self, thread_id, **kwargs):
+        self._project.stats.add("threads.delete")
+        self._project.threads.pop(thread_id, None)
+
+
+class _Messages:
+    def __init__(self, project):
+        self._project = project
+
+    def create(self, thread_id, role, content, **kwargs):
+        project = self._project
+        project._sleep(project.request_latency)
+        project.stats.add("messages.create")
+        message = _message(f"msg_{next(project._ids)}", role, content)
+        project.threads[thread_id].append(message)
+        return message
+
+    def list(self, thread_id, *, run_id=None, limit=None, order=None, **kwargs):
+        """ItemPaged と同様に、反復に応じてページ単位で遅延取得する"""
+        project = self._project
+        page_size = limit or DEFAULT_PAGE_SIZE
+
+        def pages():
+            messages = list(project.threads[thread_id])
+            if order is not None and str(getattr(order, "value", order)).lower() == "desc":
+                messages.reverse()
+            if run_id and project.supports_run_filter:
+                messages = [m for m in messages if m.run_id == run_id]
+            for start in range(0, max(len(messages), 1), page_size):
+                project._sleep(project.request_latency)
+                project.stats.add("messages.list.pages")
+                page = messages[start:start + page_size]
+                project.stats.add("messages.list.items", len(page))
+                yield page
+
+        return itertools.chain.from_iterable(pages())
+
+
+class _Runs:
+    def __init__(self, project):
+        self._project = project
+
+    def _complete(self, run):
+        project = self._project
+        run.status = "completed"
+        run.usage = SimpleNamespace(total_tokens=project.tokens_per_run)
+        project.threads[run.thread_id].append(
+            _message(f"msg_{next(project._ids)}", "assistant", project.response_text, run_id=run.id)
+        )
+
+    def create(self, thread_id, *, agent_id, **kwargs):
+        project = self._project
+        project._sleep(project.request_latency)
+        project.stats.add("runs.create")
+        project._maybe_throttle()
+        run = SimpleNamespace(
+            id=f"run_{next(project._ids)}", thread_id=thread_id, agent_id=agent_id,
+            status="queued", last_error=None, usage=None,
+            _started=project.clock(), _duration=project.run_duration(),
+        )
+        project.runs[run.id] = run
+        return run
+
+    def get(self, thread_id, run_id, cls=None, **kwargs):
+        project = self._project
+        project._sleep(project.request_latency)
+        project.stats.add("runs.get")
+        run = project.runs[run_id]
+        if run.status in ("queued", "in_progress"):
+            if project.clock() - run._started >= run._duration:
+                self._complete(run)
+            else:
+                run.status = "in_progress"
+        if cls:
+            # SDK の cls フックと同様に、生レスポンス（ヘッダー）付きで返す
+            headers = {}
+            if project.poll_hint_sec and run.status == "in_progress":
+                headers["Retry-After"] = str(project.poll_hint_sec)
+            return cls(SimpleNamespace(http_response=SimpleNamespace(headers=headers)), run, {})
+        return run
+
+    def create_and_process(self, thread_id, *, agent_id, polling_interval=1, **kwargs):
+        """SDK と同じく固定間隔でポーリングする"""
+        project = self._project
+        run = self.create(thread_id, agent_id=agent_id)
+        while run.status in ("queued", "in_progress", "requires_action"):
+            project._sleep(polling_interval)
+            run = self.get(thread_id, run.id)
+        return run
+
+    def cancel(self, thread_id, run_id, **kwargs):
+        run = self._project.runs[run_id]
+        run.status = "cancelled"
+        return run
+
+
+class _Agents:
+    def __init__(self, project):
+        self._project = project
+        self.threads = _Threads(project)
+        self.messages = _Messages(project)
+        self.runs = _Runs(project)
+
+    def get_agent(self, agent_id):
+        project = self._project
+        project._sleep(project.request_latency)
+        project.stats.add("get_agent")
+        project._maybe_throttle()
+        return SimpleNamespace(id=agent_id, name="fake-research-agent", model="fake-model")
+
+
+class FakeProject:
+    """AIProjectClient のフェイク。
+
+    request_latency: 1 リクエストあたりの遅延（秒）
+    run_duration: run 完了までの秒数（数値または引数なしの関数）
+    history_size: 新規スレッドに事前投入する過去メッセージ数（長いスレッドの再現）
+    throttle_rate: runs.create / get_agent が 429 を返す確率
+    simulated_time: True なら sleep せず仮想時計を進める（ベンチマーク高速化）
+    poll_hint_sec: 実行中の runs.get 応答に付ける Retry-After（秒）
+    """
+
+    def __init__(self, endpoint="fake://local", request_latency=0.0, run_duration=0.0,
+                 history_size=0, throttle_rate=0.0, response_text=SAMPLE_RESPONSE,
+                 tokens_per_run=3000, supports_run_filter=True, simulated_time=False, poll_hint_sec=None, seed=0):
+        import random
+
+        self.endpoint = endpoint
+        self.request_latency = request_latency
+        self._run_duration = run_duration
+        self.history_size = history_size
+        self.throttle_rate = throttle_rate
+        self.response_text = response_text
+        self.tokens_per_run = tokens_per_run
+        self.supports_run_filter = supports_run_filter
+        self.simulated_time = simulated_time
+        self.poll_hint_sec = poll_hint_sec
+        self._virtual_now = 0.0
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.threads = {}
+        self.runs = {}
+        self.stats = FakeStats()
+        self.agents = _Agents(self)
+
+    def run_duration(self):
+        return self._run_duration() if callable(self._run_duration) else self._run_duration
+
+    def clock(self):
+        return self._virtual_now if self.simulated_time else time.monotonic()
+
+    def _sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.simulated_time:
+            self._virtual_now += seconds
+        else:
+            time.sleep(seconds)
+
+    def _maybe_throttle(self):
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            self.stats.add("throttled")
+            raise FakeHttpError(429, "Too Many Requests", retry_after=1)
+
+
+_fake_clients = {}
+_fake_clients_lock = threading.Lock()
+
+
+def create_fake_client(backend):
+    """src.routing 用のクライアント生成関数。fake:// エンドポイントごとに FakeProject を1つ共有する。
+
+    例: fake://east?latency=0.01&run=2&throttle=0.1（run は run 完了までの秒数、throttle は 429 の確率）
+
+        AZURE_AGENT_CLIENT_FACTORY = "benchmarks.fake_agent:create_fake_client"
+    """
+    endpoint = getattr(backend, "endpoint", backend)
+    with _fake_clients_lock:
+        project = _fake_clients.get(endpoint)
+        if project is None:
+            params = {key: float(values[0]) for key, values in parse_qs(urlparse(endpoint).query).items()}
+            project = FakeProject(
+                endpoint,
+                request_latency=params.get("latency", 0.0),
+                run_duration=params.get("run", 0.0),
+                throttle_rate=params.get("throttle", 0.0),
+            )
+            _fake_clients[endpoint] = project
+    return project
@@ -0,0 +1,367 @@
+"""複数セッションの負荷試験（1 台の Streamlit サーバーで何人の同時利用に耐えるか）
+
+    python -m benchmarks.load_test [--users 10] [--run-sec 2] [--ramp-sec 5]
+    python -m benchmarks.load_test --save-baseline   # 現在の結果を基準値として保存
+
+WebSocket クライアントに websockets を使う（pip install -r benchmarks/requirements.txt）。
+
+一時ディレクトリを作業ディレクトリとして main.py を `streamlit run` で起動し（キャッシュ・アーカイブ・
+Blob ストアはすべてその中に作られる）、エージェントは AZURE_AGENT_CLIENT_FACTORY でフェイク
+（benchmarks.fake_agent）に差し替える。各利用者はブラウザと同じ WebSocket（/_stcore/stream）で
+接続し、BackMsg の rerun_script でウィジェット操作を送って
+
+    初回表示 → 調査対象入力 → 調査観点入力 → AI調査開始 → スライド生成 → 次のスライド ×3 → ダウンロード用ファイル作成
+
+を行う。各操作の送信から最後の script_finished（st.rerun の連鎖を含む）までを再実行レイテンシとして
+段階ごとの p50 / p95 / p99 を出し、サーバープロセスの RSS・CPU 時間を /proc から採取して
+1 セッションあたりの増分を求める。同時実行下のレイテンシは回ごとの揺らぎが大きい（10 人で ±30% 程度）ため
+--repeat 回サーバーを起動し直して繰り返し、レイテンシは全回を合わせた百分位、RSS・CPU は各回の中央値とする。
+標本数の少ない百分位（段階ごとの p95 など）は表示のみで判定には使わない。
+結果は基準値（--baseline）と比較し、許容幅を超えて悪化した指標があれば終了コード 1 を返す。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "main.py")
+DEFAULT_BASELINE_PATH = os.path.join(REPO_DIR, "benchmarks", "load_test_baseline.json")
+
+FINAL_STATUSES = {
+    ForwardMsg.ScriptFinishedStatus.FINISHED_SUCCESSFULLY,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_WITH_COMPILE_ERROR,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+}
+# 基準値との比較で無視する差（揺らぎ）。単位は指標名の接尾辞で判断する
+REGRESSION_FLOOR = {"_ms": 100.0, "_mb": 2.0, "_sec": 0.05}
+# 百分位を判定に使うのに必要な標本数（少ないと p95 / p99 は最大値と変わらない）
+MIN_SAMPLES = {"p50": 20, "p95": 50, "p99": 100}
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 1e6
+
+
+def cpu_sec(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        # comm に空白を含みうるため ")" 以降を分割（utime, stime は 14, 15 番目）
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir, port, run_sec, latency_sec, backend_concurrency):
+    backends = [{"name": "load", "endpoint": f"fake://load?run={run_sec}&latency={latency_sec}",
+                 "agent_id": "load-agent", "max_concurrency": backend_concurrency}]
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+        AZURE_AGENT_BACKENDS=json.dumps(backends),
+        AZURE_AGENT_CLIENT_FACTORY="benchmarks.fake_agent:create_fake_client",
+    )
+    command = [sys.executable, "-m", "streamlit", "run", APP_PATH,
+               "--server.headless", "true", "--server.port", str(port), "--server.address", "127.0.0.1",
+               "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+               "--browser.gatherUsageStats", "false"]
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class SessionDriver:
+    """ブラウザ 1 タブ分の WebSocket セッション"""
+
+    def __init__(self, url, step_timeout):
+        self.url = url
+        self.step_timeout = step_timeout
+        self.ws = None
+        self.values = {}
+        self.widgets = {}
+        self.errors = []
+
+    async def connect(self, wait_sec=60):
+        deadline = time.monotonic() + wait_sec
+        while True:
+            try:
+                self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+                return
+            except (OSError, websockets.InvalidHandshake, websockets.InvalidStatus):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, trigger=None):
+        """現在のウィジェット値（と押したボタン）を送り、再実行が終わるまでの秒数を返す"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        states = [WidgetState(id=widget_id, string_value=value) for widget_id, value in self.values.items()]
+        if trigger:
+            states.append(WidgetState(id=trigger, trigger_value=True))
+        message.rerun_script.widget_states.widgets.extend(states)
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        await asyncio.wait_for(self._read_until_finished(), self.step_timeout)
+        return time.perf_counter() - started
+
+    async def _read_until_finished(self):
+        widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                body = getattr(element, element_type)
+                if element_type == "exception":
+                    self.errors.append(body.message)
+                elif getattr(body, "id", None) and getattr(body, "label", None):
+                    widgets[body.label] = body.id
+            elif kind == "script_finished":
+                if forward.script_finished in FINAL_STATUSES:
+                    self.widgets = widgets
+                    return
+                # st.rerun による途中終了。次の実行のウィジェットを集め直す
+                widgets = {}
+
+    def widget_id(self, label):
+        if label not in self.widgets:
+            raise LookupError(f"ウィジェット「{label}」が表示されていません")
+        return self.widgets[label]
+
+    async def type_text(self, label, value):
+        self.values[self.widget_id(label)] = value
+        return await self.rerun()
+
+    async def click(self, label):
+        return await self.rerun(trigger=self.widget_id(label))
+
+
+async def user_flow(index, url, args, latencies, rng):
+    """1 人分の操作列。段階名 → レイテンシ（秒）を latencies に追記し、セッションを返す"""
+    session = SessionDriver(url, args.step_timeout)
+    await session.connect()
+
+    async def think():
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    steps = [
+        ("load", session.rerun),
+        ("input_target", lambda: session.type_text("調査対象 *", f"株式会社負荷{index:04d}")),
+        ("input_focus", lambda: session.type_text("調査観点 *", "生成AI活用状況")),
+        ("research", lambda: session.click("🚀 AI調査開始")),
+        ("slides", lambda: session.click("📊 スライド生成開始")),
+        *[("next_slide", lambda: session.click("次へ ▶"))] * 3,
+        ("download_files", lambda: session.click("📦 ダウンロード用ファイルを作成")),
+    ]
+    for name, step in steps:
+        try:
+            latencies.setdefault(name, []).append(await step())
+        except (LookupError, asyncio.TimeoutError, websockets.ConnectionClosed) as e:
+            session.errors.append(f"{name}: {type(e).__name__}: {e}")
+            break
+        await think()
+    return session
+
+
+async def run_round(args, seed):
+    """サーバーを起動して 1 回分の負荷をかけ、生の計測値を返す"""
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    with tempfile.TemporaryDirectory(prefix="load_test_") as workdir:
+        server = start_server(workdir, port, args.run_sec, args.latency_ms / 1000,
+                              args.backend_concurrency or args.users)
+        try:
+            # 初回の import・接続を計測から除く
+            for index in range(args.warmup):
+                warm = await user_flow(10_000 + index, url, args, {}, random.Random(index))
+                await warm.close()
+            idle_rss, idle_cpu = rss_mb(server.pid), cpu_sec(server.pid)
+
+            peak = {"rss_mb": idle_rss}
+            sampling = True
+
+            async def sample_rss():
+                while sampling:
+                    peak["rss_mb"] = max(peak["rss_mb"], rss_mb(server.pid))
+                    await asyncio.sleep(0.1)
+
+            sampler = asyncio.create_task(sample_rss())
+            latencies = {}
+
+            async def staggered(index):
+                await asyncio.sleep(args.ramp_sec * index / max(1, args.users))
+                return await user_flow(index, url, args, latencies, random.Random(seed + index))
+
+            started = time.perf_counter()
+            sessions = await asyncio.gather(*(staggered(i) for i in range(args.users)))
+            elapsed = time.perf_counter() - started
+            # セッションを開いたまま保持メモリを測る
+            loaded_rss, loaded_cpu = rss_mb(server.pid), cpu_sec(server.pid)
+            sampling = False
+            await sampler
+            for session in sessions:
+                await session.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+    return {
+        "latencies": latencies,
+        "elapsed_sec": elapsed,
+        "completed_sessions": sum(not session.errors for session in sessions),
+        "errors": [error for session in sessions for error in session.errors],
+        "resources": {
+            "server.idle_rss_mb": idle_rss,
+            "server.peak_rss_mb": peak["rss_mb"],
+            "server.rss_per_session_mb": (loaded_rss - idle_rss) / args.users,
+            "server.cpu_per_session_sec": (loaded_cpu - idle_cpu) / args.users,
+        },
+    }
+
+
+async def run_load(args):
+    """--repeat 回分を実行し、レイテンシは全回を合わせた百分位、資源は各回の中央値にまとめる"""
+    rounds = [await run_round(args, args.seed + 1000 * i) for i in range(args.repeat)]
+    latencies = {}
+    for result in rounds:
+        for name, values in result["latencies"].items():
+            latencies.setdefault(name, []).extend(values)
+    all_latencies = [value for values in latencies.values() for value in values]
+    metrics = {}
+    for name, values in latencies.items():
+        for q in (50, 95, 99):
+            metrics[f"{name}.p{q}_ms"] = round(percentile(values, q / 100) * 1000, 1)
+    # 全段階を合わせた分布は短い再実行と重い再実行の二峰になり中央値が安定しないため、裾のみ
+    for q in (95, 99):
+        metrics[f"all.p{q}_ms"] = round(percentile(all_latencies, q / 100) * 1000, 1)
+    for name in rounds[0]["resources"]:
+        digits = 1 if name.endswith("rss_mb") and "per_session" not in name else 3
+        metrics[name] = round(statistics.median(result["resources"][name] for result in rounds), digits)
+    return {
+        "config": {"users": args.users, "run_sec": args.run_sec, "latency_ms": args.latency_ms,
+                   "ramp_sec": args.ramp_sec, "think_ms": args.think_ms},
+        "repeat": args.repeat,
+        "elapsed_sec": [round(result["elapsed_sec"], 1) for result in rounds],
+        "completed_sessions": sum(result["completed_sessions"] for result in rounds),
+        "errors": [error for result in rounds for error in result["errors"]],
+        "counts": {name: len(values) for name, values in latencies.items()},
+        "metrics": metrics,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """(指標, 基準値, 今回, 変化率, 判定) の一覧。判定は regression / ok / few samples"""
+    counts = dict(report["counts"], all=sum(report["counts"].values()))
+    rows = []
+    for name, value in report["metrics"].items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = (value - base) / base if base else 0.0
+        step, _, stat = name.partition(".")
+        if counts.get(step, 0) < MIN_SAMPLES.get(stat.split("_")[0], 0):
+            verdict = "few samples"
+        else:
+            floor = next((v for suffix, v in REGRESSION_FLOOR.items() if name.endswith(suffix)), 0.0)
+            verdict = "regression" if value > base * (1 + tolerance) and value - base > floor else "ok"
+        rows.append((name, base, value, change, verdict))
+    return rows
+
+
+def print_report(report):
+    config = report["config"]
+    print(f"users {config['users']} x {report['repeat']} round(s), run {config['run_sec']}s, "
+          f"elapsed {report['elapsed_sec']}s, completed sessions {report['completed_sessions']}/"
+          f"{config['users'] * report['repeat']}")
+    metrics = report["metrics"]
+    print(f"{'step':>15} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in [*report["counts"], "all"]:
+        count = report["counts"].get(name, sum(report["counts"].values()))
+        cells = [metrics.get(f"{name}.p{q}_ms") for q in (50, 95, 99)]
+        print(f"{name:>15} {count:5d} " + " ".join(f"{cell:9.1f}" if cell is not None else f"{'-':>9}" for cell in cells))
+    print(f"server RSS idle {metrics['server.idle_rss_mb']}MB, peak {metrics['server.peak_rss_mb']}MB, "
+          f"{metrics['server.rss_per_session_mb']}MB/session, CPU {metrics['server.cpu_per_session_sec']}s/session")
+    for error in report["errors"][:10]:
+        print(f"  error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10, help="同時利用者数")
+    parser.add_argument("--run-sec", type=float, default=2.0, help="フェイクエージェントの run 所要秒数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="フェイクエージェントの 1 リクエストあたりの遅延")
+    parser.add_argument("--ramp-sec", type=float, default=5.0, help="全員が接続し終えるまでの秒数")
+    parser.add_argument("--think-ms", type=float, default=300, help="操作間の平均待ち時間")
+    parser.add_argument("--backend-concurrency", type=int, help="フェイクバックエンドの同時実行上限（既定は利用者数）")
+    parser.add_argument("--repeat", type=int, default=3, help="サーバーを起動し直して繰り返す回数")
+    parser.add_argument("--warmup", type=int, default=1, help="計測前に流す利用者数")
+    parser.add_argument("--step-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準値として保存")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="基準値からの悪化を許容する割合")
+    parser.add_argument("--output", help="結果の JSON を保存するパス")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": report["config"], "metrics": report["metrics"]}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基準値を保存しました: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("基準値がありません（--save-baseline で保存）")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print(f"注意: 基準値と条件が異なります（基準値: {baseline.get('config')}）")
+    rows = compare(report, baseline["metrics"], args.tolerance)
+    print(f"\nvs baseline (tolerance {args.tolerance:.0%})")
+    for name, base, value, change, verdict in rows:
+        mark = {"regression": "  REGRESSION", "few samples": "  (few samples)"}.get(verdict, "")
+        print(f"{name:>32} {base:10.2f} -> {value:10.2f} {change:+7.1%}{mark}")
+    if report["errors"] or any(row[-1] == "regression" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import streamlit as st
 import json
-import time
+import uuid
 import re
 from datetime import datetime
 import pandas as pd
-from src import azure_agent, slide_generator
+import altair as alt
+from src import azure_agent, credentials, data_processing, analytics, slide_generator, slide_export, exporter, health, tracing, archive, blob_store, scheduler, routing, result_cache, result_diff, watchlist, prewarm, profiling, codec, autocomplete, query_similarity
 from src.azure_agent import create_fallback_response
 
 # ページ設定
@@ -73,9 +74,101 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# トレーシングの初期化（TRACING_ENABLED 時のみ有効、プロセスで1回のみ）
+tracing.setup_tracing()
+
+# 認証ソースの探索とトークン取得を先行実行（プロセスで1回のみ起動）
+credentials.warm_up()
+
+# ヘルスチェックの定期プローブと /healthz エンドポイント（プロセスで1回のみ起動）
+health.start_health_prober()
+health.start_health_server()
+
+# アイドルセッションの参照解放と未参照 Blob の削除（プロセスで1回のみ起動）
+blob_store.start_sweeper()
+
+# 結果キャッシュ（Blob の参照元として登録。期限切れは定期的に削除）と、ウォッチリストの事前計算（WATCHLIST_ENABLED 時のみ）
+result_cache.start_pruner()
+watchlist.start_watchlist_refresher()
+
+# 入力中に事前作成したスレッドのうち、使われなかったものの回収（プロセスで1回のみ起動）
+prewarm.start_sweeper()
+
+# 保存データ用の圧縮辞書を書き込まれた応答から定期的に学習し直す（プロセスで1回のみ起動）
+codec.start_trainer()
+
+# アーカイブに調査対象・調査観点が増えたら入力補完のインデックスを作り直す（プロセスで1回のみ起動）
+autocomplete.start_refresher()
+
+# 大きなペイロード（調査結果・スライド HTML・PDF）は Blob ストアに置き、セッションにはハッシュのみ保持する
+PAYLOAD_KEYS = ['research_results', 'slide_result', 'slide_html', 'slide_pptx', 'slide_pdf']
+SLIDE_FILE_KEYS = ['slide_html', 'slide_pptx', 'slide_pdf']
+
+
+def set_payload(key, value):
+    """ペイロードを Blob ストアへ保存し、セッションにはハッシュを記録"""
+    st.session_state[f"{key}_ref"] = blob_store.get_blob_store().put(value) if value is not None else None
+
+
+def get_payload(key):
+    """セッションのハッシュからペイロードを遅延ロード（未設定・削除済みなら None）"""
+    return blob_store.get_blob_store().get(st.session_state.get(f"{key}_ref"))
+
+
+def clear_payloads(*keys):
+    for key in keys or PAYLOAD_KEYS:
+        st.session_state.pop(f"{key}_ref", None)
+
+
+def current_user_id():
+    """スケジューラの公平性に使う利用者識別子（ログイン時はメールアドレス、未ログインはセッション ID）"""
+    try:
+        if st.user.is_logged_in:
+            return st.user.email
+    except Exception:
+        pass
+    return st.session_state.session_id
+
+
+def load_cached_result(entry, target, focus_area):
+    """キャッシュ済みの結果と事前生成スライドをハッシュのままセッションへ載せる"""
+    clear_payloads()
+    st.session_state.research_results_ref = entry['result_ref']
+    st.session_state.slide_html_ref = entry['slide_html_ref']
+    st.session_state.slide_pptx_ref = entry['slide_pptx_ref']
+    if entry['slide_html_ref'] and entry['slide_pptx_ref']:
+        set_payload('slide_result', slide_generator.generate_slides_with_html(
+            None, target, focus_area, include_html=False))
+        st.session_state.slide_index = 0
+        st.session_state.slide_generated = True
+    st.session_state.cache_info = {
+        'age_hours': entry['age_hours'],
+        'stale_sections': entry['stale_sections'],
+        'source': entry['source'],
+        # 調査観点の言い換えとして提示した結果を使った場合のみ
+        'similar_to': entry['focus_area'] if 'similarity' in entry else None,
+        'similarity': entry.get('similarity'),
+    }
+    st.session_state.research_status = 'completed'
+
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def load_quality_trend(freq, report_count):
+    """アーカイブの期間別品質推移（件数が変わるか 10 分経過で再集計）"""
+    return analytics.archive_trend(archive.get_archive(), freq)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_slide_fragment(results_ref, target, focus_area, index):
+    """プレビュー用の 1 枚分の HTML（調査結果のハッシュ・対象・観点・スライド番号ごとにキャッシュ）"""
+    research_data = blob_store.get_blob_store().get(results_ref) or {}
+    ctx = slide_generator.build_slide_context(research_data, target, focus_area)
+    return slide_generator.render_slide_preview(ctx, index)
+
+
 # セッション状態の初期化
-if 'research_results' not in st.session_state:
-    st.session_state.research_results = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'research_status' not in st.session_state:
     st.session_state.research_status = 'ready'
 if 'slide_generated' not in st.session_state:
@@ -83,6 +176,19 @@ if 'slide_generated' not in st.session_state:
 if 'search_params' not in st.session_state:
     st.session_state.search_params = {}
 
+# アイドル期間を超えてペイロードが削除されていた場合は該当部分を初期状態に戻す
+for key in PAYLOAD_KEYS:
+    ref = st.session_state.get(f"{key}_ref")
+    if ref and not blob_store.get_blob_store().exists(ref):
+        clear_payloads(key)
+        if key == 'research_results':
+            st.session_state.research_status = 'ready'
+        if key in ('research_results', 'slide_result'):
+            st.session_state.slide_generated = False
+            clear_payloads(*SLIDE_FILE_KEYS)
+blob_store.get_blob_store().touch_session(
+    st.session_state.session_id, [st.session_state.get(f"{key}_ref") for key in PAYLOAD_KEYS])
+
 # データ処理関数は src/data_processing.py から使用
 from src.data_processing import (
     safe_get, safe_get_list, extract_year, extract_employee_count, 
@@ -124,13 +230,67 @@ def get_focus_area_suggestions(focus_area):
         "人材": ["採用戦略", "人材育成", "働き方改革", "組織改革", "人事制度"]
     }
     
-    suggestions = []
+    # 過去に調査した観点（入力補完）を優先し、キーワード連想で補う
+    suggestions = [
+        s["name"] for s in autocomplete.get_index("focus_area").suggest(focus_area, limit=4)
+        if s["name"] != focus_area
+    ]
     for key, values in suggestion_map.items():
         if key.lower() in focus_area.lower():
             suggestions.extend(values)
             break
     
-    return suggestions[:3]
+    return list(dict.fromkeys(suggestions))[:3]
+
+def get_target_suggestions(target, limit=4):
+    """調査対象の入力補完（企業マスタ・過去の調査対象から。入力と同じ名前は除く）"""
+    return [
+        s["name"] for s in autocomplete.get_index("target").suggest(target, limit=limit + 1)
+        if s["name"] != target
+    ][:limit]
+
+def select_target_suggestion(name):
+    """入力補完の候補を調査対象の入力欄に反映"""
+    st.session_state.target_input = name
+
+# run の経過時間から進捗を見積もる際、過去の実績がない場合に想定する所要時間（秒）
+DEFAULT_EXPECTED_RUN_SEC = 60
+
+RUN_STATUS_LABELS = {
+    "queued": "エージェントの実行待ち",
+    "in_progress": "Web検索・業界分析を実行中",
+    "requires_action": "ツールの実行待ち",
+    "cancelling": "キャンセル中",
+}
+
+
+def profiling_active():
+    """サイドバーの切り替え（初期値は PROFILING_ENABLED）"""
+    return st.session_state.get('profiling_enabled', profiling.profiling_enabled())
+
+
+def remember_profile(profile):
+    """直近の計測結果をデバッグ表示用にセッションへ保持"""
+    if profile is not None:
+        st.session_state.last_profile = profile.summary()
+
+
+def research_progress(stage, info):
+    """調査の段階通知を (進捗%, 状態, 詳細) に変換"""
+    if stage == "queue":
+        return 5, "実行枠を待機中...", "他の調査の完了を待っています"
+    if stage == "connect":
+        return 10, "Azure AI Agentに接続中...", f"接続先: {info.get('backend')}"
+    if stage == "run":
+        elapsed = info.get("elapsed_sec") or 0
+        expected = info.get("expected_sec") or DEFAULT_EXPECTED_RUN_SEC
+        progress = 15 + int(70 * min(elapsed / expected, 0.95)) if info.get("status") == "in_progress" else 15
+        label = RUN_STATUS_LABELS.get(info.get("status"), info.get("status"))
+        return progress, f"{label}...", f"経過 {elapsed:.0f} 秒（目安 {expected:.0f} 秒）"
+    if stage == "fetch":
+        return 88, "応答を取得中...", "エージェントの回答を取得"
+    return 95, "データを構造化中...", "JSON形式でデータを整理・品質チェック"
+
 
 def display_enhanced_progress(target, focus_area):
     """拡張進捗表示"""
@@ -150,32 +310,38 @@ def display_enhanced_progress(target, focus_area):
         st.write(f"🔍 **観点:** {focus_area}")
         st.write(f"⏰ **開始:** {datetime.now().strftime('%H:%M:%S')}")
     
-    # 詳細な進捗シミュレーション
-    stages = [
-        (15, "Azure AI Agentを初期化中...", "エージェント接続を確立"),
-        (30, "Web検索を実行中...", "企業情報・業界データを収集"),
-        (50, "業界分析を実行中...", "競合企業・市場規模を調査"),
-        (70, "先進事例を調査中...", "ベストプラクティスを収集"),
-        (85, "データを構造化中...", "JSON形式でデータを整理"),
-        (95, "品質チェック実行中...", "データの妥当性を検証"),
-        (100, "調査完了", "レポート生成準備完了")
-    ]
-    
-    for progress, main_status, detail_status in stages:
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # 実際の調査実行（段階・run の状態に応じて進捗を更新）
+    def on_progress(stage, info):
+        progress, main_status, detail_status = research_progress(stage, info)
         progress_bar.progress(progress)
         status_text.text(main_status)
         detail_text.text(f"📋 {detail_status}")
-        time.sleep(0.3)  # 実際の処理時間に合わせて調整
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    # 実際の調査実行
-    results = azure_agent.call_azure_ai_agent(target, focus_area, "")
+
+    with profiling.profile_request("research", enabled=profiling_active()) as profile:
+        results = azure_agent.call_azure_ai_agent(
+            target, focus_area, "", user_id=current_user_id(), on_progress=on_progress,
+            prewarm_key=st.session_state.session_id if prewarm.prewarm_enabled() else None)
+    remember_profile(profile)
+    progress_bar.progress(100)
+    status_text.text("調査完了")
     
     # streamlit.py と同じ判定
     if results:
-        st.session_state.research_results = results
+        set_payload('research_results', results)
         st.session_state.research_status = 'completed'
+
+        # 完了した調査はアーカイブと結果キャッシュへ保存（フォールバックデータは除外）
+        if results.get('research_status') == 'completed':
+            try:
+                archive.get_archive().save_result(target, focus_area, results)
+            except Exception as e:
+                st.warning(f"調査結果のアーカイブ保存に失敗しました: {e}")
+            try:
+                result_cache.get_result_cache().put(target, focus_area, results)
+            except Exception as e:
+                st.warning(f"調査結果のキャッシュ保存に失敗しました: {e}")
         
         # データ品質の表示
         quality_score = results.get('data_quality_score', 0)
@@ -193,6 +359,116 @@ def display_enhanced_progress(target, focus_area):
         st.session_state.research_status = 'error'
         st.rerun()
 
+def display_result_changes(record):
+    """前回の調査結果からの変更点（項目単位）と、内容が変わったスライドを表示"""
+    changes = record['changes']
+    changed_at = datetime.fromtimestamp(record['changed_at']).strftime('%Y/%m/%d %H:%M')
+    with st.expander(f"🆕 前回の調査からの変更（{len(changes)}件・{changed_at}）", expanded=bool(changes)):
+        if not changes:
+            st.write("前回の調査結果から内容の変更はありません。")
+            return
+        st.write(" / ".join(f"**{label}** {count}件" for _, label, count in result_diff.summarize_changes(changes)))
+        if record['changed_slides']:
+            st.caption("内容が変わったスライド: " + ", ".join(
+                f"スライド{index + 1}（{slide_generator.SLIDE_TITLES[index]}）" for index in record['changed_slides']))
+        st.dataframe(
+            [{"項目": result_diff.format_path(change['path']), "種別": result_diff.CHANGE_LABELS[change['change']],
+              "前回": result_diff.format_value(change['old']), "今回": result_diff.format_value(change['new'])}
+             for change in changes],
+            hide_index=True, use_container_width=True,
+        )
+
+
+def display_similar_offer(offer, target, focus_area):
+    """言い換えにあたる観点のキャッシュ済み結果を、すぐに表示するか新しく調査するか選ばせる"""
+    entry = offer['entry']
+    st.info(f"💡 似た観点「{entry['focus_area']}」の調査結果がキャッシュ済みです"
+            f"（類似度 {entry['similarity']:.2f}・{entry['age_hours']:.1f}時間前に更新）")
+    use_col, run_col = st.columns(2)
+    with use_col:
+        if st.button("⚡ この結果を表示", key="similar_accept", use_container_width=True):
+            result_cache.get_result_cache().resolve_similar(entry['match_id'], True)
+            st.session_state.pop('similar_offer', None)
+            load_cached_result(entry, entry['target'], entry['focus_area'])
+            st.rerun()
+    with run_col:
+        if st.button("🔍 新しく調査", key="similar_decline", use_container_width=True):
+            result_cache.get_result_cache().resolve_similar(entry['match_id'], False)
+            st.session_state.pop('similar_offer', None)
+            st.session_state.research_status = 'processing'
+            st.rerun()
+
+
+def display_archive_search():
+    """サイドバー: 過去の調査結果を全文検索して読み込む"""
+    st.header("📚 過去の調査")
+    query = st.text_input("キーワード検索", placeholder="例: 生成AI", key="archive_query")
+    field = st.selectbox(
+        "検索範囲",
+        [None] + archive.SEARCH_FIELDS,
+        format_func=lambda name: "すべて" if name is None else archive.FIELD_LABELS[name],
+        key="archive_field",
+    )
+    try:
+        hits = archive.get_archive().search(query, field=field, limit=20)
+    except Exception as e:
+        st.caption(f"アーカイブを利用できません: {e}")
+        return
+    if not hits:
+        st.caption("該当する調査結果はありません")
+        return
+    for hit in hits:
+        score = hit['quality_score'] or 0
+        label = f"{hit['target']} / {hit['focus_area']}（{hit['created_at'][:10]}・品質 {score:.1f}）"
+        if st.button(label, key=f"archive_{hit['id']}", use_container_width=True):
+            loaded = archive.get_archive().get_result(hit['id'])
+            if loaded:
+                st.session_state.target_input, st.session_state.focus_area_input, loaded_results = loaded
+                set_payload('research_results', loaded_results)
+                st.session_state.research_status = 'completed'
+                st.session_state.slide_generated = False
+                clear_payloads('slide_result', *SLIDE_FILE_KEYS)
+                st.session_state.pop('cache_info', None)
+                st.rerun()
+        if hit.get('snippet'):
+            st.caption(hit['snippet'])
+
+def display_quality_dashboard():
+    """アーカイブ全体の品質スコア・データ完成度・項目別充足率の推移"""
+    if not st.toggle("アーカイブを集計する", key="quality_dashboard"):
+        return
+    freq = st.radio("集計単位", analytics.FREQUENCIES, index=1, horizontal=True, key="quality_freq",
+                    format_func={"day": "日", "week": "週", "month": "月"}.get)
+    try:
+        rows = load_quality_trend(freq, archive.get_archive().count())
+    except Exception as e:
+        st.caption(f"アーカイブを利用できません: {e}")
+        return
+    if not rows:
+        st.caption("集計できる調査結果はありません")
+        return
+    trend = pd.DataFrame(
+        [{"期間": row['period'], "平均品質スコア": row['mean_score'], "データ完成度": row['completion_rate'] * 100,
+          "低品質の割合": row['low_quality_rate'] * 100, "件数": row['count']} for row in rows]
+    ).set_index("期間")
+    latest = rows[-1]
+    st.metric("平均品質スコア（直近）", f"{latest['mean_score']:.2f}",
+              f"{latest['mean_score'] - rows[-2]['mean_score']:+.2f}" if len(rows) > 1 else None)
+    st.line_chart(trend[["平均品質スコア"]], height=160)
+    st.line_chart(trend[["データ完成度", "低品質の割合"]], height=160)
+    st.caption(f"項目別の充足率（{latest['period']}・{latest['count']}件）")
+    fill_rates = pd.DataFrame(
+        [{"項目": result_diff.format_path(field), "充足率": rate * 100} for field, rate in latest['fill_rates'].items()]
+    )
+    # 横棒は st.bar_chart(horizontal=True) が Streamlit 1.36 以降のため Altair で描く
+    st.altair_chart(
+        alt.Chart(fill_rates).mark_bar().encode(
+            x=alt.X("充足率:Q", scale=alt.Scale(domain=[0, 100])), y=alt.Y("項目:N", sort=None),
+        ).properties(height=320),
+        use_container_width=True,
+    )
+    st.caption("品質スコアは現在の評価基準で再計算しています")
+
 # ===== メイン関数 =====
 
 def main():
@@ -201,16 +477,19 @@ def main():
     # サイドバー
     with st.sidebar:
         st.header("システム情報")
+        deep_check = st.checkbox("エージェント実行まで確認（トークン消費あり）", value=False)
         if st.button("🧪 Azure接続テスト", use_container_width=True):
-            res = azure_agent.test_connection()
+            res = health.check_health(deep=deep_check)
             if res.get("ok"):
-                st.success("Azure接続: OK")
+                st.success("Azure接続: OK" + ("（キャッシュ）" if res.get("cached") else ""))
                 with st.expander("レスポンス"):
                     st.json(res)
             else:
                 st.error("Azure接続: 失敗")
                 st.write(f"ステージ: {res.get('stage')}")
                 st.write(f"詳細: {res.get('detail')}")
+        st.toggle("🔬 プロファイリング", value=profiling.profiling_enabled(), key="profiling_enabled",
+                  help="調査・スライド作成の段階別処理時間とフレームグラフを保存（結果は「構造化データ」タブのデバッグ情報）")
         st.info("""        
         **調査項目:**
         - 企業基本データ ✓
@@ -223,8 +502,9 @@ def main():
         """)
         
         # システム状態表示
-        if st.session_state.research_results:
-            quality = st.session_state.research_results.get('data_quality_score', 0)
+        sidebar_results = get_payload('research_results')
+        if sidebar_results:
+            quality = sidebar_results.get('data_quality_score', 0)
             if quality >= 8:
                 st.success("✅ 高品質データで調査完了")
             elif quality >= 6:
@@ -235,6 +515,39 @@ def main():
             if st.session_state.slide_generated:
                 st.success("✅ スライド生成完了")
 
+        with st.expander("⏱️ 実行キュー"):
+            queue_metrics = scheduler.get_scheduler().metrics()
+            st.write(f"実行中: {queue_metrics['running']} / {queue_metrics['max_concurrency']}")
+            st.write("待ち件数: " + ", ".join(f"{name} {depth}" for name, depth in queue_metrics['queue_depth'].items()))
+            interactive_wait = queue_metrics['wait_sec']['interactive']['p95']
+            if interactive_wait is not None:
+                st.write(f"対話利用の待ち時間 p95: {interactive_wait:.1f} 秒")
+            limit = queue_metrics['token_limit_today']
+            st.write(f"本日のトークン: {queue_metrics['tokens_used_today']:,}" + (f" / {limit:,}" if limit else ""))
+            backends = routing.backend_status()
+            if len(backends) > 1:
+                st.dataframe(
+                    [{"バックエンド": b["name"], "実行中": b["inflight"],
+                      "レイテンシ(秒)": b["ewma_latency_sec"], "エラー率": b["error_rate"],
+                      "429": b["throttled"], "休止(秒)": b["cooldown_sec"]} for b in backends],
+                    hide_index=True, use_container_width=True,
+                )
+            refresher = watchlist.refresher_status()
+            if refresher['last_result']:
+                last = refresher['last_result']
+                st.write(f"事前計算（{datetime.fromtimestamp(refresher['last_cycle_at']):%m/%d %H:%M}）: "
+                         f"更新 {last['refreshed']} / 失敗 {last['failed']} / 残り {last['remaining']}")
+            if refresher['last_error']:
+                st.error(f"事前計算エラー（{datetime.fromtimestamp(refresher['last_error_at']):%m/%d %H:%M}）: "
+                         f"{refresher['last_error']}")
+            for warning in refresher['warnings']:
+                st.warning(f"ウォッチリスト: {warning}")
+
+        display_archive_search()
+
+        with st.expander("📈 品質トレンド"):
+            display_quality_dashboard()
+
     # 入力セクション
     with st.container():
         st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -245,6 +558,7 @@ def main():
         with col1:
             target = st.text_input(
                 "調査対象 *",
+                key="target_input",
                 placeholder="例: 株式会社メルカリ、共同通信社",
                 help="企業名または人名を入力してください"
             )
@@ -256,10 +570,20 @@ def main():
                     st.warning(target_validation["message"])
                 else:
                     st.success("✓ 有効な調査対象です")
+                    target_suggestions = get_target_suggestions(target)
+                    if target_suggestions:
+                        suggestion_cols = st.columns(len(target_suggestions))
+                        for index, name in enumerate(target_suggestions):
+                            suggestion_cols[index].button(
+                                name, key=f"target_suggestion_{index}",
+                                on_click=select_target_suggestion, args=(name,),
+                                use_container_width=True,
+                            )
             
         with col2:
             focus_area = st.text_input(
                 "調査観点 *", 
+                key="focus_area_input",
                 placeholder="例: 生成AI活用状況、DX推進の取り組み",
                 help="調査したい観点をフリーワードで入力"
             )
@@ -283,28 +607,83 @@ def main():
     with col2:
         target_valid = validate_target(target).get("valid", False) if target else False
         can_execute = target and focus_area and target_valid
+
+        # 入力が揃った時点で、キャッシュ確認とエージェント・スレッドの準備をバックグラウンドで開始
+        if can_execute and st.session_state.research_status != 'processing' and prewarm.prewarm_enabled():
+            prewarm.get_prewarmer().prewarm(st.session_state.session_id, target, focus_area)
         
         # ボタンを中央に配置
         st.markdown('<div class="center-button">', unsafe_allow_html=True)
         if st.button("🚀 AI調査開始", type="primary", disabled=not can_execute):
             if can_execute:
-                st.session_state.research_status = 'processing'
-                st.session_state.research_results = None
+                clear_payloads()
                 st.session_state.slide_generated = False
+                st.session_state.pop('cache_info', None)
+                st.session_state.pop('similar_offer', None)
+                # 同じ対象・観点のキャッシュがあればエージェントを実行せずに表示。
+                # なければ同じ対象で言い換えにあたる観点の結果を探し、使うかどうかを選んでもらう
+                cache = result_cache.get_result_cache()
+                cached = cache.lookup(target, focus_area)
+                similar = None if cached else cache.find_similar(target, focus_area)
+                if cached:
+                    load_cached_result(cached, target, focus_area)
+                elif similar:
+                    st.session_state.similar_offer = {'query': (target, focus_area), 'entry': similar}
+                else:
+                    st.session_state.research_status = 'processing'
                 st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
+        similar_offer = st.session_state.get('similar_offer')
+        if similar_offer and similar_offer['query'] != (target, focus_area):
+            st.session_state.pop('similar_offer', None)
+            similar_offer = None
+        if similar_offer:
+            display_similar_offer(similar_offer, target, focus_area)
+        elif can_execute:
+            prewarm_status = prewarm.get_prewarmer().status(st.session_state.session_id)
+            if prewarm_status and prewarm_status["cache_hit"]:
+                st.caption("⚡ この対象・観点はキャッシュ済みです（すぐに表示されます）")
+            elif prewarm_status and prewarm_status["similar"]:
+                st.caption(f"💡 似た観点「{prewarm_status['similar']['focus_area']}」の調査結果がキャッシュ済みです"
+                           f"（類似度 {prewarm_status['similar']['similarity']:.2f}）")
     
     # 処理状況表示
     if st.session_state.research_status == 'processing':
         display_enhanced_progress(target, focus_area)
     
     # 結果表示
-    if st.session_state.research_results and st.session_state.research_status == 'completed':
+    results = get_payload('research_results')
+    if results and st.session_state.research_status == 'completed':
         st.markdown('<div class="result-section">', unsafe_allow_html=True)
         st.subheader("📊 調査結果")
         
+        cache_info = st.session_state.get('cache_info')
+        if cache_info:
+            info_col, refresh_col = st.columns([4, 1])
+            with info_col:
+                if cache_info.get('similar_to'):
+                    st.info(f"⚡ 似た観点「{cache_info['similar_to']}」のキャッシュ済みの調査結果です"
+                            f"（類似度 {cache_info['similarity']:.2f}・{cache_info['age_hours']:.1f}時間前に更新）")
+                    st.caption("観点によって内容が変わる項目: " + ", ".join(
+                        result_diff.SECTION_LABELS[name] for name in query_similarity.FOCUS_SECTIONS))
+                else:
+                    st.info(f"⚡ キャッシュ済みの調査結果です（{cache_info['age_hours']:.1f}時間前に更新）")
+                if cache_info['stale_sections']:
+                    st.caption("更新期限を過ぎた項目: " + ", ".join(cache_info['stale_sections']))
+            with refresh_col:
+                if st.button("🔄 最新情報で再調査"):
+                    clear_payloads()
+                    st.session_state.slide_generated = False
+                    st.session_state.pop('cache_info', None)
+                    st.session_state.research_status = 'processing'
+                    st.rerun()
+        
+        # 前回の調査からの変更（表示中の結果について記録された差分のみ）
+        latest_changes = result_cache.get_result_cache().latest_changes(target, focus_area)
+        if latest_changes and latest_changes['result_ref'] == st.session_state.get('research_results_ref'):
+            display_result_changes(latest_changes)
+        
         # データ品質とメタ情報
-        results = st.session_state.research_results
         quality_score = results.get('data_quality_score', 0)
         search_count = results.get('search_count', 0)
         
@@ -423,6 +802,16 @@ def main():
             if show_debug and results.get('raw_response'):
                 st.write("#### 🔧 生のエージェント応答")
                 st.text_area("エージェント応答", results['raw_response'], height=200)
+
+            last_profile = st.session_state.get('last_profile')
+            if show_debug and last_profile:
+                st.write(f"#### ⏱️ 段階別の処理時間（{last_profile['name']}・合計 {last_profile['total_ms']:,.0f} ms）")
+                st.dataframe(
+                    [{"段階": row["stage"], "経過 (ms)": row["wall_ms"], "CPU (ms)": row["cpu_ms"],
+                      "サンプル数": row["samples"]} for row in last_profile["stages"]],
+                    hide_index=True, use_container_width=True,
+                )
+                st.caption(f"プロファイル・フレームグラフ（.folded）の保存先: {last_profile['directory']}")
             
             # メインデータの表示
             st.write("#### 📊 構造化済みデータ")
@@ -434,14 +823,20 @@ def main():
             st.json(clean_data)
             
             # データ完成度の表示
-            total_fields = 8  # 主要フィールド数
-            completed_fields = sum(1 for key in ['company_profile', 'industry_analysis', 'current_challenges', 
-                                               'focus_area_analysis', 'best_practices', 'market_trends', 
-                                               'industry_metrics', 'industry_voice'] 
-                                 if results.get(key))
+            total_fields = len(data_processing.COMPLETENESS_FIELDS)  # 主要フィールド数
+            completed_fields = data_processing.calculate_completeness(results)
             
             completion_rate = (completed_fields / total_fields) * 100
             st.write(f"**データ完成度:** {completion_rate:.0f}% ({completed_fields}/{total_fields} フィールド)")
+
+            # 列形式エクスポート
+            st.download_button(
+                label="📥 CSV（列形式）でダウンロード",
+                data=exporter.results_to_csv_bytes([(target, focus_area, results)]),
+                file_name=f"research_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime='text/csv',
+                help="調査結果を型付きの列に展開したCSV"
+            )
         
         with tab4:
             st.write("### 🎯 プレゼンテーション用スライド生成")
@@ -464,9 +859,13 @@ def main():
                 with col1:
                     if st.button("📊 スライド生成開始", type="primary"):
                         with st.spinner("HTMLスライドを生成中..."):
-                            slide_result = slide_generator.generate_slides_with_html(results, target, focus_area)
+                            # プレビューは1枚ずつ描画し、デッキ全体はダウンロード用ファイル作成時に生成する
+                            slide_result = slide_generator.generate_slides_with_html(
+                                results, target, focus_area, include_html=False)
                             if slide_result:
-                                st.session_state.slide_result = slide_result
+                                set_payload('slide_result', slide_result)
+                                clear_payloads(*SLIDE_FILE_KEYS)
+                                st.session_state.slide_index = 0
                                 st.session_state.slide_generated = True
                                 st.success("✅ スライド生成完了!")
                                 st.rerun()
@@ -478,43 +877,92 @@ def main():
             
             else:
                 st.success("✅ スライド生成完了!")
-                slide_result = st.session_state.slide_result
+                slide_result = get_payload('slide_result')
+                
+                slide_count = slide_result['slide_count']
+                slide_index = min(st.session_state.get('slide_index', 0), slide_count - 1)
                 
                 # スライド情報
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("生成スライド数", f"{slide_result['slide_count']}枚")
+                    st.metric("生成スライド数", f"{slide_count}枚")
                 with col2:
                     st.metric("フォーマット", slide_result['format'])
                 with col3:
-                    st.metric("ファイルサイズ", f"{len(slide_result['html_content'])//1024}KB")
+                    st.metric("表示中", f"{slide_index + 1} / {slide_count}")
                 
-                # プレビュー表示
+                # プレビュー表示（選択中の1枚のみをブラウザへ送る）
                 st.write("#### 👀 スライドプレビュー")
+                nav1, nav2, nav3 = st.columns([1, 4, 1])
+                with nav1:
+                    if st.button("◀ 前へ", disabled=slide_index == 0, use_container_width=True):
+                        st.session_state.slide_index = slide_index - 1
+                        st.rerun()
+                with nav2:
+                    st.markdown(f"**スライド{slide_index + 1}:** {slide_generator.SLIDE_TITLES[slide_index]}")
+                with nav3:
+                    if st.button("次へ ▶", disabled=slide_index >= slide_count - 1, use_container_width=True):
+                        st.session_state.slide_index = slide_index + 1
+                        st.rerun()
                 
-                # HTMLをStreamlitで表示
                 st.components.v1.html(
-                    slide_result['html_content'],
-                    height=600,
+                    render_slide_fragment(st.session_state.research_results_ref, target, focus_area, slide_index),
+                    height=620,
                     scrolling=True
                 )
                 
-                # ダウンロード機能
+                # ダウンロード機能（デッキ全体はここで初めて生成する）
                 st.write("#### 💾 ダウンロード")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.download_button(
-                        label="📄 HTMLファイルをダウンロード",
-                        data=slide_result['html_content'],
-                        file_name=slide_result['filename'],
-                        mime='text/html',
-                        type="primary",
-                        help="ブラウザで開いてプレゼンテーション可能"
-                    )
-                
-                with col2:
-                    st.info("💡 **PDF化する場合**\nHTMLファイルをブラウザで開き、\n印刷 → PDFで保存してください")
+                slide_html = get_payload('slide_html')
+                slide_pptx = get_payload('slide_pptx')
+                if slide_html is None or slide_pptx is None:
+                    if st.button("📦 ダウンロード用ファイルを作成", type="primary"):
+                        with st.spinner("HTML / PowerPoint ファイルを作成中..."), \
+                                profiling.profile_request("slides", enabled=profiling_active()) as profile:
+                            fragment_store = result_cache.get_result_cache()
+                            set_payload('slide_html', slide_generator.generate_html_slides(
+                                results, target, focus_area, fragment_store=fragment_store))
+                            set_payload('slide_pptx', slide_export.render_deck_bytes(
+                                results, target, focus_area, fmt="pptx", fragment_store=fragment_store))
+                        remember_profile(profile)
+                        st.rerun()
+                else:
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        st.download_button(
+                            label="📄 HTMLファイルをダウンロード",
+                            data=slide_html,
+                            file_name=slide_result['filename'],
+                            mime='text/html',
+                            type="primary",
+                            help="ブラウザで開いてプレゼンテーション可能"
+                        )
+                    
+                    with col2:
+                        st.download_button(
+                            label="📊 PowerPointファイルをダウンロード",
+                            data=slide_pptx,
+                            file_name=slide_result['filename'].replace('.html', '.pptx'),
+                            mime='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+                            help="HTML版と同じデータで4枚のスライドを作成"
+                        )
+                        if slide_export.find_pdf_renderer():
+                            if st.button("📑 PDFを作成"):
+                                with st.spinner("PDFを作成中..."), \
+                                        profiling.profile_request("pdf", enabled=profiling_active()) as profile:
+                                    set_payload('slide_pdf', slide_export.render_deck_bytes(results, target, focus_area, fmt="pdf"))
+                                remember_profile(profile)
+                            slide_pdf = get_payload('slide_pdf')
+                            if slide_pdf:
+                                st.download_button(
+                                    label="📑 PDFファイルをダウンロード",
+                                    data=slide_pdf,
+                                    file_name=slide_result['filename'].replace('.html', '.pdf'),
+                                    mime='application/pdf'
+                                )
+                        else:
+                            st.info("💡 **PDF化する場合**\nHTMLファイルをブラウザで開き、\n印刷 → PDFで保存してください")
                 
                 # スライドの詳細情報
                 st.write("#### ℹ️ スライド詳細")
@@ -530,7 +978,8 @@ def main():
         st.markdown('<div class="center-button">', unsafe_allow_html=True)
         if st.button("🔄 新しい調査を開始", type="secondary"):
                 # セッション状態をクリア
-                for key in ['research_results', 'research_status', 'slide_generated', 'slide_result']:
+                clear_payloads()
+                for key in ['research_status', 'slide_generated', 'cache_info', 'similar_offer']:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.session_state.research_status = 'ready'
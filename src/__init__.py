@@ -2,8 +2,30 @@
 
 __all__ = [
     "azure_agent",
+    "credentials",
     "data_processing",
     "slide_generator",
+    "slide_export",
+    "exporter",
+    "health",
+    "tracing",
+    "archive",
+    "backfill",
+    "blob_store",
+    "scheduler",
+    "routing",
+    "run_polling",
+    "prewarm",
+    "profiling",
+    "codec",
+    "result_cache",
+    "query_similarity",
+    "result_diff",
+    "analytics",
+    "autocomplete",
+    "watchlist",
+    "normalization",
+    "company_index",
     "ui_components",
     "validators",
     "utils",
@@ -0,0 +1,174 @@
+"""調査結果の一括品質分析（NumPy）
+
+多数の解析済み結果を列形式に展開し、品質スコア・データ完成度・項目ごとの充足率をまとめて計算する。
+各結果は項目（QUALITY_CHECKS のパスと COMPLETENESS_FIELDS）ごとに一度だけ走査して
+値の種類・長さ・真偽を (件数 × 項目数) の行列に格納し、以降の集計はすべて行列演算で行う。
+品質スコアは calculate_response_quality と同じ順序で重みを加算するため、スカラー版と完全に一致する。
+
+    python -m src.analytics [--archive data/research_archive.db] [--freq week] [--since 2026-01-01]
+"""
+import argparse
+from datetime import date
+
+import numpy as np
+
+from .data_processing import COMPLETENESS_FIELDS, MAX_QUALITY_SCORE, QUALITY_CHECKS
+
+
+# 値の種類（存在しない・途中が辞書でない・その他の型は KIND_OTHER）
+KIND_OTHER, KIND_STR, KIND_LIST, KIND_DICT = 0, 1, 2, 3
+_KINDS = {str: KIND_STR, list: KIND_LIST, dict: KIND_DICT}
+
+# 行列の列（品質スコアの評価項目 → 完成度の主要フィールドの順、重複なし）
+FIELDS = list(dict.fromkeys([path for path, _ in QUALITY_CHECKS] + COMPLETENESS_FIELDS))
+_FIELD_KEYS = [tuple(path.split(".")) for path in FIELDS]
+_QUALITY_COLUMNS = [FIELDS.index(path) for path, _ in QUALITY_CHECKS]
+_COMPLETENESS_COLUMNS = [FIELDS.index(key) for key in COMPLETENESS_FIELDS]
+# スカラー版で文字列が加点される最小の長さ（プレースホルダ「データ取得中...」「調査実行中」はこれ未満）
+MIN_SCORED_TEXT_LENGTH = 11
+
+FREQUENCIES = ("day", "week", "month")
+
+
+def _kind(value):
+    if isinstance(value, str):
+        return KIND_STR
+    if isinstance(value, list):
+        return KIND_LIST
+    if isinstance(value, dict):
+        return KIND_DICT
+    return KIND_OTHER
+
+
+def flatten_results(results):
+    """解析済み結果の反復を {"fields", "kind", "length", "truthy"}（件数 × 項目数の配列）に展開"""
+    # 1 セルを「長さ << 2 | 種類」の整数 1 つで表す（文字列・リスト・辞書以外の長さは真偽の 0/1）
+    cells = []
+    append = cells.append
+    kinds = _KINDS
+    for result in results:
+        for keys in _FIELD_KEYS:
+            value = result.get(keys[0])
+            for key in keys[1:]:
+                value = value.get(key) if isinstance(value, dict) else None
+            kind = kinds.get(type(value)) or _kind(value)
+            append((len(value) if kind else bool(value)) << 2 | kind)
+    packed = np.array(cells, dtype=np.int64).reshape(-1, len(FIELDS))
+    length = packed >> 2
+    return {"fields": FIELDS, "kind": (packed & 3).astype(np.int8), "length": length, "truthy": length > 0}
+
+
+def scored_fields(matrix):
+    """品質スコアの評価項目ごとに加点されるか（件数 × len(QUALITY_CHECKS) の bool）"""
+    kind = matrix["kind"][:, _QUALITY_COLUMNS]
+    length = matrix["length"][:, _QUALITY_COLUMNS]
+    return ((kind == KIND_STR) & (length >= MIN_SCORED_TEXT_LENGTH)) | \
+        (((kind == KIND_LIST) | (kind == KIND_DICT)) & (length > 0))
+
+
+def quality_scores(matrix):
+    """品質スコア（calculate_response_quality と同値の float64 配列）"""
+    scored = scored_fields(matrix)
+    scores = np.zeros(len(scored))
+    # スカラー版と同じ順序で加算し、浮動小数点の丸めまで一致させる
+    for column, (_, weight) in enumerate(QUALITY_CHECKS):
+        scores += np.where(scored[:, column], weight, 0.0)
+    return np.minimum(scores, MAX_QUALITY_SCORE)
+
+
+def completeness(matrix):
+    """値が入っている主要フィールドの数（calculate_completeness と同値の配列）"""
+    return matrix["truthy"][:, _COMPLETENESS_COLUMNS].sum(axis=1)
+
+
+def fill_rates(matrix):
+    """項目ごとの充足率（値が空でない結果の割合）"""
+    if not len(matrix["truthy"]):
+        return {field: 0.0 for field in FIELDS}
+    return dict(zip(FIELDS, matrix["truthy"].mean(axis=0).tolist()))
+
+
+def score_results(results):
+    """解析済み結果の一括評価 {"count", "scores", "completeness", "fill_rates"}"""
+    matrix = flatten_results(results)
+    return {
+        "count": len(matrix["kind"]),
+        "scores": quality_scores(matrix),
+        "completeness": completeness(matrix),
+        "fill_rates": fill_rates(matrix),
+    }
+
+
+def period_of(created_at, freq="week"):
+    """ISO 形式の日時を集計期間の名前に変換（week は週の月曜日の日付）"""
+    if freq == "day":
+        return created_at[:10]
+    if freq == "month":
+        return created_at[:7]
+    if freq == "week":
+        day = date.fromisoformat(created_at[:10])
+        return date.fromordinal(day.toordinal() - day.weekday()).isoformat()
+    raise ValueError(f"未対応の集計単位です: {freq}")
+
+
+def quality_trend(records, freq="week"):
+    """(created_at, result) の反復を期間ごとに集計する。
+
+    期間の古い順に {"period", "count", "mean_score", "low_quality_rate", "completion_rate", "fill_rates"} を返す。
+    low_quality_rate は品質スコア 6 未満（画面の「改善の余地あり」以下）の割合。
+    """
+    periods, results = [], []
+    for created_at, result in records:
+        periods.append(period_of(created_at, freq))
+        results.append(result)
+    if not results:
+        return []
+    matrix = flatten_results(results)
+    scores = quality_scores(matrix)
+    names, groups = np.unique(np.array(periods), return_inverse=True)
+    counts = np.bincount(groups)
+    score_sums = np.bincount(groups, weights=scores)
+    low_counts = np.bincount(groups, weights=scores < 6)
+    completed = np.bincount(groups, weights=completeness(matrix)) / len(COMPLETENESS_FIELDS)
+    filled = np.stack([np.bincount(groups, weights=matrix["truthy"][:, column], minlength=len(names))
+                       for column in range(len(FIELDS))], axis=1)
+    return [
+        {
+            "period": str(name),
+            "count": int(counts[index]),
+            "mean_score": float(score_sums[index] / counts[index]),
+            "low_quality_rate": float(low_counts[index] / counts[index]),
+            "completion_rate": float(completed[index] / counts[index]),
+            "fill_rates": dict(zip(FIELDS, (filled[index] / counts[index]).tolist())),
+        }
+        for index, name in enumerate(names)
+    ]
+
+
+def archive_trend(archive, freq="week", since=None):
+    """アーカイブ全体（since 以降）の品質推移。スコアは現在の評価基準で計算し直す"""
+    return quality_trend(((created_at, result) for created_at, _, _, result in archive.iter_results(since)), freq)
+
+
+def main(argv=None):
+    from .archive import DEFAULT_ARCHIVE_PATH, ResearchArchive
+
+    parser = argparse.ArgumentParser(description="アーカイブの品質推移を集計")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH)
+    parser.add_argument("--freq", choices=FREQUENCIES, default="week")
+    parser.add_argument("--since", help="この日時（ISO 形式）以降の調査結果のみ")
+    args = parser.parse_args(argv)
+
+    archive = ResearchArchive(args.archive)
+    try:
+        rows = archive_trend(archive, args.freq, args.since)
+    finally:
+        archive.close()
+    print(f"{'期間':<10} {'件数':>6} {'平均スコア':>8} {'低品質率':>8} {'完成度':>7}")
+    for row in rows:
+        print(f"{row['period']:<10} {row['count']:>6} {row['mean_score']:>10.2f} "
+              f"{row['low_quality_rate']:>10.1%} {row['completion_rate']:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""調査結果アーカイブ（SQLite + FTS5 全文検索）
+
+完了した調査結果（解析済みデータと raw_response）をローカルの SQLite に保存し、
+FTS5 の trigram トークナイザで全文索引を張る。trigram は分かち書き不要のため日本語でも
+部分一致検索ができ、数万件規模でもミリ秒単位で応答する。
+3 文字未満のクエリは trigram で索引が引けないため LIKE による走査にフォールバックする。
+解析済みデータ（result_json）は src/codec.py で圧縮して保存する。索引列（raw_response 等）は
+FTS5 の外部コンテンツとして snippet・LIKE 検索が直接読むため非圧縮のまま保持する。
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .codec import get_codec
+from .data_processing import safe_get, safe_get_list
+from .utils import get_setting
+
+
+DEFAULT_ARCHIVE_PATH = os.path.join("data", "research_archive.db")
+MIN_FTS_QUERY_LENGTH = 3
+DEFAULT_SEARCH_LIMIT = 50
+
+# 全文索引の対象列（field 指定検索で使用できる名前）
+SEARCH_FIELDS = [
+    "target",
+    "focus_area",
+    "company_name",
+    "industry_name",
+    "business_overview",
+    "challenges",
+    "initiatives",
+    "best_practices",
+    "trends",
+    "raw_response",
+]
+
+FIELD_LABELS = {
+    "target": "調査対象",
+    "focus_area": "調査観点",
+    "company_name": "企業名",
+    "industry_name": "業界",
+    "business_overview": "事業概要",
+    "challenges": "課題",
+    "initiatives": "取り組み",
+    "best_practices": "先進事例",
+    "trends": "トレンド",
+    "raw_response": "生レスポンス",
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    quality_score REAL,
+    research_status TEXT,
+    result_json TEXT NOT NULL,
+    {", ".join(f"{name} TEXT" for name in SEARCH_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS idx_reports_target ON reports(target);
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at);
+"""
+
+_FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+    {", ".join(SEARCH_FIELDS)},
+    content='reports', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+def _join(items):
+    return "\n".join(str(item) for item in items if item)
+
+
+def document_fields(target, focus_area, result):
+    """調査結果から索引対象の列値を取り出す"""
+    return {
+        "target": target or "",
+        "focus_area": focus_area or "",
+        "company_name": safe_get(result, "company_profile.official_name", ""),
+        "industry_name": safe_get(result, "industry_analysis.industry_name", ""),
+        "business_overview": safe_get(result, "company_profile.business_overview", ""),
+        "challenges": _join(
+            f"{c.get('specific_issue', '')} {c.get('business_impact', '')}".strip()
+            for c in safe_get_list(result, "current_challenges") if isinstance(c, dict)
+        ),
+        "initiatives": _join(
+            f"{i.get('initiative', '')} {json.dumps(i.get('results', ''), ensure_ascii=False)}".strip()
+            for i in safe_get_list(result, "focus_area_analysis.current_initiatives") if isinstance(i, dict)
+        ),
+        "best_practices": _join(
+            f"{p.get('company', '')} {p.get('results', '')}".strip()
+            for p in safe_get_list(result, "best_practices") if isinstance(p, dict)
+        ),
+        "trends": _join(
+            f"{t.get('trend_name', '')} {t.get('description', '')}".strip()
+            for t in safe_get_list(result, "market_trends.key_trends") if isinstance(t, dict)
+        ),
+        "raw_response": result.get("raw_response", "") or "",
+    }
+
+
+def _result_json(result):
+    """raw_response は索引列側に保持するため JSON からは除き、圧縮して保存する"""
+    data = json.dumps({k: v for k, v in result.items() if k != "raw_response"}, ensure_ascii=False, default=str)
+    return get_codec().encode(data.encode("utf-8"))
+
+
+def _load_result_json(value):
+    """圧縮済み（bytes）・導入前の JSON 文字列のどちらも復元する"""
+    return json.loads(get_codec().decode(value) if isinstance(value, bytes) else value)
+
+
+def _fts_phrase(query):
+    """利用者入力を FTS5 のフレーズとして安全に引用する"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _like_pattern(query):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class ResearchArchive:
+    """調査結果の保存と全文検索"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # trigram 非対応の古い SQLite では LIKE 検索のみ
+            self.fts_enabled = False
+
+    def save_result(self, target, focus_area, result, created_at=None):
+        """調査結果を保存し、レポート ID を返す"""
+        return self.save_many([(target, focus_area, result)], created_at=created_at)[0]
+
+    def save_many(self, records, created_at=None):
+        """(target, focus_area, result) の反復を1トランザクションで保存"""
+        ids = []
+        with self._lock, self._conn:
+            for target, focus_area, result in records:
+                fields = document_fields(target, focus_area, result)
+                cursor = self._conn.execute(
+                    f"INSERT INTO reports (created_at, quality_score, research_status, result_json, "
+                    f"{', '.join(SEARCH_FIELDS)}) VALUES (?, ?, ?, ?, {', '.join('?' * len(SEARCH_FIELDS))})",
+                    (
+                        created_at or datetime.now().isoformat(timespec="seconds"),
+                        result.get("data_quality_score"),
+                        result.get("research_status"),
+                        _result_json(result),
+                        *[fields[name] for name in SEARCH_FIELDS],
+                    ),
+                )
+                if self.fts_enabled:
+                    self._conn.execute(
+                        f"INSERT INTO reports_fts (rowid, {', '.join(SEARCH_FIELDS)}) "
+                        f"VALUES (?, {', '.join('?' * len(SEARCH_FIELDS))})",
+                        (cursor.lastrowid, *[fields[name] for name in SEARCH_FIELDS]),
+                    )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def update_results(self, items):
+        """(report_id, target, focus_area, result) の反復で既存レポートを1トランザクションで置き換える"""
+        columns = ", ".join(SEARCH_FIELDS)
+        with self._lock, self._conn:
+            for report_id, target, focus_area, result in items:
+                old = self._conn.execute(f"SELECT {columns} FROM reports WHERE id = ?", (report_id,)).fetchone()
+                if old is None:
+                    continue
+                fields = document_fields(target, focus_area, result)
+                if self.fts_enabled:
+                    # 外部コンテンツ表の索引は旧値を渡して削除してから再登録する
+                    self._conn.execute(
+                        f"INSERT INTO reports_fts (reports_fts, rowid, {columns}) "
+                        f"VALUES ('delete', ?, {', '.join('?' * len(SEARCH_FIELDS))})",
+                        (report_id, *old),
+                    )
+                self._conn.execute(
+                    f"UPDATE reports SET quality_score = ?, research_status = ?, result_json = ?, "
+                    f"{', '.join(f'{name} = ?' for name in SEARCH_FIELDS)} WHERE id = ?",
+                    (
+                        result.get("data_quality_score"),
+                        result.get("research_status"),
+                        _result_json(result),
+                        *[fields[name] for name in SEARCH_FIELDS],
+                        report_id,
+                    ),
+                )
+                if self.fts_enabled:
+                    self._conn.execute(
+                        f"INSERT INTO reports_fts (rowid, {columns}) VALUES (?, {', '.join('?' * len(SEARCH_FIELDS))})",
+                        (report_id, *[fields[name] for name in SEARCH_FIELDS]),
+                    )
+
+    def search(self, query, field=None, limit=DEFAULT_SEARCH_LIMIT):
+        """全文検索。field 指定時はその列のみ対象。新しい順に返す"""
+        query = (query or "").strip()
+        if field is not None and field not in SEARCH_FIELDS:
+            raise ValueError(f"検索できない項目です: {field}")
+        if not query:
+            return self.recent(limit)
+        columns = "r.id, r.created_at, r.target, r.focus_area, r.quality_score"
+        with self._lock:
+            if self.fts_enabled and len(query) >= MIN_FTS_QUERY_LENGTH:
+                match = f"{field} : {_fts_phrase(query)}" if field else _fts_phrase(query)
+                # rowid 降順なら FTS5 は一致を順に走査して LIMIT で打ち切るため、
+                # snippet の計算も返却する行だけで済む
+                rows = self._conn.execute(
+                    f"SELECT {columns}, f.snippet FROM ("
+                    "SELECT rowid, snippet(reports_fts, -1, '[', ']', '…', 12) AS snippet "
+                    "FROM reports_fts WHERE reports_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                    ") f JOIN reports r ON r.id = f.rowid ORDER BY r.id DESC",
+                    (match, limit),
+                ).fetchall()
+            else:
+                targets = [field] if field else SEARCH_FIELDS
+                where = " OR ".join(f"r.{name} LIKE ? ESCAPE '\\'" for name in targets)
+                rows = self._conn.execute(
+                    f"SELECT {columns}, NULL AS snippet FROM reports r WHERE {where} "
+                    "ORDER BY r.id DESC LIMIT ?",
+                    (*[_like_pattern(query)] * len(targets), limit),
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent(self, limit=DEFAULT_SEARCH_LIMIT):
+        """新しい順にレポート一覧を返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, target, focus_area, quality_score, NULL AS snippet "
+                "FROM reports ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_result(self, report_id):
+        """保存済みレポートを (target, focus_area, result) で返す（存在しなければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target, focus_area, result_json, raw_response FROM reports WHERE id = ?", (report_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        result = _load_result_json(row["result_json"])
+        if row["raw_response"]:
+            result["raw_response"] = row["raw_response"]
+        return row["target"], row["focus_area"], result
+
+    def iter_results(self, since=None, batch_size=1000):
+        """(created_at, target, focus_area, result) を古い順に返す（raw_response は含めない）。since は ISO 形式の日時"""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, created_at, target, focus_area, result_json FROM reports "
+                    "WHERE id > ? AND created_at >= ? ORDER BY id LIMIT ?",
+                    (last_id, since or "", batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            for row in rows:
+                yield row["created_at"], row["target"], row["focus_area"], _load_result_json(row["result_json"])
+
+    def value_counts(self, column):
+        """調査対象または調査観点ごとのレポート数（多い順の [(値, 件数)]）"""
+        if column not in ("target", "focus_area"):
+            raise ValueError(f"集計できない項目です: {column}")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {column}, COUNT(*) FROM reports GROUP BY {column} ORDER BY COUNT(*) DESC").fetchall()
+        return [(row[0], row[1]) for row in rows if row[0]]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """プロセス共通のアーカイブを取得（保存先は ARCHIVE_PATH）"""
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = ResearchArchive(get_setting("ARCHIVE_PATH", DEFAULT_ARCHIVE_PATH))
+    return _archive
@@ -0,0 +1,414 @@
+"""調査対象・調査観点の入力補完（ソート済み配列の前方一致 + 文字 bigram のあいまい検索）
+
+企業マスタ（別名・読みがなを含む）とアーカイブ済みの調査対象・調査観点から名前の一覧を作り、
+照合キー（NFKC・小文字化・空白と法人格の除去・カタカナ→ひらがな）と、かな表記から作るローマ字キー
+（訓令式・長音などの表記ゆれを寄せ、英字の名前と混ざらないよう印を付ける）を
+UTF-8 のバイト列として辞書順に並べ、1 本のバイト列＋オフセット配列に格納する。
+前方一致は二分探索で範囲を求め、範囲内の上位候補を重みのセグメント木から取り出すため、
+範囲の広さによらず O(log n + 候補数 × log n) で返る。
+前方一致で候補が足りない場合は、照合キーの bigram の転置索引で候補を絞り込み、編集距離で並べる。
+照合キー（ローマ字キーは除く）の完全一致は結果キャッシュのキー（調査対象の表記ゆれの吸収）にも使う。
+漢字の読みは辞書を持たないため、マスタの readings（読みがな）で与えたものだけがかな・ローマ字で引ける。
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+from .company_index import load_company_records
+from .utils import get_setting
+
+
+DEFAULT_LIMIT = 8
+DEFAULT_REFRESH_INTERVAL_SEC = 600
+FUZZY_MIN_SCORE = 70
+# あいまい検索の bigram はハッシュで区画に分ける（区画数は掲載数の 2 倍以上の 2 のべき乗、上限あり）。
+# 衝突した候補は編集距離の計算で除かれる
+MAX_GRAM_BUCKETS = 1 << 22
+# 掲載数がこれを超える bigram は候補の絞り込みに使わない（件数に対する割合、下限 MIN_POSTING_LIMIT）
+MAX_POSTING_RATIO = 0.002
+MIN_POSTING_LIMIT = 500
+
+# 調査観点の初期候補（アーカイブが空でも補完できるように）
+DEFAULT_FOCUS_AREAS = [
+    "生成AI活用状況", "DX推進の取り組み", "デジタルマーケティング", "人材育成", "働き方改革",
+    "業務効率化", "クラウド移行", "サステナビリティ", "新規事業開発", "海外展開",
+]
+
+_LEGAL_FORMS = r"株式会社|有限会社|合同会社|\(株\)|\(有\)|\(同\)"
+# 英字の法人格は空白・カンマの後（または単独）の場合のみ除く（"Zinc" や "Unicorp" の語尾は残す）
+_LEGAL_FORM_RE = re.compile(
+    rf"^\s*(?:{_LEGAL_FORMS})|(?:{_LEGAL_FORMS})\s*$"
+    r"|(?:^|[\s,]+)(?:inc|corporation|corp|co\.?,?\s*ltd|ltd|llc)\.?$")
+_KATA_TO_HIRA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+# ひらがな → ローマ字（ヘボン式）
+_KANA_ROMAJI = dict(zip(
+    "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわゐゑをん"
+    "がぎぐげござじずぜぞだぢづでどばびぶべぼぱぴぷぺぽぁぃぅぇぉゃゅょゎゔ",
+    "a i u e o ka ki ku ke ko sa shi su se so ta chi tsu te to na ni nu ne no ha hi fu he ho "
+    "ma mi mu me mo ya yu yo ra ri ru re ro wa i e o n ga gi gu ge go za ji zu ze zo da ji zu de do "
+    "ba bi bu be bo pa pi pu pe po a i u e o ya yu yo wa vu".split(),
+))
+for _head, _consonant in {"き": "ky", "ぎ": "gy", "に": "ny", "ひ": "hy", "び": "by", "ぴ": "py", "み": "my",
+                          "り": "ry", "し": "sh", "じ": "j", "ち": "ch", "ぢ": "j"}.items():
+    for _small, _vowel in (("ゃ", "a"), ("ゅ", "u"), ("ょ", "o"), ("ぇ", "e")):
+        _KANA_ROMAJI[_head + _small] = _consonant + _vowel
+for _head, _consonant in {"ふ": "f", "ゔ": "v", "う": "w", "て": "t", "で": "d"}.items():
+    for _small, _vowel in (("ぁ", "a"), ("ぃ", "i"), ("ぇ", "e"), ("ぉ", "o")):
+        _KANA_ROMAJI[_head + _small] = _consonant + _vowel
+
+# ローマ字の表記ゆれ（訓令式・長音・撥音）を一方に寄せる。照合キーと入力の両方に同じ変換をかける
+_ROMAJI_FOLDS = {
+    "sya": "sha", "syu": "shu", "syo": "sho", "tya": "cha", "tyu": "chu", "tyo": "cho",
+    "zya": "ja", "zyu": "ju", "zyo": "jo", "jya": "ja", "jyu": "ju", "jyo": "jo",
+    "si": "shi", "ti": "chi", "tu": "tsu", "hu": "fu", "zi": "ji", "di": "ji", "du": "zu",
+    "aa": "a", "ii": "i", "uu": "u", "ee": "e", "oo": "o", "ou": "o", "nn": "n", "mb": "nb", "mp": "np",
+}
+_ROMAJI_FOLD_RE = re.compile("|".join(sorted(_ROMAJI_FOLDS, key=len, reverse=True)))
+
+
+def fold_romaji(text):
+    return _ROMAJI_FOLD_RE.sub(lambda match: _ROMAJI_FOLDS[match.group()], text)
+
+
+def to_romaji(text):
+    """ひらがな（と英数字）をローマ字へ。変換できない文字（漢字など）を含めば None"""
+    out = []
+    double = False
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == "っ":
+            double = True
+            index += 1
+            continue
+        if char == "ー":
+            index += 1
+            continue
+        romaji = _KANA_ROMAJI.get(text[index:index + 2])
+        if romaji:
+            index += 2
+        elif char in _KANA_ROMAJI:
+            romaji = _KANA_ROMAJI[char]
+            index += 1
+        elif char.isascii():
+            romaji = char
+            index += 1
+        else:
+            return None
+        if double and romaji[0] not in "aeiou":
+            romaji = romaji[0] + romaji
+        double = False
+        out.append(romaji)
+    return "".join(out)
+
+
+def search_key(text):
+    """照合キー（NFKC・小文字化・法人格と空白の除去・カタカナ→ひらがな）"""
+    text = unicodedata.normalize("NFKC", text or "").lower().strip()
+    stripped = _LEGAL_FORM_RE.sub("", text)
+    return "".join((stripped or text).split()).translate(_KATA_TO_HIRA)
+
+
+def romaji_key(key):
+    """かな表記の照合キーから作るローマ字キー（表記ゆれを寄せたもの。英数字のみ・漢字を含む場合は None）"""
+    if key.isascii():
+        return None
+    romaji = to_romaji(key)
+    return fold_romaji(romaji) if romaji else None
+
+
+# かなから作ったローマ字キーの先頭に付ける印（英字の名前の照合キーと混ざらないように）
+ROMAJI_MARK = "\x01"
+
+
+def _bigrams(text):
+    if len(text) <= 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class AutocompleteIndex:
+    """名前の前方一致・あいまい一致の補完インデックス"""
+
+    def __init__(self, entries):
+        """entries: (表示名, 別の表記の反復, 重み) の反復。表記ごとに照合キーとローマ字キーを登録する"""
+        self.names = []
+        weights = []
+        keys = set()
+        for name, surfaces, weight in entries:
+            record_id = len(self.names)
+            self.names.append(name)
+            weights.append(float(weight))
+            for surface in {name, *surfaces}:
+                key = search_key(surface)
+                if not key:
+                    continue
+                keys.add((key.encode("utf-8"), record_id))
+                romaji = romaji_key(key)
+                if romaji:
+                    keys.add(((ROMAJI_MARK + romaji).encode("utf-8"), record_id))
+        ordered = sorted(keys)
+        self._blob = b"".join(key for key, _ in ordered)
+        self._offsets = array("q", [0])
+        position = 0
+        for key, _ in ordered:
+            position += len(key)
+            self._offsets.append(position)
+        self._ids = array("i", (record_id for _, record_id in ordered))
+        self._weights = array("d", weights)
+        self._build_tree()
+        self._build_postings()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _build_tree(self):
+        """キーの並び順に重みを並べた最大値セグメント木（範囲内の上位候補の取り出し用）"""
+        size = 1
+        while size < max(len(self._ids), 1):
+            size *= 2
+        tree = np.full(2 * size, -1.0)
+        tree[size:size + len(self._ids)] = np.asarray(self._weights)[np.asarray(self._ids, dtype=np.int64)]
+        width = size // 2
+        while width:
+            tree[width:2 * width] = np.maximum(tree[2 * width:4 * width:2], tree[2 * width + 1:4 * width:2])
+            width //= 2
+        self._size = size
+        self._tree = array("d")
+        self._tree.frombytes(tree.tobytes())
+
+    def _build_postings(self):
+        """キーの bigram（のハッシュ）→ キーの位置 の転置索引（CSR 形式）"""
+        hashes, posted, gram_counts = array("q"), array("i"), array("H")
+        for position in range(len(self._ids)):
+            grams = _bigrams(self._key(position).decode("utf-8"))
+            gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                hashes.append(hash(gram))
+                posted.append(position)
+        self._gram_counts = np.frombuffer(gram_counts, dtype=np.uint16)
+        buckets = 1 << 10
+        while buckets < min(2 * len(posted), MAX_GRAM_BUCKETS):
+            buckets *= 2
+        self._gram_mask = buckets - 1
+        grams = np.frombuffer(hashes, dtype=np.int64) & self._gram_mask
+        order = np.argsort(grams, kind="stable")
+        self._postings = np.frombuffer(posted, dtype=np.int32)[order]
+        self._gram_starts = np.searchsorted(grams[order], np.arange(buckets + 1))
+        self._posting_limit = max(MIN_POSTING_LIMIT, int(len(self.names) * MAX_POSTING_RATIO))
+
+    def _key(self, position):
+        return self._blob[self._offsets[position]:self._offsets[position + 1]]
+
+    def _lower(self, key):
+        return bisect_left(range(len(self._ids)), key, key=self._key)
+
+    def _top(self, lo, hi, limit, exclude):
+        """キー位置 [lo, hi) から重みの大きい順に最大 limit 件の (レコード ID, 重み)"""
+        tree, size, ids = self._tree, self._size, self._ids
+        heap = []
+        left, right = lo + size, hi + size
+        while left < right:
+            if left & 1:
+                heap.append((-tree[left], left))
+                left += 1
+            if right & 1:
+                right -= 1
+                heap.append((-tree[right], right))
+            left >>= 1
+            right >>= 1
+        heapq.heapify(heap)
+        found = []
+        while heap and len(found) < limit:
+            weight, node = heapq.heappop(heap)
+            if node < size:
+                heapq.heappush(heap, (-tree[2 * node], 2 * node))
+                heapq.heappush(heap, (-tree[2 * node + 1], 2 * node + 1))
+                continue
+            record_id = ids[node - size]
+            if record_id not in exclude:
+                exclude.add(record_id)
+                found.append((record_id, -weight))
+        return found
+
+    def _fuzzy(self, key, limit, exclude, min_score):
+        grams = _bigrams(key)
+        buckets = sorted(
+            (self._gram_starts[bucket + 1] - self._gram_starts[bucket], bucket)
+            for bucket in {hash(gram) & self._gram_mask for gram in grams}
+        )
+        # 掲載数の多すぎる bigram は使わない（すべて多すぎる場合は最も少ないものだけ先頭から使う）
+        usable = [bucket for count, bucket in buckets if 0 < count <= self._posting_limit] or \
+            [bucket for count, bucket in buckets[:1] if count]
+        if not usable:
+            return []
+        postings = np.concatenate([
+            self._postings[self._gram_starts[bucket]:self._gram_starts[bucket] + self._posting_limit]
+            for bucket in usable
+        ])
+        positions, counts = np.unique(postings, return_counts=True)
+        # 共通 bigram 数をキーの長さで正規化（Dice 係数）して、編集距離を計算する候補を選ぶ
+        dice = counts / (len(grams) + self._gram_counts[positions])
+        scored = {}
+        for position in positions[np.argsort(-dice, kind="stable")[:limit * 10]].tolist():
+            record_id = self._ids[position]
+            if record_id in exclude:
+                continue
+            candidate = self._key(position).decode("utf-8")
+            score = max(fuzz.ratio(key, candidate), fuzz.ratio(key, candidate[:len(key)]))
+            if score >= min_score and score > scored.get(record_id, 0):
+                scored[record_id] = score
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], -self._weights[item[0]]))
+        return ranked[:limit]
+
+    def suggest(self, text, limit=DEFAULT_LIMIT, fuzzy=True, min_score=FUZZY_MIN_SCORE):
+        """入力に続く候補 [{"name", "weight", "match"}]（前方一致を重み順に、足りなければあいまい一致で補う）"""
+        key = search_key(text)
+        if not key or not len(self._ids):
+            return []
+        # 英数字の入力はそのままの表記と、かなから作ったローマ字キー（表記ゆれを寄せたもの）の両方で引く
+        keys = [key, ROMAJI_MARK + fold_romaji(key)] if key.isascii() else [key]
+        exclude = set()
+        found = []
+        for variant in keys:
+            encoded = variant.encode("utf-8")
+            found += [
+                {"name": self.names[record_id], "weight": weight, "match": "prefix"}
+                for record_id, weight in self._top(
+                    self._lower(encoded), self._lower(encoded + b"\xff"), limit - len(found), exclude)
+            ]
+        if fuzzy and len(key) >= 2:
+            for variant in keys:
+                if len(found) >= limit:
+                    break
+                found += [
+                    {"name": self.names[record_id], "weight": self._weights[record_id], "match": "fuzzy"}
+                    for record_id, _ in self._fuzzy(variant, limit - len(found), exclude, min_score)
+                ]
+        return found
+
+    def canonical(self, text):
+        """照合キーが完全一致する名前（複数あれば重みの大きいもの。なければ None）。
+
+        ローマ字キーは表記ゆれを寄せて別の名前と重なりうるため、完全一致の解決には使わない。
+        """
+        key = search_key(text).encode("utf-8")
+        if not key:
+            return None
+        position = self._lower(key)
+        best = None
+        while position < len(self._ids) and self._key(position) == key:
+            record_id = self._ids[position]
+            if best is None or self._weights[record_id] > self._weights[best]:
+                best = record_id
+            position += 1
+        return self.names[best] if best is not None else None
+
+    def stats(self):
+        """件数とおおよそのメモリ使用量（バイト）"""
+        arrays = [self._offsets, self._ids, self._weights, self._tree]
+        return {
+            "names": len(self.names),
+            "keys": len(self._ids),
+            "index_bytes": len(self._blob) + sum(a.itemsize * len(a) for a in arrays)
+            + self._postings.nbytes + self._gram_starts.nbytes + self._gram_counts.nbytes,
+        }
+
+
+def _archive_counts(column):
+    from .archive import get_archive
+
+    try:
+        return get_archive().value_counts(column)
+    except Exception:
+        return []
+
+
+def build_target_index(records=None, counts=None):
+    """企業マスタ（組み込み＋COMPANY_MASTER_PATH）とアーカイブの調査対象から補完インデックスを作る。
+
+    照合キーが企業マスタの表記と一致する調査対象はそのレコードにまとめ、重みに調査回数を加える。
+    """
+    entries = {}
+    owners = {}
+    for record in load_company_records() if records is None else records:
+        entry = entries.setdefault(search_key(record["name"]), [record["name"], set(), 1.0])
+        for surface in [record["name"], *(record.get("aliases") or []), *(record.get("readings") or [])]:
+            entry[1].add(surface)
+            owners.setdefault(search_key(surface), entry)
+    for target, count in _archive_counts("target") if counts is None else counts:
+        key = search_key(target)
+        entry = owners.get(key) or entries.setdefault(key, [target, set(), 0.0])
+        owners.setdefault(key, entry)
+        entry[1].add(target)
+        entry[2] += count
+    return AutocompleteIndex(entry for entry in entries.values())
+
+
+def build_focus_area_index(counts=None):
+    """アーカイブの調査観点（と初期候補）から補完インデックスを作る"""
+    entries = {search_key(name): [name, set(), 1.0] for name in DEFAULT_FOCUS_AREAS}
+    for focus_area, count in _archive_counts("focus_area") if counts is None else counts:
+        entry = entries.setdefault(search_key(focus_area), [focus_area, set(), 0.0])
+        entry[1].add(focus_area)
+        entry[2] += count
+    return AutocompleteIndex(entry for entry in entries.values())
+
+
+_BUILDERS = {"target": build_target_index, "focus_area": build_focus_area_index}
+_indexes = {}
+_indexes_lock = threading.Lock()
+_refresher_thread = None
+
+
+def get_index(kind="target"):
+    """プロセス共通の補完インデックスを取得（kind: "target" / "focus_area"）"""
+    index = _indexes.get(kind)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(kind)
+            if index is None:
+                index = _indexes[kind] = _BUILDERS[kind]()
+    return index
+
+
+def refresh():
+    """マスタ・アーカイブの最新状態でインデックスを作り直して差し替える"""
+    built = {kind: builder() for kind, builder in _BUILDERS.items()}
+    with _indexes_lock:
+        _indexes.update(built)
+
+
+def _refresh_loop(interval):
+    from .archive import get_archive
+
+    last_count = None
+    while True:
+        time.sleep(interval)
+        try:
+            count = get_archive().count()
+            if count != last_count:
+                refresh()
+                last_count = count
+        except Exception:
+            pass
+
+
+def start_refresher():
+    """アーカイブが増えたらインデックスを作り直すスレッドを起動（プロセスで1回のみ）"""
+    global _refresher_thread
+    with _indexes_lock:
+        if _refresher_thread is None:
+            interval = float(get_setting("AUTOCOMPLETE_REFRESH_INTERVAL_SEC", DEFAULT_REFRESH_INTERVAL_SEC))
+            _refresher_thread = threading.Thread(
+                target=_refresh_loop, args=(interval,), name="autocomplete-refresh", daemon=True)
+            _refresher_thread.start()
+    return _refresher_thread
@@ -1,122 +1,74 @@
-import json
-import re
-from azure.ai.projects import AIProjectClient
-from azure.identity import (
-    DefaultAzureCredential,
-    AzureCliCredential,
-    AzureDeveloperCliCredential,
-    EnvironmentCredential,
-    InteractiveBrowserCredential,
-    ChainedTokenCredential,
-    ClientSecretCredential,
-)
+from itertools import islice
 from azure.ai.agents.models import ListSortOrder
 import streamlit as st
 
 from .data_processing import (
+    calculate_response_quality,
+    estimate_search_count,
     parse_agent_response,
-    extract_structured_data_from_text,
-    safe_get,
 )
-def build_credential():
-    """優先度つきで認証情報を構築する。
-    1) サービスプリンシパル (secrets: AZURE_TENANT_ID/AZURE_CLIENT_ID/AZURE_CLIENT_SECRET)
-    2) 環境変数 (EnvironmentCredential)
-    3) Azure Developer CLI (azd auth login)
-    4) Azure CLI (az login)
-    5) ブラウザ対話 (InteractiveBrowserCredential)
-    6) DefaultAzureCredential 最後の保険
-    """
-    try:
-        tenant_id = st.secrets.get("AZURE_TENANT_ID")
-        client_id = st.secrets.get("AZURE_CLIENT_ID")
-        client_secret = st.secrets.get("AZURE_CLIENT_SECRET")
-        if tenant_id and client_id and client_secret:
-            return ClientSecretCredential(tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)
-    except Exception:
-        pass
-
-    candidates = []
-    try:
-        candidates.append(EnvironmentCredential())
-    except Exception:
-        pass
-    try:
-        candidates.append(AzureDeveloperCliCredential())
-    except Exception:
-        pass
-    try:
-        candidates.append(AzureCliCredential())
-    except Exception:
-        pass
-    try:
-        candidates.append(InteractiveBrowserCredential())
-    except Exception:
-        pass
-    # 最後に Default を追加
-    try:
-        candidates.append(DefaultAzureCredential(exclude_broker=True))
-    except Exception:
-        pass
-    if not candidates:
-        # フォールバック
-        return DefaultAzureCredential(exclude_broker=True)
-    return ChainedTokenCredential(*candidates)
+from .company_index import get_company_index
+from .credentials import get_credential_manager
+from .prewarm import get_prewarmer
+from .profiling import stage
+from .routing import BackendThrottledError, create_client, get_router, load_backends
+from .run_polling import RunActionRequiredError, RunTimeoutError, create_and_wait
+from .scheduler import (
+    BudgetExceededError,
+    SchedulerTimeoutError,
+    estimated_tokens_per_run,
+    get_scheduler,
+    queue_timeout_sec,
+)
+from .tracing import set_attributes, span, traced
+
+
+# run 単位の最新メッセージ取得で 1 ページに要求する件数
+LATEST_MESSAGE_PAGE_SIZE = 5
+
 
 def get_credential():
-    """streamlit.py と同じ経路: DefaultAzureCredential を常に使用"""
-    return DefaultAzureCredential()
-
-
-def estimate_search_count(response_text: str) -> int:
-    """応答テキストから推定検索回数を計算"""
-    word_count = len(response_text.split())
-    company_mentions = len(re.findall(r'(?:株式会社|Inc\.|Corp\.|Ltd\.)', response_text))
-    base_count = min(15, max(5, word_count // 200))
-    bonus_count = min(5, company_mentions)
-    return base_count + bonus_count
-
-
-def calculate_response_quality(parsed_data: dict) -> float:
-    """応答データの品質スコアを計算"""
-    score = 0.0
-    max_score = 10.0
-    quality_checks = [
-        ("company_profile.official_name", 1.5),
-        ("company_profile.business_overview", 1.0),
-        ("industry_analysis.industry_name", 1.0),
-        ("current_challenges", 1.5),
-        ("focus_area_analysis.current_initiatives", 2.0),
-        ("best_practices", 1.5),
-        ("market_trends.key_trends", 1.0),
-        ("industry_metrics", 0.5),
-    ]
-    for field_path, weight in quality_checks:
-        field_value = safe_get(parsed_data, field_path)
-        if field_value and field_value != "データ取得中..." and field_value != "調査実行中":
-            if isinstance(field_value, list) and len(field_value) > 0:
-                score += weight
-            elif isinstance(field_value, str) and len(field_value) > 10:
-                score += weight
-            elif isinstance(field_value, dict) and field_value:
-                score += weight
-    return min(score, max_score)
+    """認証マネージャが記憶した認証ソースを使用（トークンはバックグラウンドで更新）"""
+    return get_credential_manager().get_credential()
+
+
+def fetch_latest_assistant_text(project, thread_id: str, run_id: str = None):
+    """run の最新アシスタント応答テキストのみを取得する。
+
+    新しい順・件数制限・run_id 絞り込みで 1 ページだけ取得し、
+    見つからない場合のみスレッド全体を新しい順にページングする（run_id のメッセージに限り、最初の応答で打ち切り）。
+    """
+    def first_assistant_text(messages):
+        for message in messages:
+            if message.role == "assistant" and message.text_messages:
+                return message.text_messages[-1].text.value
+        return None
+
+    if run_id:
+        messages = project.agents.messages.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order=ListSortOrder.DESCENDING,
+            limit=LATEST_MESSAGE_PAGE_SIZE,
+        )
+        text = first_assistant_text(islice(messages, LATEST_MESSAGE_PAGE_SIZE))
+        if text:
+            return text
+
+    # フォールバック: サーバー側で run_id を絞り込めない場合は新しい順にページングし、手元で絞り込む
+    messages = project.agents.messages.list(
+        thread_id=thread_id,
+        order=ListSortOrder.DESCENDING,
+    )
+    if run_id:
+        messages = (message for message in messages if getattr(message, "run_id", None) == run_id)
+    return first_assistant_text(messages)
 
 
 def create_fallback_response(target: str, focus_area: str, error_reason: str) -> dict:
     """フォールバック応答の生成（エラー理由付き）"""
-    industry_map = {
-        "メルカリ": "フリマアプリ・C2C",
-        "共同通信": "通信社・メディア",
-        "ソフトバンク": "通信・IT",
-        "トヨタ": "自動車製造",
-        "楽天": "EC・フィンテック",
-    }
-    target_industry = "調査対象業界"
-    for company, industry in industry_map.items():
-        if company in target:
-            target_industry = industry
-            break
+    # 業界マッピングは企業マスタ（src/company_index.py）から引く
+    target_industry = get_company_index().lookup_industry(target, default="調査対象業界")
     fallback_data = {
         "company_profile": {
             "official_name": target,
@@ -164,22 +116,9 @@ def create_fallback_response(target: str, focus_area: str, error_reason: str) ->
     return fallback_data
 
 
-def call_azure_ai_agent(target: str, focus_area: str, specific_requirements: str):
-    """Azure AI Foundryエージェントを呼び出す関数（分割版）"""
-    try:
-        # secrets.tomlから設定を取得
-        endpoint = st.secrets["AZURE_AI_ENDPOINT"]
-        agent_id = st.secrets["AZURE_AGENT_ID"]
-
-        project = AIProjectClient(
-            credential=get_credential(),
-            endpoint=endpoint,
-        )
-        agent = project.agents.get_agent(agent_id)
-        thread = project.agents.threads.create()
-
-        # streamlit.py と同じシンプルなプロンプト
-        user_message = f"""
+def build_research_prompt(target: str, focus_area: str, specific_requirements: str) -> str:
+    """調査依頼メッセージ（streamlit.py と同じシンプルなプロンプト）"""
+    return f"""
         企業・個人調査を実行してください。
 
         調査対象: {target}
@@ -226,73 +165,194 @@ def call_azure_ai_agent(target: str, focus_area: str, specific_requirements: str
         }}
         """
 
-        message = project.agents.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=user_message,
-        )
-        run = project.agents.runs.create_and_process(
-            thread_id=thread.id,
-            agent_id=agent.id,
-        )
+
+def _is_rate_limited(last_error):
+    """run の失敗理由がレート制限か"""
+    code = last_error.get("code") if isinstance(last_error, dict) else getattr(last_error, "code", None)
+    return code == "rate_limit_exceeded"
+
+
+def _notify(on_progress, stage, **info):
+    if on_progress:
+        on_progress(stage, info)
+
+
+def _run_on_backend(backend, user_message, ticket, on_progress=None, prewarm_key=None):
+    """1 つのバックエンドでスレッド作成〜応答取得まで実行し (run, 応答テキスト) を返す。
+
+    prewarm_key のセッションで事前作成したスレッドがあれば接続・スレッド作成を省く（src/prewarm.py）。
+    レート制限による run 失敗は BackendThrottledError とし、ルーターが別のバックエンドで再実行する。
+    """
+    with span("research.backend", **{"backend.name": backend.name}):
+        _notify(on_progress, "connect", backend=backend.name)
+        claimed = get_prewarmer().claim(prewarm_key, backend.name) if prewarm_key else None
+        set_attributes(**{"prewarm.hit": claimed is not None})
+        if claimed:
+            project, agent, thread_id = claimed
+        else:
+            with span("research.connect"):
+                project = create_client(backend)
+                agent = project.agents.get_agent(backend.agent_id)
+            with span("research.thread_create"):
+                thread_id = project.agents.threads.create().id
+
+        with span("research.message_create"):
+            project.agents.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=user_message,
+            )
+        with span("research.run"):
+            polls = 0
+
+            def on_status(status, elapsed_sec, poll_count):
+                nonlocal polls
+                polls = poll_count
+                _notify(on_progress, "run", status=status, elapsed_sec=elapsed_sec,
+                        expected_sec=backend.ewma_latency)
+
+            run = create_and_wait(project.agents.runs, thread_id, agent.id, on_status=on_status)
+            set_attributes(**{"run.id": run.id, "run.status": str(run.status), "run.polls": polls})
+            usage = getattr(run, "usage", None)
+            ticket.record_usage(getattr(usage, "total_tokens", None))
         if run.status == "failed":
-            st.error(f"Agent実行失敗: {run.last_error}")
-            return None
+            if _is_rate_limited(run.last_error):
+                raise BackendThrottledError(f"{backend.name}: {run.last_error}")
+            return run, None
 
-        messages = project.agents.messages.list(
-            thread_id=thread.id,
-            order=ListSortOrder.ASCENDING,
-        )
-        agent_response = None
-        for message in messages:
-            if message.role == "assistant" and message.text_messages:
-                agent_response = message.text_messages[-1].text.value
+        _notify(on_progress, "fetch")
+        with span("research.fetch_response"):
+            agent_response = fetch_latest_assistant_text(project, thread_id, run.id)
+            set_attributes(**{"response.size": len(agent_response or "")})
+        return run, agent_response
+
+
+@traced("research.call_agent")
+def run_research(target: str, focus_area: str, specific_requirements: str,
+                 user_id: str = None, priority: str = "interactive", on_progress=None,
+                 prewarm_key: str = None) -> dict:
+    """エージェントで調査し、解析・スコアリングまで行う（Streamlit を使わないためバックグラウンドからも呼べる）
+
+    エージェント実行はスケジューラ（src/scheduler.py）の実行枠内で行い、
+    実行先はルーター（src/routing.py）が複数バックエンドから選ぶ。
+    priority は "interactive" / "batch" / "background"。
+    on_progress(stage, info) には "queue" / "connect" / "run" / "fetch" / "parse" の各段階が通知される。
+    prewarm_key には入力中に事前準備したセッションのキーを渡す。
+
+    {"ok", "result", "stage", "detail", "response"} を返す。失敗時の stage は
+    "run"（run の失敗・ツール出力の要求）/ "response"（応答なし）/ "parse"（解析失敗。response に応答本文）/
+    "limit"（予算・待ち時間・run の期限超過）/ "exception"（その他の例外）。
+    """
+    set_attributes(**{"research.target": target, "research.focus_area": focus_area, "research.priority": priority})
+    ticket = None
+    try:
+        router = get_router()
+
+        # 実行枠の取得（予算超過・待ち時間超過はここで例外）
+        _notify(on_progress, "queue")
+        with span("research.queue"), stage("queue"):
+            ticket = get_scheduler().acquire(
+                user_id, priority, estimated_tokens_per_run(), timeout=queue_timeout_sec())
+            set_attributes(**{"queue.wait_sec": round(ticket.wait_sec, 3)})
+
+        user_message = build_research_prompt(target, focus_area, specific_requirements)
+        with stage("agent"):
+            (run, agent_response), backend = router.execute(
+                lambda backend: _run_on_backend(backend, user_message, ticket, on_progress, prewarm_key),
+                prefer=get_prewarmer().preferred_backend(prewarm_key) if prewarm_key else None)
+        set_attributes(**{"research.backend": backend.name})
+        if run.status == "failed":
+            set_attributes(**{"error.type": "run_failed"})
+            return {"ok": False, "result": None, "stage": "run", "detail": str(run.last_error)}
+
+        # 解析はエージェントを使わないため、ここで実行枠を返す
+        ticket.release()
         if not agent_response:
-            st.error("エージェントからのレスポンスが取得できませんでした")
-            return None
+            set_attributes(**{"error.type": "empty_response"})
+            return {"ok": False, "result": None, "stage": "response", "detail": "no assistant response"}
 
-        parsed_response = parse_agent_response(agent_response, target, focus_area)
-        if parsed_response:
+        _notify(on_progress, "parse")
+        with span("research.parse"), stage("parse"):
+            parsed_response = parse_agent_response(agent_response, target, focus_area)
+        if not parsed_response:
+            return {"ok": False, "result": None, "stage": "parse", "detail": "parse failed",
+                    "response": agent_response}
+        with span("research.score"), stage("score"):
             parsed_response["research_status"] = "completed"
             parsed_response["search_count"] = estimate_search_count(agent_response)
             parsed_response["data_quality_score"] = calculate_response_quality(parsed_response)
-            parsed_response["raw_response"] = agent_response
-            return parsed_response
-        else:
-            st.error("JSON解析に失敗しました")
-            st.write("エージェントレスポンス:", agent_response)
-            return None
+            set_attributes(**{"quality_score": parsed_response["data_quality_score"]})
+        parsed_response["raw_response"] = agent_response
+        return {"ok": True, "result": parsed_response, "stage": "done", "detail": ""}
+
+    except RunActionRequiredError as e:
+        set_attributes(**{"error.type": "run_requires_action"})
+        return {"ok": False, "result": None, "stage": "run", "detail": str(e)}
+
+    except (BudgetExceededError, SchedulerTimeoutError, RunTimeoutError) as e:
+        # 予算・待ち時間・run の期限超過はフォールバックデータを返さない
+        set_attributes(**{"error.type": type(e).__name__})
+        return {"ok": False, "result": None, "stage": "limit", "detail": str(e)}
 
     except Exception as e:
-        st.error(f"Azure AI Agent呼び出しエラー: {str(e)}")
-        
+        set_attributes(**{"error.type": type(e).__name__, "error.message": str(e)[:200]})
+        return {"ok": False, "result": None, "stage": "exception", "detail": str(e)}
+
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+def call_azure_ai_agent(target: str, focus_area: str, specific_requirements: str,
+                        user_id: str = None, priority: str = "interactive", on_progress=None,
+                        prewarm_key: str = None):
+    """Azure AI Foundryエージェントを呼び出す関数（分割版。画面用）
+
+    run_research の結果を返し、失敗は画面に表示する。
+    予期しない例外の場合はデモモードのフォールバックデータを返す。
+    """
+    outcome = run_research(target, focus_area, specific_requirements, user_id=user_id, priority=priority,
+                           on_progress=on_progress, prewarm_key=prewarm_key)
+    if outcome["ok"]:
+        return outcome["result"]
+    if outcome["stage"] == "run":
+        st.error(f"Agent実行失敗: {outcome['detail']}")
+    elif outcome["stage"] == "response":
+        st.error("エージェントからのレスポンスが取得できませんでした")
+    elif outcome["stage"] == "parse":
+        st.error("JSON解析に失敗しました")
+        st.write("エージェントレスポンス:", outcome["response"])
+    elif outcome["stage"] == "limit":
+        st.error(outcome["detail"])
+    else:
+        st.error(f"Azure AI Agent呼び出しエラー: {outcome['detail']}")
+
         # エラー時のフォールバック：構造化されたモックレスポンス
         st.warning("デモモードで動作します")
-        return create_fallback_response(target, focus_area, f"exception: {str(e)}")
+        return create_fallback_response(target, focus_area, f"exception: {outcome['detail']}")
+    return None
 
 
 def test_connection() -> dict:
-    """サンプル相当の最小接続テスト。詳細な失敗理由を返す。"""
+    """サンプル相当の最小接続テスト。全バックエンドを順に試し、詳細な失敗理由を返す。"""
     try:
-        endpoint = st.secrets.get("AZURE_AI_ENDPOINT")
-        agent_id = st.secrets.get("AZURE_AGENT_ID")
-        if not endpoint or not agent_id:
-            return {"ok": False, "stage": "config", "detail": "AZURE_AI_ENDPOINT / AZURE_AGENT_ID 未設定"}
-
-        project = AIProjectClient(credential=get_credential(), endpoint=endpoint)
-        agent = project.agents.get_agent(agent_id)
-        thread = project.agents.threads.create()
-        project.agents.messages.create(thread_id=thread.id, role="user", content="Hi Agent (connectivity test)\nReturn: ok")
-        run = project.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
-        if run.status == "failed":
-            return {"ok": False, "stage": "run", "detail": str(run.last_error)}
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-        texts = []
-        for msg in messages:
-            if msg.text_messages:
-                texts.append({"role": msg.role, "text": msg.text_messages[-1].text.value})
-        return {"ok": True, "stage": "done", "messages": texts}
+        backends = load_backends()
+        if not backends:
+            return {"ok": False, "stage": "config", "detail": "AZURE_AGENT_BACKENDS / AZURE_AI_ENDPOINT / AZURE_AGENT_ID 未設定"}
+
+        messages = []
+        for backend in backends:
+            project = create_client(backend)
+            agent = project.agents.get_agent(backend.agent_id)
+            thread = project.agents.threads.create()
+            project.agents.messages.create(thread_id=thread.id, role="user", content="Hi Agent (connectivity test)\nReturn: ok")
+            run = create_and_wait(project.agents.runs, thread.id, agent.id)
+            if run.status == "failed":
+                return {"ok": False, "stage": "run", "detail": f"{backend.name}: {run.last_error}"}
+            text = fetch_latest_assistant_text(project, thread.id, run.id)
+            if not text:
+                return {"ok": False, "stage": "messages", "detail": f"{backend.name}: アシスタントの応答がありません"}
+            messages.append({"role": "assistant", "backend": backend.name, "text": text})
+        return {"ok": True, "stage": "done", "messages": messages}
     except Exception as e:
         return {"ok": False, "stage": "exception", "detail": str(e)}
-
-
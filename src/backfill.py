@@ -0,0 +1,191 @@
+"""アーカイブ済み raw_response の再解析・再スコアリング（バックフィル）
+
+parse_agent_response / extract_* / calculate_response_quality を変更した後に、
+保存済みの応答テキストから結果を作り直す。エージェントは呼び出さない。
+
+- 入力はアーカイブ（SQLite、mmap 読み込み）または JSON Lines ファイル（mmap で行単位に読み出し）
+- チャンク単位でプロセスプールへ配り、投入中のチャンク数を制限して入力全体をメモリに載せない
+- 書き込みは親プロセスのみが行い、アーカイブはチャンクごとに1トランザクション、
+  JSON Lines は一時ファイルに書いてから置き換える
+
+    python -m src.backfill --archive data/research_archive.db
+    python -m src.backfill --input responses.jsonl --output reparsed.jsonl
+"""
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .data_processing import calculate_response_quality, estimate_search_count, parse_agent_response
+
+
+DEFAULT_CHUNK_SIZE = 500
+# 読み込み用接続でメモリマップする上限サイズ
+ARCHIVE_MMAP_SIZE = 1 << 30
+
+
+def reparse_response(target, focus_area, raw_response):
+    """1 件の raw_response を call_azure_ai_agent と同じ手順で解析・スコアリングする"""
+    result = parse_agent_response(raw_response, target, focus_area)
+    result["research_status"] = "completed"
+    result["search_count"] = estimate_search_count(raw_response)
+    result["data_quality_score"] = calculate_response_quality(result)
+    result["raw_response"] = raw_response
+    return result
+
+
+def reparse_chunk(chunk):
+    """(key, target, focus_area, raw_response) のチャンクを再解析する（ワーカープロセスで実行）"""
+    results = []
+    for key, target, focus_area, raw_response in chunk:
+        try:
+            results.append((key, target, focus_area, reparse_response(target, focus_area, raw_response), None))
+        except Exception as e:
+            results.append((key, target, focus_area, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def iter_archive_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """アーカイブから raw_response をキー順にチャンク単位で読み出す"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.execute(f"PRAGMA mmap_size={ARCHIVE_MMAP_SIZE}")
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, target, focus_area, raw_response FROM reports "
+                "WHERE id > ? AND raw_response IS NOT NULL AND raw_response != '' ORDER BY id LIMIT ?",
+                (last_id, chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+    finally:
+        conn.close()
+
+
+def iter_jsonl_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """JSON Lines（target / focus_area / raw_response）を mmap で読み、(行番号, ...) のチャンクで返す"""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        chunk = []
+        line_no = 0
+        for line in iter(mm.readline, b""):
+            line_no += 1
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            chunk.append((record.get("id", line_no), record.get("target", ""),
+                          record.get("focus_area", ""), record.get("raw_response", "")))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def run_backfill(chunks, write_chunk, max_workers=None, on_progress=None):
+    """チャンクの反復をプロセスプールで再解析し、完了順に write_chunk へ渡す。
+
+    write_chunk は成功分の [(key, target, focus_area, result)] を受け取る。
+    件数・失敗・所要時間・件/秒の dict を返す。
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    stats = {"processed": 0, "updated": 0, "failed": [], "chunks": 0, "workers": max_workers}
+    started = time.perf_counter()
+
+    def collect(future):
+        results = future.result()
+        succeeded = [(key, target, focus_area, result) for key, target, focus_area, result, error in results if not error]
+        write_chunk(succeeded)
+        stats["chunks"] += 1
+        stats["processed"] += len(results)
+        stats["updated"] += len(succeeded)
+        stats["failed"] += [{"key": key, "error": error} for key, _, _, _, error in results if error]
+        if on_progress:
+            on_progress(stats)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(reparse_chunk, chunk))
+            if len(pending) >= max_workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+        for future in pending:
+            collect(future)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_sec"] = elapsed
+    stats["per_second"] = stats["processed"] / elapsed if elapsed > 0 else 0.0
+    return stats
+
+
+def backfill_archive(path, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, dry_run=False, on_progress=None):
+    """アーカイブ内の全レポートを再解析して上書きする（dry_run なら書き込まない）"""
+    from .archive import ResearchArchive
+
+    archive = ResearchArchive(path)
+    try:
+        write_chunk = (lambda items: None) if dry_run else archive.update_results
+        return run_backfill(iter_archive_chunks(path, chunk_size), write_chunk, max_workers, on_progress)
+    finally:
+        archive.close()
+
+
+def backfill_jsonl(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, on_progress=None):
+    """JSON Lines の raw_response を再解析し、結果を JSON Lines で書き出す（完了時に置き換え）"""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".jsonl.tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            def write_chunk(items):
+                for key, target, focus_area, result in items:
+                    out.write(json.dumps({"id": key, "target": target, "focus_area": focus_area, "result": result},
+                                         ensure_ascii=False, default=str) + "\n")
+
+            stats = run_backfill(iter_jsonl_chunks(input_path, chunk_size), write_chunk, max_workers, on_progress)
+        os.replace(tmp_path, output_path)
+        return stats
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="アーカイブ済み応答の再解析・再スコアリング")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--archive", help="アーカイブ DB のパス（その場で更新）")
+    source.add_argument("--input", help="入力 JSON Lines（target / focus_area / raw_response）")
+    parser.add_argument("--output", help="--input 時の出力 JSON Lines")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="再解析のみ行い書き込まない（--archive 時）")
+    args = parser.parse_args(argv)
+
+    def on_progress(stats):
+        print(f"\r{stats['processed']} 件処理 / 失敗 {len(stats['failed'])} 件", end="", flush=True)
+
+    if args.archive:
+        stats = backfill_archive(args.archive, args.chunk_size, args.workers, args.dry_run, on_progress)
+    else:
+        if not args.output:
+            parser.error("--input には --output の指定が必要です")
+        stats = backfill_jsonl(args.input, args.output, args.chunk_size, args.workers, on_progress)
+
+    print()
+    print(f"処理 {stats['processed']} 件（更新 {stats['updated']} / 失敗 {len(stats['failed'])}）"
+          f" {stats['elapsed_sec']:.1f} 秒, {stats['per_second']:.0f} 件/秒, ワーカー {stats['workers']}")
+    for failure in stats["failed"][:10]:
+        print(f"  失敗 {failure['key']}: {failure['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""コンテンツアドレス型のローカル Blob ストア
+
+調査結果（raw_response を含む）や生成済みスライド HTML などの大きなペイロードを
+SHA-256 をキーにディスクへ保存し、セッションにはハッシュだけを保持する。
+読み出しは遅延ロードで、直近に使われた Blob のみをバイト数上限付きの LRU に載せる。
+同じ内容は1つの Blob として共有される。
+文字列・JSON の Blob は src/codec.py（学習済み辞書付き zstd）で圧縮してディスクに置き、
+LRU には展開済みのデータを載せる（ヒット時に展開しない）。LRU に載らない大きな Blob はファイルから逐次展開して復元する。ハッシュは圧縮前の内容から計算する。
+
+一定時間アクセスのないセッションは参照を解放し、どのセッション・登録済み参照元（結果キャッシュ等）からも参照されない
+古い Blob はバックグラウンドの掃除でディスクから削除する。
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from .codec import get_codec
+from .utils import get_setting
+
+
+DEFAULT_BLOB_PATH = os.path.join("data", "blobs")
+DEFAULT_CACHE_MB = 64
+DEFAULT_SESSION_IDLE_TTL_SEC = 1800
+DEFAULT_SWEEP_INTERVAL_SEC = 300
+
+# シリアライズ形式を示す先頭1バイト
+_KIND_BYTES = b"B"
+_KIND_TEXT = b"S"
+_KIND_JSON = b"J"
+
+
+def _serialize(value):
+    if isinstance(value, (bytes, bytearray)):
+        return _KIND_BYTES + bytes(value)
+    if isinstance(value, str):
+        return _KIND_TEXT + value.encode("utf-8")
+    return _KIND_JSON + json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _deserialize(data):
+    kind, body = data[:1], data[1:]
+    if kind == _KIND_BYTES:
+        return body
+    if kind == _KIND_TEXT:
+        return body.decode("utf-8")
+    return json.loads(body)
+
+
+def _deserialize_stream(stream):
+    """展開後のデータをストリームから直接復元（全体を bytes にまとめない）"""
+    kind = stream.read(1)
+    if kind == _KIND_JSON:
+        return json.load(io.TextIOWrapper(stream, encoding="utf-8"))
+    return _deserialize(kind + stream.read())
+
+
+class BlobStore:
+    """ハッシュをキーとする Blob の保存・遅延読み込み・セッション参照管理"""
+
+    def __init__(self, root, cache_bytes=DEFAULT_CACHE_MB * 1024 * 1024, codec=None):
+        self.root = root
+        self.cache_bytes = cache_bytes
+        self._codec = codec
+        os.makedirs(root, exist_ok=True)
+        self._cache = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        # 既存ファイルの確認と更新時刻の更新（put）と、更新時刻の確認と削除（sweep）を排他する
+        self._file_lock = threading.Lock()
+        self._sessions = {}
+        self._reference_sources = []
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "dedup": 0, "evicted_sessions": 0, "deleted_blobs": 0,
+                      "bytes_raw": 0, "bytes_stored": 0}
+
+    @property
+    def codec(self):
+        return self._codec or get_codec()
+
+    def _encode(self, data):
+        """文字列・JSON は圧縮する（PPTX / PDF などのバイナリは圧縮済みのためそのまま）"""
+        if data[:1] == _KIND_BYTES:
+            return data
+        return self.codec.encode(data)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _cache_put(self, digest, data):
+        if len(data) > self.cache_bytes:
+            return
+        if digest in self._cache:
+            self._cache.move_to_end(digest)
+            return
+        self._cache[digest] = data
+        self._cache_size += len(data)
+        while self._cache_size > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
+
+    def put(self, value):
+        """値（bytes / str / JSON 化可能な値）を保存し、ハッシュを返す"""
+        data = _serialize(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._file_lock:
+            exists = os.path.exists(path)
+            if exists:
+                os.utime(path)
+        if exists:
+            with self._lock:
+                self.stats["dedup"] += 1
+            return digest
+        encoded = self._encode(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["writes"] += 1
+            self.stats["bytes_raw"] += len(data)
+            self.stats["bytes_stored"] += len(encoded)
+            self._cache_put(digest, data)
+        return digest
+
+    def get(self, digest, default=None):
+        """ハッシュから値を復元する（削除済みなら default）。呼び出しごとに新しいオブジェクトを返す"""
+        if not digest:
+            return default
+        with self._lock:
+            data = self._cache.get(digest)
+            if data is not None:
+                self._cache.move_to_end(digest)
+                self.stats["hits"] += 1
+        if data is None:
+            try:
+                with open(self._path(digest), "rb") as f:
+                    if os.fstat(f.fileno()).st_size > self.cache_bytes:
+                        with self._lock:
+                            self.stats["misses"] += 1
+                        return _deserialize_stream(self.codec.reader(f))
+                    data = self.codec.decode(f.read())
+            except FileNotFoundError:
+                return default
+            with self._lock:
+                self.stats["misses"] += 1
+                self._cache_put(digest, data)
+        return _deserialize(data)
+
+    def exists(self, digest):
+        return bool(digest) and os.path.exists(self._path(digest))
+
+    def touch_session(self, session_id, digests):
+        """セッションの最終アクセス時刻と参照中のハッシュを記録"""
+        with self._lock:
+            self._sessions[session_id] = (time.time(), {d for d in digests if d})
+
+    def add_reference_source(self, source):
+        """セッション以外の参照元（参照中ハッシュの集合を返す関数）を登録。掃除で削除されなくなる"""
+        with self._lock:
+            self._reference_sources.append(source)
+
+    def release_session(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def sweep(self, idle_ttl_sec=DEFAULT_SESSION_IDLE_TTL_SEC):
+        """アイドルセッションの参照を解放し、未参照かつ idle_ttl_sec 以上更新のない Blob を削除"""
+        now = time.time()
+        with self._lock:
+            for session_id, (last_seen, _) in list(self._sessions.items()):
+                if now - last_seen > idle_ttl_sec:
+                    del self._sessions[session_id]
+                    self.stats["evicted_sessions"] += 1
+            referenced = set().union(*(refs for _, refs in self._sessions.values()))
+            sources = list(self._reference_sources)
+        for source in sources:
+            referenced |= source()
+        deleted = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                digest = os.path.basename(directory) + name
+                path = os.path.join(directory, name)
+                try:
+                    with self._file_lock:
+                        if digest in referenced or now - os.path.getmtime(path) <= idle_ttl_sec:
+                            continue
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                deleted += 1
+                with self._lock:
+                    data = self._cache.pop(digest, None)
+                    if data is not None:
+                        self._cache_size -= len(data)
+        with self._lock:
+            self.stats["deleted_blobs"] += deleted
+        return deleted
+
+    def status(self):
+        """キャッシュ使用量・セッション数・統計"""
+        with self._lock:
+            return dict(self.stats, cache_bytes=self._cache_size, cache_entries=len(self._cache),
+                        sessions=len(self._sessions))
+
+
+_store = None
+_store_lock = threading.Lock()
+_sweeper_thread = None
+
+
+def get_blob_store():
+    """プロセス共通の Blob ストアを取得（BLOB_STORE_PATH / BLOB_CACHE_MB）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                cache_mb = float(get_setting("BLOB_CACHE_MB", DEFAULT_CACHE_MB))
+                _store = BlobStore(get_setting("BLOB_STORE_PATH", DEFAULT_BLOB_PATH), int(cache_mb * 1024 * 1024))
+    return _store
+
+
+def _sweep_loop(interval, idle_ttl_sec):
+    while True:
+        time.sleep(interval)
+        try:
+            get_blob_store().sweep(idle_ttl_sec)
+        except Exception:
+            pass
+
+
+def start_sweeper():
+    """アイドルセッションの解放と未参照 Blob の削除を定期実行（プロセスで1回のみ）"""
+    global _sweeper_thread
+    idle_ttl_sec = float(get_setting("SESSION_IDLE_TTL_SEC", DEFAULT_SESSION_IDLE_TTL_SEC))
+    interval = min(DEFAULT_SWEEP_INTERVAL_SEC, idle_ttl_sec)
+    with _store_lock:
+        if _sweeper_thread is None:
+            _sweeper_thread = threading.Thread(
+                target=_sweep_loop, args=(interval, idle_ttl_sec), name="blob-sweeper", daemon=True)
+            _sweeper_thread.start()
@@ -0,0 +1,321 @@
+"""保存データの圧縮コーデック（zstd ＋ 自前の応答で学習した辞書）
+
+エージェントの応答は同じ JSON キー・定型文・プレースホルダーの繰り返しが多く、汎用の gzip では
+1 件ごとに同じ語彙を符号化し直すことになる。ここでは保存済みの応答から zstd 辞書を学習し、
+Blob ストアとアーカイブの保存形式に使う。
+
+- 形式: ヘッダー（b"ZC" ＋ 形式バージョン 1 バイト ＋ 辞書 ID 4 バイト）＋ zstd フレーム。辞書 ID 0 は辞書なし
+- ヘッダーのないデータは非圧縮（導入前の保存データ・圧縮しても小さくならないデータ）としてそのまま返す
+- 辞書は CODEC_DICT_DIR に ID ごとのファイルで残し、書き込みは最新の辞書、読み出しはヘッダーの辞書を使う
+- 書き込まれたデータの一部を学習用に保持し、バックグラウンドで定期的に辞書を学習し直す。
+  学習に使っていないデータで現在の辞書より小さくなった場合のみ切り替える
+- 大きなデータは reader() でファイルから逐次展開して読める
+
+初期辞書をアーカイブから学習する場合:
+
+    python -m src.codec --train [--archive data/research_archive.db]
+    python -m src.codec --status
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+
+import zstandard as zstd
+
+from .utils import get_setting, get_bool_setting
+
+
+DEFAULT_DICT_DIR = os.path.join("data", "codec")
+DEFAULT_LEVEL = 3
+DEFAULT_DICT_KB = 64
+DEFAULT_SAMPLE_MB = 8
+DEFAULT_RETRAIN_INTERVAL_SEC = 3600
+# これより小さいデータは圧縮しない（ヘッダー分で得にならない）
+MIN_ENCODE_BYTES = 64
+# 1 件あたり学習に使う先頭のバイト数
+MAX_SAMPLE_BYTES = 64 * 1024
+MIN_TRAIN_SAMPLES = 50
+# 前回の学習以降にこの件数の新しいデータが溜まったら学習し直す
+RETRAIN_MIN_NEW_SAMPLES = 200
+# 新しい辞書に切り替えるのに必要な改善率（検証データの圧縮後サイズ）
+MIN_IMPROVEMENT = 0.02
+
+MAGIC = b"ZC"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">2sBI")
+_CURRENT_FILE = "CURRENT"
+
+
+class CodecError(ValueError):
+    """未知の形式バージョン・辞書が見つからないデータ"""
+
+
+def is_encoded(data):
+    return data[:2] == MAGIC
+
+
+class Codec:
+    """辞書付き zstd による encode / decode と辞書の学習・切り替え"""
+
+    def __init__(self, dict_dir, level=DEFAULT_LEVEL, enabled=True, dict_bytes=DEFAULT_DICT_KB * 1024,
+                 sample_bytes=DEFAULT_SAMPLE_MB * 1024 * 1024):
+        self.dict_dir = dict_dir
+        self.level = level
+        self.enabled = enabled
+        self.dict_bytes = dict_bytes
+        self.sample_bytes = sample_bytes
+        os.makedirs(dict_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dicts = {}
+        self._samples = deque()
+        self._sample_size = 0
+        self._new_samples = 0
+        self.stats = {"encoded": 0, "passthrough": 0, "bytes_in": 0, "bytes_out": 0, "decoded": 0, "trained": 0}
+        self.dict_id = self._read_current()
+
+    # ---- 辞書 ----
+
+    def _dict_path(self, dict_id):
+        return os.path.join(self.dict_dir, f"{dict_id:08x}.zdict")
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.dict_dir, _CURRENT_FILE), encoding="ascii") as f:
+                return int(f.read().strip(), 16)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _dictionary(self, dict_id):
+        if dict_id == 0:
+            return None
+        dictionary = self._dicts.get(dict_id)
+        if dictionary is None:
+            try:
+                with open(self._dict_path(dict_id), "rb") as f:
+                    dictionary = zstd.ZstdCompressionDict(f.read())
+            except FileNotFoundError:
+                raise CodecError(f"辞書 {dict_id:08x} が見つかりません（{self.dict_dir}）") from None
+            with self._lock:
+                dictionary = self._dicts.setdefault(dict_id, dictionary)
+        return dictionary
+
+    def _compressor(self, dict_id):
+        # ZstdCompressor / ZstdDecompressor はスレッド間で共有できないためスレッドごとに持つ
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        compressor = compressors.get(dict_id)
+        if compressor is None:
+            compressor = zstd.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+            compressors[dict_id] = compressor
+        return compressor
+
+    def _decompressor(self, dict_id):
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            decompressor = zstd.ZstdDecompressor(dict_data=self._dictionary(dict_id))
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def _save_dictionary(self, dictionary):
+        dict_id = dictionary.dict_id()
+        with open(self._dict_path(dict_id), "wb") as f:
+            f.write(dictionary.as_bytes())
+        fd, tmp_path = tempfile.mkstemp(dir=self.dict_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="ascii") as f:
+            f.write(f"{dict_id:08x}\n")
+        os.replace(tmp_path, os.path.join(self.dict_dir, _CURRENT_FILE))
+        with self._lock:
+            self._dicts[dict_id] = dictionary
+            self.dict_id = dict_id
+        return dict_id
+
+    # ---- encode / decode ----
+
+    def encode(self, data, sample=True):
+        """bytes を圧縮して返す。無効時・小さいデータ・縮まないデータはそのまま返す"""
+        if sample:
+            self.add_sample(data)
+        if not self.enabled or len(data) < MIN_ENCODE_BYTES:
+            return data
+        dict_id = self.dict_id
+        encoded = _HEADER.pack(MAGIC, FORMAT_VERSION, dict_id) + self._compressor(dict_id).compress(data)
+        with self._lock:
+            self.stats["bytes_in"] += len(data)
+            if len(encoded) >= len(data):
+                self.stats["passthrough"] += 1
+                self.stats["bytes_out"] += len(data)
+                return data
+            self.stats["encoded"] += 1
+            self.stats["bytes_out"] += len(encoded)
+        return encoded
+
+    def decode(self, data):
+        """encode の逆。ヘッダーのないデータはそのまま返す"""
+        if not is_encoded(data):
+            return bytes(data)
+        _, _, dict_id = self._parse_header(data[:_HEADER.size])
+        with self._lock:
+            self.stats["decoded"] += 1
+        return self._decompressor(dict_id).decompress(data[_HEADER.size:])
+
+    def reader(self, fileobj):
+        """シーク可能なバイナリファイルから展開後のデータを逐次読み出すストリームを返す"""
+        head = fileobj.read(_HEADER.size)
+        if not is_encoded(head):
+            fileobj.seek(-len(head), os.SEEK_CUR)
+            return fileobj
+        _, _, dict_id = self._parse_header(head)
+        with self._lock:
+            self.stats["decoded"] += 1
+        return self._decompressor(dict_id).stream_reader(fileobj)
+
+    @staticmethod
+    def _parse_header(head):
+        if len(head) < _HEADER.size:
+            raise CodecError("ヘッダーが途中で切れています")
+        magic, version, dict_id = _HEADER.unpack(head)
+        if version != FORMAT_VERSION:
+            raise CodecError(f"未対応の形式バージョンです: {version}")
+        return magic, version, dict_id
+
+    # ---- 学習 ----
+
+    def add_sample(self, data):
+        """学習用に保持（合計 sample_bytes を超えたら古いものから捨てる）"""
+        sample = bytes(data[:MAX_SAMPLE_BYTES])
+        with self._lock:
+            self._samples.append(sample)
+            self._sample_size += len(sample)
+            self._new_samples += 1
+            while self._sample_size > self.sample_bytes:
+                self._sample_size -= len(self._samples.popleft())
+
+    def needs_training(self):
+        with self._lock:
+            return self._new_samples >= RETRAIN_MIN_NEW_SAMPLES and len(self._samples) >= MIN_TRAIN_SAMPLES
+
+    def train(self, samples=None, seed=0):
+        """辞書を学習し、検証データで現在の辞書より小さくなれば切り替える。切り替えた辞書 ID（しなければ None）"""
+        with self._lock:
+            samples = list(self._samples) if samples is None else [bytes(s[:MAX_SAMPLE_BYTES]) for s in samples]
+            self._new_samples = 0
+        if len(samples) < MIN_TRAIN_SAMPLES:
+            return None
+        random.Random(seed).shuffle(samples)
+        holdout = samples[:max(1, len(samples) // 5)]
+        try:
+            candidate = zstd.train_dictionary(self.dict_bytes, samples[len(holdout):], level=self.level)
+        except zstd.ZstdError:
+            return None
+        new_size = _compressed_size(zstd.ZstdCompressor(level=self.level, dict_data=candidate), holdout)
+        current_size = _compressed_size(self._compressor(self.dict_id), holdout)
+        if new_size > current_size * (1 - MIN_IMPROVEMENT):
+            return None
+        dict_id = self._save_dictionary(candidate)
+        with self._lock:
+            self.stats["trained"] += 1
+        return dict_id
+
+    def status(self):
+        """現在の辞書・圧縮率・学習用データの件数"""
+        with self._lock:
+            stats = dict(self.stats)
+            return dict(stats, dict_id=f"{self.dict_id:08x}" if self.dict_id else None,
+                        ratio=round(stats["bytes_in"] / stats["bytes_out"], 2) if stats["bytes_out"] else None,
+                        samples=len(self._samples), sample_bytes=self._sample_size)
+
+
+def _compressed_size(compressor, samples):
+    return sum(len(compressor.compress(sample)) for sample in samples)
+
+
+_codec = None
+_codec_lock = threading.Lock()
+_trainer_thread = None
+
+
+def get_codec():
+    """プロセス共通のコーデックを取得（CODEC_ENABLED / CODEC_DICT_DIR / CODEC_LEVEL / CODEC_DICT_KB）"""
+    global _codec
+    if _codec is None:
+        with _codec_lock:
+            if _codec is None:
+                _codec = Codec(
+                    get_setting("CODEC_DICT_DIR", DEFAULT_DICT_DIR),
+                    level=int(get_setting("CODEC_LEVEL", DEFAULT_LEVEL)),
+                    enabled=get_bool_setting("CODEC_ENABLED", True),
+                    dict_bytes=int(float(get_setting("CODEC_DICT_KB", DEFAULT_DICT_KB)) * 1024),
+                )
+    return _codec
+
+
+def _train_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            codec = get_codec()
+            if codec.needs_training():
+                codec.train()
+        except Exception:
+            pass
+
+
+def start_trainer():
+    """書き込まれたデータから辞書を定期的に学習し直す（プロセスで1回のみ）"""
+    global _trainer_thread
+    interval = float(get_setting("CODEC_RETRAIN_INTERVAL_SEC", DEFAULT_RETRAIN_INTERVAL_SEC))
+    with _codec_lock:
+        if _trainer_thread is None:
+            _trainer_thread = threading.Thread(target=_train_loop, args=(interval,), name="codec-trainer", daemon=True)
+            _trainer_thread.start()
+
+
+def archive_samples(path, limit=2000):
+    """アーカイブの raw_response と解析結果（JSON）を学習用データとして返す"""
+    from .archive import ResearchArchive
+
+    archive = ResearchArchive(path)
+    try:
+        samples = []
+        for row in archive.recent(limit):
+            _, _, result = archive.get_result(row["id"])
+            raw = result.pop("raw_response", "")
+            if raw:
+                samples.append(raw.encode("utf-8"))
+            samples.append(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+        return samples
+    finally:
+        archive.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="圧縮辞書の学習・状態表示")
+    parser.add_argument("--train", action="store_true", help="アーカイブから辞書を学習する")
+    parser.add_argument("--archive", default=None, help="学習に使うアーカイブ（既定は ARCHIVE_PATH）")
+    parser.add_argument("--limit", type=int, default=2000, help="学習に使う新しいレポートの件数")
+    parser.add_argument("--status", action="store_true", help="現在の辞書を表示")
+    args = parser.parse_args(argv)
+
+    codec = get_codec()
+    if args.train:
+        from .archive import DEFAULT_ARCHIVE_PATH
+
+        samples = archive_samples(args.archive or get_setting("ARCHIVE_PATH", DEFAULT_ARCHIVE_PATH), args.limit)
+        dict_id = codec.train(samples)
+        print(f"学習データ {len(samples)} 件: " + (f"辞書 {dict_id:08x} に切り替えました" if dict_id
+                                              else "辞書は更新しませんでした（データ不足または改善なし）"))
+    if args.status or not args.train:
+        status = codec.status()
+        saved = sorted(name for name in os.listdir(codec.dict_dir) if name.endswith(".zdict"))
+        print(f"現在の辞書: {status['dict_id'] or 'なし'}（{codec.dict_dir}、保存済み {len(saved)} 件）")
+
+
+if __name__ == "__main__":
+    main()
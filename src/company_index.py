@@ -0,0 +1,290 @@
+"""企業名インデックス（Aho-Corasick 照合 + 文字 n-gram あいまい検索）
+
+企業マスタ（正式名称・別名・業界・地域）を読み込み、
+- テキスト中の企業名をテキスト長に比例した時間で一括検出
+- 表記ゆれのある企業名を正式名称へ解決
+する。フォールバック応答の業界推定とスライドの海外/国内分類で使用する。
+"""
+import csv
+import json
+import os
+import threading
+import unicodedata
+from collections import Counter, deque
+
+from fuzzywuzzy import fuzz
+
+from .utils import get_setting
+
+
+# 組み込みの企業マスタ（マスタファイル未設定時に使用）
+DEFAULT_COMPANIES = [
+    {"name": "メルカリ", "aliases": [], "industry": "フリマアプリ・C2C", "region": "domestic"},
+    {"name": "共同通信", "aliases": [], "industry": "通信社・メディア", "region": "domestic"},
+    {"name": "ソフトバンク", "aliases": [], "industry": "通信・IT", "region": "domestic"},
+    {"name": "トヨタ", "aliases": [], "industry": "自動車製造", "region": "domestic"},
+    {"name": "楽天", "aliases": [], "industry": "EC・フィンテック", "region": "domestic"},
+    {"name": "日経", "aliases": [], "industry": None, "region": "domestic"},
+    {"name": "朝日", "aliases": [], "industry": None, "region": "domestic"},
+    {"name": "読売", "aliases": [], "industry": None, "region": "domestic"},
+    {"name": "毎日", "aliases": [], "industry": None, "region": "domestic"},
+    {"name": "時事通信", "aliases": [], "industry": None, "region": "domestic"},
+    {"name": "AP通信", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "Reuters", "aliases": ["ロイター"], "industry": None, "region": "overseas"},
+    {"name": "Bloomberg", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "AFP", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "NYT", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "BBC", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "CNN", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "Microsoft", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "Google", "aliases": [], "industry": None, "region": "overseas"},
+    {"name": "Apple", "aliases": [], "industry": None, "region": "overseas"},
+]
+
+NGRAM_SIZE = 2
+# 多数の企業名に現れる n-gram（「株式」「会社」等）は候補絞り込みに使わない
+MAX_POSTING_RATIO = 0.05
+
+
+def normalize_name(text):
+    """照合用の正規化（全角→半角・小文字化・空白除去）"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(text.split())
+
+
+def _is_word_char(char):
+    return char.isascii() and char.isalnum()
+
+
+def _normalize_text(text):
+    """normalize_name と同じ正規化をし、英単語の境目（空白の除去位置・英数字と他の文字の間）の位置も返す"""
+    chars = []
+    breaks = {0}
+    for char in unicodedata.normalize("NFKC", text or "").lower():
+        if char.isspace():
+            breaks.add(len(chars))
+            continue
+        if chars and not (_is_word_char(chars[-1]) and _is_word_char(char)):
+            breaks.add(len(chars))
+        chars.append(char)
+    breaks.add(len(chars))
+    return "".join(chars), breaks
+
+
+def _ngrams(text, n=NGRAM_SIZE):
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class AhoCorasick:
+    """複数パターンの同時照合オートマトン"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._built = False
+
+    def add(self, pattern, value):
+        """パターンを登録（build 前のみ）"""
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """失敗遷移を幅優先で構築"""
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+        self._built = True
+
+    def iter_matches(self, text):
+        """(開始位置, 終了位置, 値) を出現順に返す"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in output[node]:
+                yield i - length + 1, i + 1, value
+
+
+class CompanyIndex:
+    """企業マスタの照合・解決インデックス"""
+
+    def __init__(self, records):
+        self.records = []
+        self._exact = {}
+        self._automaton = AhoCorasick()
+        self._postings = {}
+        for record in records:
+            self._add(record)
+        self._automaton.build()
+        self._prune_postings()
+
+    def _add(self, record):
+        record_id = len(self.records)
+        record = {
+            "name": record["name"],
+            "aliases": list(record.get("aliases") or []),
+            "industry": record.get("industry") or None,
+            "region": record.get("region") or None,
+        }
+        self.records.append(record)
+        for surface in [record["name"], *record["aliases"]]:
+            key = normalize_name(surface)
+            if not key:
+                continue
+            self._exact.setdefault(key, record_id)
+            self._automaton.add(key, record_id)
+            for gram in _ngrams(key):
+                self._postings.setdefault(gram, []).append(record_id)
+
+    def _prune_postings(self):
+        limit = max(50, int(len(self.records) * MAX_POSTING_RATIO))
+        self._postings = {gram: ids for gram, ids in self._postings.items() if len(ids) <= limit}
+
+    def _iter_text_matches(self, text):
+        """テキスト中の企業名の一致 (開始位置, 終了位置, レコード ID)。
+
+        英数字で始まる・終わる企業名は英単語の境目でのみ一致させる（"Pineapple" 中の Apple 等を除く）。
+        """
+        normalized, breaks = _normalize_text(text)
+        for start, end, record_id in self._automaton.iter_matches(normalized):
+            if _is_word_char(normalized[start]) and start not in breaks:
+                continue
+            if _is_word_char(normalized[end - 1]) and end not in breaks:
+                continue
+            yield start, end, record_id
+
+    def find_in_text(self, text):
+        """テキスト中の企業名を検出（左から最長一致、重複なし）"""
+        best = {}
+        for start, end, record_id in self._iter_text_matches(text):
+            if start not in best or end > best[start][0]:
+                best[start] = (end, record_id)
+        found = []
+        cursor = 0
+        for start in sorted(best):
+            end, record_id = best[start]
+            if start >= cursor:
+                found.append(self.records[record_id])
+                cursor = end
+        return found
+
+    def classify_region(self, text, default="domestic"):
+        """テキストに含まれる企業から海外/国内を判定（海外を優先）"""
+        regions = {
+            self.records[record_id]["region"]
+            for _, _, record_id in self._iter_text_matches(text)
+        }
+        if "overseas" in regions:
+            return "overseas"
+        if "domestic" in regions:
+            return "domestic"
+        return default
+
+    def lookup_industry(self, text, default=None):
+        """テキストに含まれる最初の企業の業界を返す"""
+        for record in self.find_in_text(text):
+            if record["industry"]:
+                return record["industry"]
+        return default
+
+    def resolve(self, name, limit=5, min_score=60):
+        """企業名を正式名称レコードへ解決（完全一致 → n-gram 候補 + 編集距離）。
+
+        [(record, score), ...] をスコア降順で返す。
+        """
+        key = normalize_name(name)
+        if not key:
+            return []
+        if key in self._exact:
+            return [(self.records[self._exact[key]], 100)]
+
+        overlap = Counter()
+        for gram in _ngrams(key):
+            overlap.update(self._postings.get(gram, ()))
+        scored = []
+        for record_id, _ in overlap.most_common(limit * 10):
+            record = self.records[record_id]
+            score = max(
+                fuzz.ratio(key, normalize_name(surface))
+                for surface in [record["name"], *record["aliases"]]
+            )
+            if score >= min_score:
+                scored.append((record, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def canonical_name(self, name, min_score=85):
+        """最も近い正式名称（見つからなければ入力をそのまま返す）"""
+        matches = self.resolve(name, limit=1, min_score=min_score)
+        return matches[0][0]["name"] if matches else name
+
+
+def load_master_list(path):
+    """企業マスタを JSON（レコード配列）または CSV（name,aliases,industry,region,readings）から読み込む。
+
+    CSV の aliases・readings（読みがな。入力補完で使用）は "|" 区切り。
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            return [
+                {
+                    "name": row["name"],
+                    "aliases": [a for a in (row.get("aliases") or "").split("|") if a],
+                    "industry": row.get("industry"),
+                    "region": row.get("region"),
+                    "readings": [r for r in (row.get("readings") or "").split("|") if r],
+                }
+                for row in csv.DictReader(f)
+                if row.get("name")
+            ]
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_company_records():
+    """組み込みの企業マスタ＋COMPANY_MASTER_PATH のマスタ"""
+    records = list(DEFAULT_COMPANIES)
+    master_path = get_setting("COMPANY_MASTER_PATH")
+    if master_path and os.path.exists(master_path):
+        records += load_master_list(master_path)
+    return records
+
+
+def get_company_index():
+    """プロセス共通の企業インデックスを取得（COMPANY_MASTER_PATH があればマスタを読み込む）"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CompanyIndex(load_company_records())
+    return _index
@@ -0,0 +1,236 @@
+"""認証情報マネージャ
+
+起動時に認証ソースを優先順に1度だけ試し、成功したソースを記憶して以後は直接再利用する。
+取得したトークンはバックグラウンドで期限前に更新し、リクエスト経路では
+認証チェーンの探索（CLI 呼び出しやタイムアウト待ち）を行わない。
+探索・トークン取得（ネットワーク呼び出し）はロックの外で行い、結果の差し替えだけをロック内で行う。
+ブラウザ対話認証は INTERACTIVE_BROWSER_AUTH で明示的に有効にした場合のみ（ヘッドレス環境では常に除外）。
+"""
+import os
+import sys
+import threading
+import time
+
+from azure.core.exceptions import ClientAuthenticationError
+from azure.identity import (
+    DefaultAzureCredential,
+    AzureCliCredential,
+    AzureDeveloperCliCredential,
+    EnvironmentCredential,
+    InteractiveBrowserCredential,
+    ClientSecretCredential,
+)
+
+from .utils import get_setting, get_bool_setting
+
+
+TOKEN_SCOPE = "https://ai.azure.com/.default"
+# 有効期限のこの秒数前にバックグラウンドで更新する
+REFRESH_MARGIN_SEC = 300
+# キャッシュ済みトークンを返してよい残り秒数の下限
+MIN_TOKEN_VALIDITY_SEC = 60
+RETRY_INTERVAL_SEC = 30
+
+
+def is_headless():
+    """ブラウザ対話認証が使えない環境か（HEADLESS_MODE で明示指定可能）"""
+    configured = get_setting("HEADLESS_MODE")
+    if configured is not None:
+        return get_bool_setting("HEADLESS_MODE")
+    return sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+
+
+def interactive_browser_enabled(headless=None):
+    """ブラウザ対話認証を試すか（INTERACTIVE_BROWSER_AUTH が真、かつヘッドレスでない場合のみ）"""
+    headless = is_headless() if headless is None else headless
+    return get_bool_setting("INTERACTIVE_BROWSER_AUTH", False) and not headless
+
+
+def credential_sources(headless=None):
+    """(ソース名, 生成関数) を優先順に返す。
+    1) サービスプリンシパル (secrets: AZURE_TENANT_ID/AZURE_CLIENT_ID/AZURE_CLIENT_SECRET)
+    2) 環境変数 (EnvironmentCredential)
+    3) Azure Developer CLI (azd auth login)
+    4) Azure CLI (az login)
+    5) ブラウザ対話 (InteractiveBrowserCredential) ※INTERACTIVE_BROWSER_AUTH で有効にした場合のみ
+    6) DefaultAzureCredential 最後の保険（ブラウザ対話は含めない）
+    FORCE_DEFAULT_CRED が真なら DefaultAzureCredential のみ。
+    """
+    browser = interactive_browser_enabled(headless)
+    if get_bool_setting("FORCE_DEFAULT_CRED"):
+        return [("default", lambda: DefaultAzureCredential(
+            exclude_broker=True, exclude_interactive_browser_credential=True))]
+
+    sources = []
+    tenant_id = get_setting("AZURE_TENANT_ID")
+    client_id = get_setting("AZURE_CLIENT_ID")
+    client_secret = get_setting("AZURE_CLIENT_SECRET")
+    if tenant_id and client_id and client_secret:
+        sources.append(("service_principal", lambda: ClientSecretCredential(
+            tenant_id=tenant_id, client_id=client_id, client_secret=client_secret)))
+    sources += [
+        ("environment", EnvironmentCredential),
+        ("azd", AzureDeveloperCliCredential),
+        ("az_cli", AzureCliCredential),
+    ]
+    if browser:
+        sources.append(("interactive_browser", InteractiveBrowserCredential))
+    sources.append(("default", lambda: DefaultAzureCredential(
+        exclude_broker=True, exclude_interactive_browser_credential=True)))
+    return sources
+
+
+class _CachedTokenCredential:
+    """マネージャが保持するトークンを優先して返す TokenCredential"""
+
+    def __init__(self, manager):
+        self._manager = manager
+
+    def get_token(self, *scopes, **kwargs):
+        return self._manager.get_token(*scopes, **kwargs)
+
+    def close(self):
+        pass
+
+
+class CredentialManager:
+    """認証ソースの探索結果とトークンを保持するマネージャ"""
+
+    def __init__(self, scope=TOKEN_SCOPE):
+        self.scope = scope
+        self.source = None
+        self.attempts = []
+        self._credential = None
+        self._token = None
+        # _lock は状態の参照・差し替えのみ。探索は _probe_lock で 1 つに絞り、状態のロックは保持しない
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._refresher = None
+
+    def probe(self):
+        """認証ソースを優先順に試し、最初に成功したものを記憶する"""
+        attempts = []
+        for name, factory in credential_sources():
+            started = time.perf_counter()
+            try:
+                credential = factory()
+                token = credential.get_token(self.scope)
+            except Exception as e:
+                attempts.append({"source": name, "ok": False, "error": str(e)[:200],
+                                 "latency_ms": round((time.perf_counter() - started) * 1000, 1)})
+                continue
+            attempts.append({"source": name, "ok": True,
+                             "latency_ms": round((time.perf_counter() - started) * 1000, 1)})
+            with self._lock:
+                self._credential, self._token, self.source = credential, token, name
+                self.attempts = attempts
+            return credential
+        with self._lock:
+            self.attempts = attempts
+        raise RuntimeError("利用可能な認証情報が見つかりません: " + ", ".join(
+            f"{a['source']}({a.get('error', '')})" for a in attempts))
+
+    def _ensure_probed(self):
+        credential = self._credential
+        if credential is not None:
+            return credential
+        # 同時に呼ばれても探索は 1 回だけ（待つのは未探索の間だけで、探索済みならロックを取らない）
+        with self._probe_lock:
+            return self._credential or self.probe()
+
+    def get_token(self, *scopes, **kwargs):
+        """既定スコープかつ追加要求（claims 等）なしの場合はキャッシュ済みトークンを返す"""
+        credential = self._ensure_probed()
+        if scopes == (self.scope,) and not kwargs.get("claims"):
+            with self._lock:
+                token = self._token
+            if token and token.expires_on - time.time() > MIN_TOKEN_VALIDITY_SEC:
+                return token
+            token = credential.get_token(self.scope)
+            with self._lock:
+                if self._credential is credential:
+                    self._token = token
+            return token
+        return credential.get_token(*scopes, **kwargs)
+
+    def get_credential(self):
+        """SDK クライアントに渡す TokenCredential を返す"""
+        self._ensure_probed()
+        return _CachedTokenCredential(self)
+
+    def _refresh_loop(self):
+        failed = False
+        while True:
+            with self._lock:
+                credential, token = self._credential, self._token
+            wait = (token.expires_on - time.time() - REFRESH_MARGIN_SEC) if token else 0
+            time.sleep(max(wait, RETRY_INTERVAL_SEC if token is None or failed else 1))
+            try:
+                if credential is None:
+                    self._ensure_probed()
+                else:
+                    token = credential.get_token(self.scope)
+                    with self._lock:
+                        if self._credential is credential:
+                            self._token = token
+                failed = False
+            except ClientAuthenticationError:
+                # 記憶したソースで認証できなくなった場合のみ、次回に探索し直す
+                with self._lock:
+                    if self._credential is credential:
+                        self._credential = None
+                        self._token = None
+                failed = True
+            except Exception:
+                # 一時的な失敗（ネットワーク等）はソースを保ったまま再試行する
+                failed = True
+
+    def start_refresher(self):
+        """トークンを期限前に更新するバックグラウンドスレッドを開始"""
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresher", daemon=True)
+                self._refresher.start()
+
+    def status(self):
+        """探索結果とトークン状態（UI・ヘルスチェック表示用）"""
+        with self._lock:
+            return {
+                "source": self.source,
+                "attempts": list(self.attempts),
+                "expires_in_sec": int(self._token.expires_on - time.time()) if self._token else None,
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+_warmed_up = False
+
+
+def get_credential_manager():
+    """プロセス共通の認証マネージャを取得"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = CredentialManager()
+    return _manager
+
+
+def warm_up():
+    """起動直後に認証ソースの探索とトークン取得をバックグラウンドで開始する（プロセスで1回のみ）"""
+    global _warmed_up
+    with _manager_lock:
+        if _warmed_up:
+            return
+        _warmed_up = True
+    manager = get_credential_manager()
+
+    def _run():
+        try:
+            manager._ensure_probed()
+        except Exception:
+            pass
+        manager.start_refresher()
+
+    threading.Thread(target=_run, name="credential-warm-up", daemon=True).start()
@@ -1,5 +1,26 @@
 import re
 import json
+import unicodedata
+from functools import lru_cache
+
+from .profiling import stage
+from .tracing import set_attributes, span, traced
+
+
+# 金額表現（例: 1兆2,000億円 / 3,500億円 / 2千億円 / 800万円）
+AMOUNT_PATTERN = (
+    r'\d+(?:,\d{3})*(?:\.\d+)?\s*'
+    r'(?:[千百]?兆(?:\s*\d+(?:,\d{3})*(?:\.\d+)?\s*[千百]?億)?|[千百]?億(?:\s*\d+(?:,\d{3})*\s*[千百]?万)?|[千百]?万)\s*円'
+)
+
+# リスト系抽出の上限件数（スライド・画面の表示件数に合わせる）
+MAX_CHALLENGES = 3
+MAX_INITIATIVES = 3
+MAX_TRENDS = 4
+# 上限件数に対して何倍の候補を集めた時点で走査を打ち切るか
+CANDIDATE_FACTOR = 3
+# この類似度（文字3-gramの Jaccard）以上の文は重複とみなす
+NEAR_DUPLICATE_THRESHOLD = 0.8
 
 
 def safe_get(data, keys, default="データ取得中..."):
@@ -41,6 +62,7 @@ def extract_text_data(text, patterns, default="情報収集中"):
     return default
 
 
+@traced("extract.year")
 def extract_year(text):
     """設立年の抽出"""
     patterns = [
@@ -52,26 +74,29 @@ def extract_year(text):
     return extract_text_data(text, patterns, "設立年調査中")
 
 
+@traced("extract.employee_count")
 def extract_employee_count(text):
     """従業員数の抽出"""
     patterns = [
-        r'従業員[：:]?\s*約?(\d+(?:,\d+)?)\s*人',
-        r'社員数[：:]?\s*約?(\d+(?:,\d+)?)\s*人',
-        r'(\d+(?:,\d+)?)\s*人.*従業員'
+        r'従業員[：:]?\s*約?(\d+(?:,\d{3})*)\s*人',
+        r'社員数[：:]?\s*約?(\d+(?:,\d{3})*)\s*人',
+        r'(\d+(?:,\d{3})*)\s*人.*従業員'
     ]
     return extract_text_data(text, patterns, "従業員数調査中")
 
 
+@traced("extract.revenue")
 def extract_revenue(text):
     """売上高の抽出"""
+    # 単位（兆円/億円/万円）を含めて抽出し、正規化段階で桁を復元できるようにする
     patterns = [
-        r'売上[高]?[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*億円',
-        r'売上[高]?[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*兆円',
-        r'収益[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*億円'
+        rf'売上[高]?[：:]?\s*約?({AMOUNT_PATTERN})',
+        rf'収益[：:]?\s*約?({AMOUNT_PATTERN})'
     ]
     return extract_text_data(text, patterns, "売上高調査中")
 
 
+@traced("extract.business_overview")
 def extract_business_overview(text):
     """事業概要の抽出"""
     patterns = [
@@ -83,6 +108,7 @@ def extract_business_overview(text):
     return result[:200] + "..." if len(result) > 200 else result
 
 
+@traced("extract.industry_name")
 def extract_industry_name(text, target):
     """業界名の抽出"""
     patterns = [
@@ -94,52 +120,119 @@ def extract_industry_name(text, target):
     return result.replace("業界", "") + "業界" if "業界" not in result else result
 
 
+@traced("extract.market_size")
 def extract_market_size(text):
     """市場規模の抽出"""
     patterns = [
-        r'市場規模[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*億円',
-        r'市場規模[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*兆円',
-        r'マーケット規模[：:]?\s*約?(\d+(?:,\d+)?(?:\.\d+)?)\s*億円'
+        rf'市場規模[：:]?\s*約?({AMOUNT_PATTERN})',
+        rf'マーケット規模[：:]?\s*約?({AMOUNT_PATTERN})'
     ]
     return extract_text_data(text, patterns, "市場規模調査中")
 
 
-def extract_challenges(text):
+@lru_cache(maxsize=128)
+def _compile(pattern):
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _normalize_sentence(sentence):
+    """重複判定用の正規化（全角→半角・小文字化・空白と句読点の除去）"""
+    sentence = unicodedata.normalize("NFKC", sentence).lower()
+    return re.sub(r'[\s、。，,．.・:：;；「」『』()（）\[\]【】"\'!！?？]', '', sentence)
+
+
+def _shingles(normalized, n=3):
+    if len(normalized) <= n:
+        return {hash(normalized)}
+    return {hash(normalized[i:i + n]) for i in range(len(normalized) - n + 1)}
+
+
+def _relevance(sentence, focus_terms):
+    """調査観点の文字2-gramが文中に含まれる割合"""
+    if not focus_terms:
+        return 0.0
+    normalized = _normalize_sentence(sentence)
+    return sum(1 for term in focus_terms if term in normalized) / len(focus_terms)
+
+
+def _focus_terms(focus_area):
+    normalized = _normalize_sentence(focus_area or "")
+    if len(normalized) <= 2:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def extract_ranked_sentences(text, patterns, top_k, focus_area=None, max_len=100):
+    """複数パターンから文を抽出し、重複除去・関連度順で上位 top_k 件を返す。
+
+    - パターンの出現順に走査し、top_k * CANDIDATE_FACTOR 件集まった時点で打ち切る
+    - 正規化後のハッシュが一致する文、および3-gram類似度の高い文は重複として除外
+    - focus_area が指定されていれば、その文字2-gramとの一致率で並べ替える（同率は出現順）
+    """
+    budget = top_k * CANDIDATE_FACTOR
+    seen = set()
+    kept_shingles = []
+    candidates = []
+    for pattern in patterns:
+        for match in _compile(pattern).finditer(text):
+            sentence = match.group(1).strip().lstrip(':：、 ')[:max_len]
+            normalized = _normalize_sentence(sentence)
+            if not normalized or hash(normalized) in seen:
+                continue
+            shingles = _shingles(normalized)
+            if any(
+                len(shingles & other) / len(shingles | other) >= NEAR_DUPLICATE_THRESHOLD
+                for other in kept_shingles
+            ):
+                continue
+            seen.add(hash(normalized))
+            kept_shingles.append(shingles)
+            candidates.append(sentence)
+            if len(candidates) >= budget:
+                break
+        if len(candidates) >= budget:
+            break
+
+    focus_terms = _focus_terms(focus_area)
+    if focus_terms:
+        order = sorted(range(len(candidates)), key=lambda i: (-_relevance(candidates[i], focus_terms), i))
+        candidates = [candidates[i] for i in order]
+    return candidates[:top_k]
+
+
+@traced("extract.challenges")
+def extract_challenges(text, focus_area=None):
     """課題の抽出"""
-    challenges = []
     patterns = [
         r'課題[：:]?\s*([^。]+)',
         r'問題点[：:]?\s*([^。]+)',
         r'改善点[：:]?\s*([^。]+)'
     ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches[:2]:
-            challenges.append({
-                "specific_issue": match.strip()[:100],
-                "business_impact": "影響分析中"
-            })
+    challenges = [
+        {"specific_issue": sentence, "business_impact": "影響分析中"}
+        for sentence in extract_ranked_sentences(text, patterns, MAX_CHALLENGES, focus_area)
+    ]
     if not challenges:
         challenges = [{"specific_issue": "詳細な課題分析を実行中", "business_impact": "ビジネス影響を調査中"}]
     return challenges
 
 
+@traced("extract.initiatives")
 def extract_initiatives(text, focus_area):
     """取り組み・施策の抽出"""
-    initiatives = []
     patterns = [
         r'取り組み[：:]?\s*([^。]+)',
         r'施策[：:]?\s*([^。]+)',
         r'導入[：:]?\s*([^。]+)',
-        rf'{focus_area}.*?([^。]+)'
     ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches[:2]:
-            initiatives.append({
-                "initiative": match.strip()[:100],
-                "results": {"quantitative": "効果測定中"}
-            })
+    if focus_area:
+        # ユーザー入力は正規表現として解釈させない。
+        # 候補数の上限で打ち切られないよう、調査観点を含む文を最初に集める
+        patterns.insert(0, rf'{re.escape(focus_area)}([^。]+)')
+    initiatives = [
+        {"initiative": sentence, "results": {"quantitative": "効果測定中"}}
+        for sentence in extract_ranked_sentences(text, patterns, MAX_INITIATIVES, focus_area)
+    ]
     if not initiatives:
         initiatives = [{
             "initiative": f"{focus_area}関連の取り組み調査中",
@@ -148,6 +241,7 @@ def extract_initiatives(text, focus_area):
     return initiatives
 
 
+@traced("extract.best_practices")
 def extract_best_practices(text):
     """先進事例の抽出"""
     practices = []
@@ -169,26 +263,24 @@ def extract_best_practices(text):
     return practices
 
 
-def extract_trends(text):
+@traced("extract.trends")
+def extract_trends(text, focus_area=None):
     """トレンドの抽出"""
-    trends = []
     patterns = [
         r'トレンド[：:]?\s*([^。]+)',
         r'動向[：:]?\s*([^。]+)',
         r'傾向[：:]?\s*([^。]+)'
     ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches[:3]:
-            trends.append({
-                "trend_name": match.strip()[:50],
-                "description": "詳細分析中"
-            })
+    trends = [
+        {"trend_name": sentence, "description": "詳細分析中"}
+        for sentence in extract_ranked_sentences(text, patterns, MAX_TRENDS, focus_area, max_len=50)
+    ]
     if not trends:
         trends = [{"trend_name": "業界トレンド分析中", "description": "市場動向を調査中"}]
     return trends
 
 
+@traced("extract.metrics")
 def extract_metrics(text):
     """メトリクス・数値データの抽出"""
     metrics = {
@@ -212,6 +304,7 @@ def extract_metrics(text):
     return metrics
 
 
+@traced("extract.industry_voice")
 def extract_industry_voice(text):
     """業界関係者の声・コメントの抽出"""
     patterns = [
@@ -256,32 +349,58 @@ def validate_and_clean_response(parsed_data, target, focus_area):
 
 def parse_agent_response(agent_response, target, focus_area):
     """エージェント応答の解析（複数パターン対応）"""
+    with span("parse_agent_response", **{"response.size": len(agent_response)}):
+        for strategy, parse in (
+            ("fenced_json", _parse_fenced_json),
+            ("outer_braces", _parse_outer_braces),
+            ("json_blocks", _parse_json_blocks),
+        ):
+            with span("parse.strategy", **{"parse.strategy": strategy}):
+                parsed = parse(agent_response)
+                set_attributes(**{"parse.success": parsed is not None})
+            if parsed is not None:
+                set_attributes(**{"parse.strategy": strategy})
+                return validate_and_clean_response(parsed, target, focus_area)
+        set_attributes(**{"parse.strategy": "text_extraction"})
+        with span("parse.strategy", **{"parse.strategy": "text_extraction"}), stage("text_extraction"):
+            return extract_structured_data_from_text(agent_response, target, focus_area)
+
+
+def _parse_fenced_json(agent_response):
+    """```json ... ``` ブロックの解析"""
     if "```json" in agent_response:
         try:
             json_start = agent_response.find("```json") + 7
             json_end = agent_response.find("```", json_start)
             json_str = agent_response[json_start:json_end].strip()
-            parsed = json.loads(json_str)
-            return validate_and_clean_response(parsed, target, focus_area)
+            return json.loads(json_str)
         except json.JSONDecodeError:
             pass
+    return None
+
+
+def _parse_outer_braces(agent_response):
+    """最初の { から最後の } までの解析"""
     try:
         start_idx = agent_response.find('{')
         end_idx = agent_response.rfind('}') + 1
         if start_idx != -1 and end_idx > start_idx:
             json_str = agent_response[start_idx:end_idx]
-            parsed = json.loads(json_str)
-            return validate_and_clean_response(parsed, target, focus_area)
+            return json.loads(json_str)
     except json.JSONDecodeError:
         pass
+    return None
+
+
+def _parse_json_blocks(agent_response):
+    """入れ子 2 段までの JSON ブロックを長い順に解析"""
     json_blocks = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', agent_response, re.DOTALL)
     for block in sorted(json_blocks, key=len, reverse=True):
         try:
-            parsed = json.loads(block)
-            return validate_and_clean_response(parsed, target, focus_area)
+            return json.loads(block)
         except json.JSONDecodeError:
             continue
-    return extract_structured_data_from_text(agent_response, target, focus_area)
+    return None
 
 
 def extract_structured_data_from_text(text, target, focus_area):
@@ -299,13 +418,13 @@ def extract_structured_data_from_text(text, target, focus_area):
             "market_size": extract_market_size(text),
             "top5_companies": [],
         },
-        "current_challenges": extract_challenges(text),
+        "current_challenges": extract_challenges(text, focus_area),
         "focus_area_analysis": {
             "current_initiatives": extract_initiatives(text, focus_area),
         },
         "best_practices": extract_best_practices(text),
         "market_trends": {
-            "key_trends": extract_trends(text),
+            "key_trends": extract_trends(text, focus_area),
         },
         "industry_metrics": extract_metrics(text),
         "industry_voice": extract_industry_voice(text),
@@ -313,7 +432,50 @@ def extract_structured_data_from_text(text, target, focus_area):
     return extracted_data
 
 
-
-
-
-
+def estimate_search_count(response_text: str) -> int:
+    """応答テキストから推定検索回数を計算"""
+    word_count = len(response_text.split())
+    company_mentions = len(re.findall(r'(?:株式会社|Inc\.|Corp\.|Ltd\.)', response_text))
+    base_count = min(15, max(5, word_count // 200))
+    bonus_count = min(5, company_mentions)
+    return base_count + bonus_count
+
+
+# 品質スコアの評価項目と重み（src/analytics.py の一括計算も同じ定義を使う）
+QUALITY_CHECKS = [
+    ("company_profile.official_name", 1.5),
+    ("company_profile.business_overview", 1.0),
+    ("industry_analysis.industry_name", 1.0),
+    ("current_challenges", 1.5),
+    ("focus_area_analysis.current_initiatives", 2.0),
+    ("best_practices", 1.5),
+    ("market_trends.key_trends", 1.0),
+    ("industry_metrics", 0.5),
+]
+MAX_QUALITY_SCORE = 10.0
+
+# データ完成度の対象となる主要フィールド
+COMPLETENESS_FIELDS = [
+    "company_profile", "industry_analysis", "current_challenges", "focus_area_analysis",
+    "best_practices", "market_trends", "industry_metrics", "industry_voice",
+]
+
+
+def calculate_response_quality(parsed_data: dict) -> float:
+    """応答データの品質スコアを計算"""
+    score = 0.0
+    for field_path, weight in QUALITY_CHECKS:
+        field_value = safe_get(parsed_data, field_path)
+        if field_value and field_value != "データ取得中..." and field_value != "調査実行中":
+            if isinstance(field_value, list) and len(field_value) > 0:
+                score += weight
+            elif isinstance(field_value, str) and len(field_value) > 10:
+                score += weight
+            elif isinstance(field_value, dict) and field_value:
+                score += weight
+    return min(score, MAX_QUALITY_SCORE)
+
+
+def calculate_completeness(parsed_data: dict) -> int:
+    """値が入っている主要フィールドの数（最大 len(COMPLETENESS_FIELDS)）"""
+    return sum(1 for key in COMPLETENESS_FIELDS if parsed_data.get(key))
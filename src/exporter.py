@@ -0,0 +1,238 @@
+"""調査結果の一括エクスポート（Parquet / Arrow / CSV）
+
+ネストした調査結果 dict を型付きのフラットな列へ展開し、
+チャンク単位でストリーミング書き出しする。
+"""
+import json
+import os
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+# 一覧系フィールドの最大展開数（スライドの表示件数に合わせる）
+TOP_COMPANY_SLOTS = 5
+CHALLENGE_SLOTS = 3
+INITIATIVE_SLOTS = 3
+BEST_PRACTICE_SLOTS = 3
+TREND_SLOTS = 4
+
+METRIC_KEYS = ["efficiency_improvement", "revenue_increase", "cost_reduction", "productivity_gain"]
+PROFILE_KEYS = [
+    "official_name", "established_year", "employees", "revenue",
+    "business_overview", "revenue_structure", "business_model",
+]
+
+
+def _build_schema():
+    """エクスポート用の固定スキーマを構築"""
+    fields = [
+        pa.field("target", pa.string()),
+        pa.field("focus_area", pa.string()),
+        pa.field("research_status", pa.string()),
+        pa.field("data_quality_score", pa.float64()),
+        pa.field("search_count", pa.int64()),
+        pa.field("error_reason", pa.string()),
+    ]
+    fields += [pa.field(f"profile_{key}", pa.string()) for key in PROFILE_KEYS]
+    fields += [
+        pa.field("industry_name", pa.string()),
+        pa.field("industry_market_size", pa.string()),
+        pa.field("industry_market_position", pa.string()),
+    ]
+    for i in range(1, TOP_COMPANY_SLOTS + 1):
+        fields += [
+            pa.field(f"top{i}_rank", pa.int64()),
+            pa.field(f"top{i}_company", pa.string()),
+            pa.field(f"top{i}_market_share", pa.string()),
+            pa.field(f"top{i}_competitive_advantage", pa.string()),
+        ]
+    fields.append(pa.field("challenges_count", pa.int64()))
+    for i in range(1, CHALLENGE_SLOTS + 1):
+        fields += [
+            pa.field(f"challenge{i}_issue", pa.string()),
+            pa.field(f"challenge{i}_impact", pa.string()),
+        ]
+    fields.append(pa.field("initiatives_count", pa.int64()))
+    for i in range(1, INITIATIVE_SLOTS + 1):
+        fields += [
+            pa.field(f"initiative{i}_name", pa.string()),
+            pa.field(f"initiative{i}_quantitative", pa.string()),
+        ]
+    fields.append(pa.field("best_practices_count", pa.int64()))
+    for i in range(1, BEST_PRACTICE_SLOTS + 1):
+        fields += [
+            pa.field(f"best_practice{i}_company", pa.string()),
+            pa.field(f"best_practice{i}_results", pa.string()),
+        ]
+    fields.append(pa.field("trends_count", pa.int64()))
+    for i in range(1, TREND_SLOTS + 1):
+        fields += [
+            pa.field(f"trend{i}_name", pa.string()),
+            pa.field(f"trend{i}_description", pa.string()),
+        ]
+    fields += [pa.field(f"metric_{key}", pa.string()) for key in METRIC_KEYS]
+    fields.append(pa.field("industry_voice", pa.string()))
+    return pa.schema(fields)
+
+
+EXPORT_SCHEMA = _build_schema()
+
+
+def _text(value):
+    """任意の値を文字列列に格納できる形へ変換"""
+    if value is None or value == "" or value == {} or value == []:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _int(value):
+    """整数列に格納できる値へ変換（変換不可は None）"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    """浮動小数列に格納できる値へ変換（変換不可は None）"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _dict(data, key):
+    value = data.get(key) if isinstance(data, dict) else None
+    return value if isinstance(value, dict) else {}
+
+
+def _list(data, key):
+    value = data.get(key) if isinstance(data, dict) else None
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
+
+
+def flatten_research_result(result, target=None, focus_area=None):
+    """調査結果 dict を EXPORT_SCHEMA に沿ったフラットな行 dict に変換"""
+    profile = _dict(result, "company_profile")
+    industry = _dict(result, "industry_analysis")
+    focus = _dict(result, "focus_area_analysis")
+    metrics = _dict(result, "industry_metrics")
+
+    row = {
+        "target": _text(target),
+        "focus_area": _text(focus_area),
+        "research_status": _text(result.get("research_status")),
+        "data_quality_score": _float(result.get("data_quality_score")),
+        "search_count": _int(result.get("search_count")),
+        "error_reason": _text(result.get("error_reason")),
+    }
+    for key in PROFILE_KEYS:
+        row[f"profile_{key}"] = _text(profile.get(key))
+    row["industry_name"] = _text(industry.get("industry_name"))
+    row["industry_market_size"] = _text(industry.get("market_size"))
+    row["industry_market_position"] = _text(industry.get("market_position"))
+
+    top5 = _list(industry, "top5_companies")
+    for i in range(TOP_COMPANY_SLOTS):
+        company = top5[i] if i < len(top5) else {}
+        row[f"top{i + 1}_rank"] = _int(company.get("rank"))
+        row[f"top{i + 1}_company"] = _text(company.get("company"))
+        row[f"top{i + 1}_market_share"] = _text(company.get("market_share"))
+        row[f"top{i + 1}_competitive_advantage"] = _text(company.get("competitive_advantage"))
+
+    challenges = _list(result, "current_challenges")
+    row["challenges_count"] = len(challenges)
+    for i in range(CHALLENGE_SLOTS):
+        challenge = challenges[i] if i < len(challenges) else {}
+        row[f"challenge{i + 1}_issue"] = _text(challenge.get("specific_issue"))
+        row[f"challenge{i + 1}_impact"] = _text(challenge.get("business_impact"))
+
+    initiatives = _list(focus, "current_initiatives")
+    row["initiatives_count"] = len(initiatives)
+    for i in range(INITIATIVE_SLOTS):
+        initiative = initiatives[i] if i < len(initiatives) else {}
+        results = initiative.get("results")
+        quantitative = results.get("quantitative") if isinstance(results, dict) else results
+        row[f"initiative{i + 1}_name"] = _text(initiative.get("initiative"))
+        row[f"initiative{i + 1}_quantitative"] = _text(quantitative)
+
+    practices = _list(result, "best_practices")
+    row["best_practices_count"] = len(practices)
+    for i in range(BEST_PRACTICE_SLOTS):
+        practice = practices[i] if i < len(practices) else {}
+        row[f"best_practice{i + 1}_company"] = _text(practice.get("company"))
+        row[f"best_practice{i + 1}_results"] = _text(practice.get("results"))
+
+    trends = _list(_dict(result, "market_trends"), "key_trends")
+    row["trends_count"] = len(trends)
+    for i in range(TREND_SLOTS):
+        trend = trends[i] if i < len(trends) else {}
+        row[f"trend{i + 1}_name"] = _text(trend.get("trend_name"))
+        row[f"trend{i + 1}_description"] = _text(trend.get("description"))
+
+    for key in METRIC_KEYS:
+        row[f"metric_{key}"] = _text(metrics.get(key))
+    row["industry_voice"] = _text(result.get("industry_voice"))
+    return row
+
+
+def _rows_to_batch(rows):
+    """行 dict のリストを RecordBatch に変換"""
+    columns = {name: [row[name] for row in rows] for name in EXPORT_SCHEMA.names}
+    return pa.RecordBatch.from_pydict(columns, schema=EXPORT_SCHEMA)
+
+
+def _detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".arrow", ".feather", ".ipc"):
+        return "arrow"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"拡張子から出力形式を判定できません: {path}")
+
+
+def export_results(records, path, fmt=None, chunk_size=1000):
+    """(target, focus_area, result) の反復からファイルへストリーミング出力する。
+
+    メモリ上には chunk_size 行分のみ保持する。書き出した行数を返す。
+    """
+    fmt = fmt or _detect_format(path)
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(path, EXPORT_SCHEMA, compression="zstd")
+    elif fmt == "arrow":
+        writer = pa.ipc.new_file(path, EXPORT_SCHEMA)
+    elif fmt == "csv":
+        writer = pa_csv.CSVWriter(path, EXPORT_SCHEMA)
+    else:
+        raise ValueError(f"未対応の出力形式です: {fmt}")
+
+    total = 0
+    iterator = iter(records)
+    try:
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            rows = [flatten_research_result(result, target, focus_area) for target, focus_area, result in chunk]
+            writer.write_batch(_rows_to_batch(rows))
+            total += len(rows)
+    finally:
+        writer.close()
+    return total
+
+
+def results_to_csv_bytes(records):
+    """少量の結果を CSV バイト列に変換（UI ダウンロード用）"""
+    rows = [flatten_research_result(result, target, focus_area) for target, focus_area, result in records]
+    sink = pa.BufferOutputStream()
+    with pa_csv.CSVWriter(sink, EXPORT_SCHEMA) as writer:
+        if rows:
+            writer.write_batch(_rows_to_batch(rows))
+    return sink.getvalue().to_pybytes()
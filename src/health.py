@@ -0,0 +1,197 @@
+"""軽量ヘルスチェック
+
+設定確認 → トークン取得 → get_agent（メタデータ取得）の順に段階的に確認する。
+エージェント実行を伴う詳細テスト（test_connection）は deep=True の場合のみ。
+結果は TTL 付きでキャッシュし、バックグラウンドの定期プローブで更新する。
+ロードバランサ向けに JSON を返す HTTP エンドポイント（/healthz）も提供する。
+エンドポイントは認証を持たないため、既定では HEALTH_HOST=127.0.0.1 で待ち受ける。
+/metrics では実行スケジューラのキュー長・待ち時間・予算消化と、バックエンドごとの観測値を返す。
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from . import azure_agent
+from .credentials import TOKEN_SCOPE, get_credential_manager
+from .routing import backend_status, create_client, load_backends
+from .scheduler import get_scheduler
+from .utils import get_setting
+
+
+DEFAULT_CACHE_TTL_SEC = 60
+DEFAULT_PROBE_INTERVAL_SEC = 30
+DEFAULT_HOST = "127.0.0.1"
+
+_cache = {}
+_cache_lock = threading.Lock()
+_prober_thread = None
+_server = None
+_start_lock = threading.Lock()
+
+
+def _timed_check(name, func):
+    """1 段階分のチェックを実行し、所要時間付きの結果を返す"""
+    started = time.perf_counter()
+    try:
+        detail = func()
+        ok = True
+    except Exception as e:
+        detail = str(e)
+        ok = False
+    return {
+        "name": name,
+        "ok": ok,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "detail": detail,
+    }
+
+
+def run_health_checks(deep=False):
+    """段階的ヘルスチェックを実行（キャッシュなし）。失敗した段階で打ち切る"""
+    checks = []
+    backends = load_backends()
+
+    def check_config():
+        if not backends:
+            raise ValueError("AZURE_AGENT_BACKENDS / AZURE_AI_ENDPOINT / AZURE_AGENT_ID 未設定")
+        return f"バックエンド {len(backends)} 件"
+
+    def check_token():
+        credential = azure_agent.get_credential()
+        token = credential.get_token(TOKEN_SCOPE)
+        source = get_credential_manager().source
+        return f"{source}: 有効期限まで {int(token.expires_on - time.time())} 秒"
+
+    def check_agent():
+        agents = {}
+        for backend in backends:
+            agent = create_client(backend).agents.get_agent(backend.agent_id)
+            agents[backend.name] = {"id": agent.id, "name": getattr(agent, "name", None),
+                                    "model": getattr(agent, "model", None)}
+        return agents
+
+    def check_run():
+        result = azure_agent.test_connection()
+        if not result.get("ok"):
+            raise RuntimeError(f"{result.get('stage')}: {result.get('detail')}")
+        return "エージェント実行成功"
+
+    stages = [("config", check_config), ("token", check_token), ("agent", check_agent)]
+    if deep:
+        stages.append(("run", check_run))
+
+    for name, func in stages:
+        checks.append(_timed_check(name, func))
+        if not checks[-1]["ok"]:
+            break
+
+    failed = next((check for check in checks if not check["ok"]), None)
+    return {
+        "ok": failed is None,
+        "stage": failed["name"] if failed else "done",
+        "detail": failed["detail"] if failed else None,
+        "deep": deep,
+        "checks": checks,
+        "checked_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def _cache_ttl():
+    return float(get_setting("HEALTH_CACHE_TTL_SEC", DEFAULT_CACHE_TTL_SEC))
+
+
+def check_health(deep=False, force=False):
+    """キャッシュ付きヘルスチェック。TTL 内であれば前回結果を返す"""
+    with _cache_lock:
+        entry = _cache.get(deep)
+    if entry and not force and time.time() - entry["timestamp"] < _cache_ttl():
+        return dict(entry["result"], cached=True)
+    result = run_health_checks(deep=deep)
+    with _cache_lock:
+        _cache[deep] = {"timestamp": time.time(), "result": result}
+    return dict(result, cached=False)
+
+
+def get_cached_health(deep=False):
+    """キャッシュ済みの結果のみを返す（未取得なら None）。リクエスト経路からは外部呼び出しをしない。
+
+    TTL を過ぎた結果は ok=False・stage="stale" として返す（プローブの停止や、UI で一度だけ実行した詳細チェックを
+    いつまでも正常と報告しないため）。
+    """
+    with _cache_lock:
+        entry = _cache.get(deep)
+    if not entry:
+        return None
+    age = time.time() - entry["timestamp"]
+    result = dict(entry["result"], cached=True, age_sec=round(age, 1))
+    if age > _cache_ttl():
+        result.update(ok=False, stage="stale", detail=f"前回の結果から {age:.0f} 秒経過（TTL {_cache_ttl():.0f} 秒）")
+    return result
+
+
+def _probe_loop(interval):
+    while True:
+        try:
+            check_health(force=True)
+        except Exception:
+            pass
+        time.sleep(interval)
+
+
+def start_health_prober(interval=None):
+    """軽量チェックを定期実行するバックグラウンドスレッドを開始（プロセスで1回のみ）"""
+    global _prober_thread
+    interval = float(interval or get_setting("HEALTH_PROBE_INTERVAL_SEC", DEFAULT_PROBE_INTERVAL_SEC))
+    with _start_lock:
+        if _prober_thread is None:
+            _prober_thread = threading.Thread(target=_probe_loop, args=(interval,), name="health-prober", daemon=True)
+            _prober_thread.start()
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._send_json(200, dict(get_scheduler().metrics(), backends=backend_status()))
+            return
+        if url.path not in ("/healthz", "/health"):
+            self.send_error(404)
+            return
+        deep = parse_qs(url.query).get("deep", ["0"])[0] in ("1", "true")
+        result = get_cached_health(deep=deep)
+        if result is None:
+            # 詳細チェックは UI（「🧪 Azure接続テスト」）からのみ実行する
+            result = {"ok": False, "stage": "unknown", "detail": "ヘルスチェック未実行", "deep": deep}
+        self._send_json(200 if result.get("ok") else 503, result)
+
+    def _send_json(self, status, result):
+        body = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_health_server(port=None, host=None):
+    """HEALTH_PORT が設定されていれば /healthz を返す HTTP サーバーを HEALTH_HOST で起動（プロセスで1回のみ）"""
+    global _server
+    port = port or get_setting("HEALTH_PORT")
+    host = host or get_setting("HEALTH_HOST", DEFAULT_HOST)
+    if not port:
+        return None
+    with _start_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _HealthHandler)
+            except OSError:
+                # 同一ホストの別プロセスが既にポートを使用している
+                return None
+            threading.Thread(target=_server.serve_forever, name="health-server", daemon=True).start()
+    return _server
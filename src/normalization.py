@@ -0,0 +1,166 @@
+"""数値表現の正規化（売上高・従業員数・市場規模・メトリクス）
+
+"1,234億円" / "約2.5兆円" / "三千五百人" / "40-70%" のような文字列を、
+pandas の文字列演算でまとめて数値列（値・下限・上限・単位）へ変換する。
+"""
+import numpy as np
+import pandas as pd
+
+from .exporter import flatten_research_result
+
+
+# 単位倍率（基準単位に対する倍率）
+MULTIPLIERS = {
+    "": 1.0,
+    "千": 1e3,
+    "万": 1e4,
+    "百万": 1e6,
+    "千万": 1e7,
+    "億": 1e8,
+    "百億": 1e10,
+    "千億": 1e11,
+    "兆": 1e12,
+    "百兆": 1e14,
+    "千兆": 1e15,
+}
+
+# 単位表記の正規化
+UNIT_ALIASES = {
+    "円": "JPY",
+    "ドル": "USD",
+    "$": "USD",
+    "USD": "USD",
+    "人": "persons",
+    "名": "persons",
+    "%": "percent",
+    "社": "companies",
+}
+
+# 正規化対象の列と、単位が書かれていない場合の既定単位
+NUMERIC_COLUMNS = {
+    "profile_revenue": "JPY",
+    "profile_employees": "persons",
+    "industry_market_size": "JPY",
+    "metric_efficiency_improvement": "percent",
+    "metric_revenue_increase": "percent",
+    "metric_cost_reduction": "percent",
+    "metric_productivity_gain": "percent",
+}
+
+_KANJI_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_KANJI_SMALL_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+_NUM = r"\d+(?:\.\d+)?"
+# 「2千億」「5百万」のように万・億・兆の前に付く千・百は1つの倍率として読む
+_MULT = r"[千百]?(?:兆|億|万)|千"
+# 単一の量: 主数値 + 倍率（+ 1段下の補助数値・倍率。例: 1兆2000億）
+_AMOUNT = rf"{_NUM}\s*(?:{_MULT})?(?:\s*{_NUM}\s*(?:{_MULT}))?"
+_UNIT = r"円|ドル|USD|\$|人|名|%|社"
+_RANGE_SEP = r"[-〜~～―–]"
+# 負数の記号（決算資料の「▲」「△」を含む）
+_SIGN = r"[-−▲△]"
+# 年・月・日が続く数値（「2024年度」「2025年までに」「2024〜2025年」）は量として読まない
+_NOT_DATE = rf"(?!\d|\.\d|\s*[年月日]|\s*{_RANGE_SEP}\s*{_NUM}\s*[年月日])"
+
+# 漢数字列（数字漢字を最低1文字含むもの。「5千万」のように算用数字に続く「千」「万」は倍率として残す）。
+# 「百億円」「千万円」「千人」のように数字の付かない十・百・千は、倍率・単位が続く場合に 1 が省略されたものとみなす
+_KANJI_NUMBER_RE = (
+    r"[〇零一二三四五六七八九十百千]*[〇零一二三四五六七八九][〇零一二三四五六七八九十百千]*"
+    rf"|(?<![\d.])[十百千]+(?=\s*(?:[万億兆]|{_UNIT}))"
+)
+
+_VALUE_RE = (
+    rf"(?P<lo_sign>{_SIGN})?\s*(?P<lo>{_AMOUNT}){_NOT_DATE}\s*(?P<lo_unit>{_UNIT})?"
+    rf"(?:\s*{_RANGE_SEP}\s*(?P<hi_sign>{_SIGN})?\s*(?P<hi>{_AMOUNT}){_NOT_DATE})?\s*(?P<unit>{_UNIT})?"
+)
+_AMOUNT_PARTS_RE = rf"(?P<n1>{_NUM})\s*(?P<m1>{_MULT})?(?:\s*(?P<n2>{_NUM})\s*(?P<m2>{_MULT}))?"
+
+
+def kanji_to_number(text):
+    """漢数字（例: 三千五百）を整数に変換"""
+    total = 0
+    current = 0
+    for char in text:
+        if char in _KANJI_DIGITS:
+            current = current * 10 + _KANJI_DIGITS[char]
+        elif char in _KANJI_SMALL_UNITS:
+            total += (current or 1) * _KANJI_SMALL_UNITS[char]
+            current = 0
+    return total + current
+
+
+def _prepare(series):
+    """全角→半角、カンマ除去、漢数字→算用数字の前処理"""
+    text = series.astype("string").str.normalize("NFKC")
+    text = text.str.replace(",", "", regex=False)
+    text = text.str.replace(_KANJI_NUMBER_RE, lambda m: str(kanji_to_number(m.group(0))), regex=True)
+    return text
+
+
+def _amount_values(amounts):
+    """金額表現の列（"1兆2000億" 等）を倍率込みの数値列へ変換"""
+    parts = amounts.str.extract(_AMOUNT_PARTS_RE)
+    n1 = pd.to_numeric(parts["n1"], errors="coerce").to_numpy(dtype=float)
+    n2 = pd.to_numeric(parts["n2"], errors="coerce").to_numpy(dtype=float)
+    m1 = parts["m1"].fillna("").map(MULTIPLIERS).to_numpy(dtype=float)
+    m2 = parts["m2"].fillna("").map(MULTIPLIERS).to_numpy(dtype=float)
+    return n1 * m1 + np.nan_to_num(n2 * m2), parts["m1"]
+
+
+def normalize_numeric_series(series, default_unit=None):
+    """文字列の列を value / low / high / unit / is_range の DataFrame に変換する。
+
+    value は範囲の場合は中央値。数値が読み取れない行は NaN。
+    """
+    text = _prepare(series)
+    parts = text.str.extract(_VALUE_RE)
+
+    low, low_mult = _amount_values(parts["lo"])
+    high, high_mult = _amount_values(parts["hi"])
+
+    # "3〜5億円" のように下限側の倍率が省略されている場合は上限側の倍率を適用
+    inherit = low_mult.isna().to_numpy() & high_mult.notna().to_numpy()
+    if inherit.any():
+        factors = high_mult.fillna("").map(MULTIPLIERS).to_numpy(dtype=float)
+        low = np.where(inherit, low * factors, low)
+
+    # "▲5%" / "-1.2億円" のような負数
+    low = np.where(parts["lo_sign"].notna().to_numpy(), -low, low)
+    high = np.where(parts["hi_sign"].notna().to_numpy(), -high, high)
+
+    is_range = ~np.isnan(high)
+    high = np.where(is_range, high, low)
+
+    unit = parts["unit"].fillna(parts["lo_unit"]).map(UNIT_ALIASES)
+    if default_unit is not None:
+        unit = unit.where(unit.notna() | np.isnan(low), default_unit)
+
+    return pd.DataFrame(
+        {
+            "value": (low + high) / 2,
+            "low": low,
+            "high": high,
+            "unit": unit.astype("string"),
+            "is_range": is_range,
+        },
+        index=series.index,
+    )
+
+
+def normalize_frame(frame, columns=None):
+    """フラット化済み DataFrame の数値系列を正規化し、<列名>_value 等の列を追加して返す"""
+    columns = columns or NUMERIC_COLUMNS
+    normalized = frame.copy()
+    for column, default_unit in columns.items():
+        if column not in frame:
+            continue
+        values = normalize_numeric_series(frame[column], default_unit)
+        for part in ("value", "low", "high", "unit"):
+            normalized[f"{column}_{part}"] = values[part]
+    return normalized
+
+
+def normalize_results(records):
+    """(target, focus_area, result) の反復を正規化済み DataFrame に変換"""
+    rows = [flatten_research_result(result, target, focus_area) for target, focus_area, result in records]
+    return normalize_frame(pd.DataFrame(rows))
@@ -0,0 +1,186 @@
+"""入力中の投機的な事前準備
+
+調査対象の検証が通り調査観点が入力された時点で、ボタンが押される前にバックグラウンドで
+結果キャッシュの確認（完全一致がなければ調査観点の言い換えにあたる結果も）・トークン取得と
+エージェント解決・スレッドの事前作成を行う。
+「AI調査開始」時の run は事前作成したスレッドを引き継ぎ（claim）、接続とスレッド作成を省く。
+
+- 準備はセッション単位で1組。入力が変わってもスレッドは使い回し、キャッシュ確認だけやり直す
+- PREWARM_TTL_SEC の間使われなかったスレッドは削除して回収する
+- PREWARM_ENABLED を偽にすると無効
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .result_cache import cache_key, get_result_cache
+from .routing import create_client, get_router
+from .utils import get_setting, get_bool_setting
+
+
+DEFAULT_TTL_SEC = 300
+DEFAULT_MAX_WORKERS = 2
+# ボタン押下時に準備がまだ途中なら、この秒数まで完了を待つ
+CLAIM_WAIT_SEC = 5.0
+
+
+class Prewarmer:
+    """セッションごとの事前準備（キャッシュ確認・エージェント・スレッド）"""
+
+    def __init__(self, ttl_sec=DEFAULT_TTL_SEC, max_workers=DEFAULT_MAX_WORKERS):
+        self.ttl_sec = ttl_sec
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prewarm")
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {"prewarmed": 0, "claimed": 0, "reclaimed": 0, "cache_hits": 0, "similar_hits": 0, "errors": 0}
+
+    def prewarm(self, session_id, target, focus_area):
+        """準備をバックグラウンドで開始（同じ入力で準備済み・準備中なら何もしない）"""
+        key = cache_key(target, focus_area)
+        with self._lock:
+            entry = self._entries.setdefault(session_id, {"thread_id": None, "future": None})
+            entry["touched_at"] = time.time()
+            if entry.get("key") == key:
+                return
+            entry.update(key=key, cache_hit=None, similar=None, error=None)
+            entry["future"] = self._executor.submit(self._warm, session_id, entry, target, focus_area)
+        self.sweep()
+
+    def _warm(self, session_id, entry, target, focus_area):
+        # creating を立てたワーカーだけが下ろす（先に戻ったワーカーが作成中の印を消さない）
+        owns_creation = False
+        try:
+            cache = get_result_cache()
+            hit = cache.lookup(target, focus_area, record=False) is not None
+            similar = None if hit else cache.find_similar(target, focus_area, record=False)
+            with self._lock:
+                entry["cache_hit"] = hit
+                entry["similar"] = {"focus_area": similar["focus_area"], "similarity": similar["similarity"]} \
+                    if similar else None
+                self.stats["cache_hits"] += hit
+                self.stats["similar_hits"] += similar is not None
+                # キャッシュにある組は run を行わないので、エージェント側の準備は不要
+                if hit or entry["thread_id"] or entry.get("creating"):
+                    return
+                entry["creating"] = owns_creation = True
+            backend = get_router().best()
+            # 既定のクライアントでは get_agent の時点で認証トークンを取得する
+            project = create_client(backend)
+            agent = project.agents.get_agent(backend.agent_id)
+            thread = project.agents.threads.create()
+            with self._lock:
+                # 作成中に別のスレッドが入った・準備が回収された場合は、作ったスレッドを使わずに削除
+                orphaned = entry["thread_id"] is not None or self._entries.get(session_id) is not entry
+                if not orphaned:
+                    entry.update(backend=backend.name, project=project, agent=agent, thread_id=thread.id)
+                    self.stats["prewarmed"] += 1
+            if orphaned:
+                self._delete_thread(project, thread.id)
+        except Exception as e:
+            with self._lock:
+                entry["error"] = str(e)
+                self.stats["errors"] += 1
+        finally:
+            if owns_creation:
+                with self._lock:
+                    entry.pop("creating", None)
+
+    def status(self, session_id):
+        """{"ready", "cache_hit", "similar", "backend", "error"}（準備していなければ None）"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            future = entry["future"]
+            return {
+                "ready": future is None or future.done(),
+                "cache_hit": entry.get("cache_hit"),
+                "similar": entry.get("similar"),
+                "backend": entry.get("backend") if entry["thread_id"] else None,
+                "error": entry.get("error"),
+            }
+
+    def preferred_backend(self, session_id):
+        """事前作成したスレッドのあるバックエンド名"""
+        status = self.status(session_id)
+        return status["backend"] if status else None
+
+    def claim(self, session_id, backend_name):
+        """事前作成した (project, agent, thread_id) を引き継ぐ。バックエンドが違う・未準備なら None"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            future = entry["future"] if entry else None
+        if future is not None:
+            try:
+                future.result(timeout=CLAIM_WAIT_SEC)
+            except FutureTimeoutError:
+                return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if not entry or not entry["thread_id"] or entry.get("backend") != backend_name:
+                return None
+            claimed = (entry.pop("project"), entry.pop("agent"), entry["thread_id"])
+            entry["thread_id"] = None
+            self.stats["claimed"] += 1
+        return claimed
+
+    def sweep(self, now=None):
+        """TTL を過ぎた準備を破棄し、未使用のスレッドを削除"""
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            for session_id, entry in list(self._entries.items()):
+                future = entry["future"]
+                if now - entry["touched_at"] > self.ttl_sec and (future is None or future.done()):
+                    expired.append(self._entries.pop(session_id))
+        for entry in expired:
+            if entry["thread_id"]:
+                self._executor.submit(self._delete_thread, entry["project"], entry["thread_id"])
+        return len(expired)
+
+    def _delete_thread(self, project, thread_id):
+        try:
+            project.agents.threads.delete(thread_id)
+            with self._lock:
+                self.stats["reclaimed"] += 1
+        except Exception:
+            pass
+
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+_sweeper_thread = None
+
+
+def prewarm_enabled():
+    return get_bool_setting("PREWARM_ENABLED", True)
+
+
+def get_prewarmer():
+    """プロセス共通の事前準備を取得（PREWARM_TTL_SEC）"""
+    global _prewarmer
+    if _prewarmer is None:
+        with _prewarmer_lock:
+            if _prewarmer is None:
+                _prewarmer = Prewarmer(float(get_setting("PREWARM_TTL_SEC", DEFAULT_TTL_SEC)))
+    return _prewarmer
+
+
+def _sweep_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            get_prewarmer().sweep()
+        except Exception:
+            pass
+
+
+def start_sweeper():
+    """入力が止まったセッションの準備を定期的に回収（プロセスで1回のみ）"""
+    global _sweeper_thread
+    prewarmer = get_prewarmer()
+    with _prewarmer_lock:
+        if _sweeper_thread is None:
+            _sweeper_thread = threading.Thread(
+                target=_sweep_loop, args=(max(1.0, prewarmer.ttl_sec / 2),), name="prewarm-sweeper", daemon=True)
+            _sweeper_thread.start()
@@ -0,0 +1,184 @@
+"""段階別プロファイリング
+
+PROFILING_ENABLED またはサイドバーの切り替えで有効化する。1 回の操作（調査・スライド作成など）を
+profile_request() で囲み、その中の段階（stage()）ごとに
+
+- 経過時間・CPU 時間
+- サンプリングプロファイラ（PROFILE_SAMPLE_INTERVAL_MS 間隔）の collapsed stack
+  （flamegraph.pl や speedscope でそのままフレームグラフにできる）
+- PROFILING_MODE=cprofile の場合は最上位の段階ごとに cProfile の .prof（pstats / snakeviz で閲覧）
+
+を PROFILE_DIR（既定 profiles/）配下の操作ごとのディレクトリへ保存する。
+無効時の stage() はコンテキスト変数を 1 回参照して共有の nullcontext を返すだけで、
+プロファイラ・サンプラーは起動しない。
+"""
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from .utils import get_setting, get_bool_setting
+
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+
+_NULL_STAGE = nullcontext()
+_current = contextvars.ContextVar("profile_request", default=None)
+
+
+def profiling_enabled():
+    return get_bool_setting("PROFILING_ENABLED")
+
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]+", "_", name)
+
+
+def _frame_label(code):
+    # collapsed stack の区切り文字（; と空白）を含めない
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}".replace(";", "_").replace(" ", "_")
+
+
+class _Sampler(threading.Thread):
+    """対象スレッドのスタックを一定間隔で採取し、その時点の段階に計上する"""
+
+    def __init__(self, request, thread_id, interval_sec):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.request = request
+        self.thread_id = thread_id
+        self.interval_sec = interval_sec
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval_sec):
+            path = self.request.path or "other"
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.request.samples[path][";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ProfileRequest:
+    """1 回の操作分の計測結果"""
+
+    def __init__(self, name, directory, mode):
+        self.name = name
+        self.directory = directory
+        self.mode = mode
+        self.path = None
+        self.stages = []
+        self.samples = defaultdict(Counter)
+        self.total_ms = None
+        self._profiling = False
+
+    @contextmanager
+    def stage(self, name):
+        parent = self.path
+        path = f"{parent}/{name}" if parent else name
+        self.path = path
+        profiler = None
+        # cProfile は入れ子にできないため最上位の段階のみ
+        if self.mode == "cprofile" and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall_ms = (time.perf_counter() - wall) * 1000
+            cpu_ms = (time.thread_time() - cpu) * 1000
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                os.makedirs(self.directory, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.directory, f"{_safe_name(path)}.prof"))
+            self.path = parent
+            self.stages.append({"stage": path, "wall_ms": round(wall_ms, 1), "cpu_ms": round(cpu_ms, 1)})
+
+    def save(self):
+        """stages.json・段階ごとの .folded・全体の all.folded を書き出し、要約を返す"""
+        os.makedirs(self.directory, exist_ok=True)
+        combined = []
+        for path, stacks in self.samples.items():
+            lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+            with open(os.path.join(self.directory, f"{_safe_name(path)}.folded"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            root = path.replace("/", ";")
+            combined += [f"{root};{line}" for line in lines]
+        with open(os.path.join(self.directory, "all.folded"), "w", encoding="utf-8") as f:
+            f.write("\n".join(combined) + "\n")
+        summary = self.summary()
+        with open(os.path.join(self.directory, "stages.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "directory": self.directory,
+            "mode": self.mode,
+            "total_ms": self.total_ms,
+            "stages": [dict(stage, samples=sum(self.samples.get(stage["stage"], {}).values()))
+                       for stage in self.stages],
+        }
+
+
+def stage(name):
+    """段階を計測するコンテキストマネージャ（プロファイル中でなければ何もしない）"""
+    request = _current.get()
+    if request is None:
+        return _NULL_STAGE
+    return request.stage(name)
+
+
+def profiled(name):
+    """関数全体を 1 段階として計測するデコレータ"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_request(name, enabled=None):
+    """操作全体を囲む。有効なら ProfileRequest を、無効なら None を返し、終了時に結果を保存する"""
+    if not (profiling_enabled() if enabled is None else enabled):
+        yield None
+        return
+    directory = os.path.join(get_setting("PROFILE_DIR", DEFAULT_PROFILE_DIR),
+                             f"{datetime.now():%Y%m%d_%H%M%S_%f}_{_safe_name(name)}")
+    request = ProfileRequest(name, directory, str(get_setting("PROFILING_MODE", "sampling")).lower())
+    interval = float(get_setting("PROFILE_SAMPLE_INTERVAL_MS", DEFAULT_SAMPLE_INTERVAL_MS)) / 1000
+    sampler = _Sampler(request, threading.get_ident(), interval)
+    token = _current.set(request)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield request
+    finally:
+        sampler.stop()
+        _current.reset(token)
+        request.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        request.save()
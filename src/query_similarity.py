@@ -0,0 +1,170 @@
+"""調査観点の言い換え検出（文字 n-gram の TF-IDF・コサイン類似度）
+
+「生成AI活用状況」「生成AIの活用」「Generative AI adoption」のように同じ調査観点を別の言い方で
+入力した場合に、結果キャッシュにある同じ調査対象の調査結果を見つける。
+調査観点は NFKC・小文字化のあと同義語表で代表表記に置き換え、助詞や「状況」「取り組み」などの
+意味の薄い語と記号・空白を除いてから、文字 2〜3-gram の TF-IDF ベクトルにする。
+索引は結果キャッシュのキー（調査対象の照合キー + 調査観点）ごとに 1 文書で、調査対象ごとに分けて持つため、
+検索は同じ調査対象の文書だけと比べる（異なる調査対象の結果は返さない）。
+
+    python -m src.query_similarity [--days 7]   # 完全一致・類似一致のヒット率
+"""
+import argparse
+import math
+import re
+import unicodedata
+from collections import Counter
+
+
+DEFAULT_THRESHOLD = 0.75
+NGRAM_SIZES = (2, 3)
+
+# 調査観点によって内容が変わるセクション（類似の結果を使う場合も、これ以外は調査対象についてそのまま使える）
+FOCUS_SECTIONS = ["focus_area_analysis", "best_practices"]
+
+# 代表表記 → 言い換え。QUERY_SYNONYMS（JSON、同じ形式）で追加・上書き可能
+DEFAULT_SYNONYMS = {
+    "生成ai": ["generative ai", "generativeai", "gen ai", "genai", "ジェネレーティブai", "生成型ai"],
+    # 「利用」「導入」は「利用規制」「導入費用」のように別の調査観点にも現れるため含めない
+    "活用": ["adoption", "utilization", "usage", "利活用", "活用状況"],
+    "dx": ["digital transformation", "デジタルトランスフォーメーション", "デジタル変革"],
+    "人材育成": ["talent development", "human resource development", "人材開発", "人材教育", "人材の育成"],
+    "サステナビリティ": ["sustainability", "サスティナビリティ", "サステイナビリティ", "持続可能性"],
+    "クラウド移行": ["cloud migration", "クラウドへの移行", "クラウド化", "クラウドシフト"],
+    "業務効率化": ["operational efficiency", "業務の効率化", "業務改善", "生産性向上"],
+    "海外展開": ["global expansion", "overseas expansion", "海外進出", "グローバル展開"],
+    "マーケティング": ["marketing"],
+    "デジタル": ["digital"],
+    "新規事業": ["new business", "事業創出"],
+    "開発": ["development"],
+    "働き方改革": ["work style reform", "workstyle reform", "働き方の改革"],
+    "セキュリティ": ["security", "cybersecurity", "サイバーセキュリティ"],
+    "データ": ["data"],
+}
+
+# 置き換えのあとで取り除く、調査観点の意味をほとんど変えない語
+STOPWORDS = [
+    "の取り組み", "への取り組み", "取り組み", "取組み", "取組", "について", "に関する", "における", "状況", "現状", "進捗",
+    "施策", "推進",
+    "initiatives", "initiative", "status", "the", "of", "and", "in", "for",
+]
+
+
+def _alternation(words):
+    # 長い語から照合し、英単語は英数字の途中で一致させない（日本語との境目では一致させる）
+    parts = [rf"(?<![a-z0-9]){re.escape(word)}(?![a-z0-9])" if word.isascii() else re.escape(word)
+             for word in sorted(words, key=len, reverse=True)]
+    return re.compile("|".join(parts)) if parts else None
+
+
+class QueryNormalizer:
+    """調査観点の正規化（同義語の置き換え・不要語の除去）"""
+
+    def __init__(self, synonyms=None, stopwords=None):
+        table = {**DEFAULT_SYNONYMS, **(synonyms or {})}
+        self._canonical = {}
+        for canonical, variants in table.items():
+            for variant in variants:
+                self._canonical[self._fold(variant)] = self._fold(canonical)
+        self._synonym_re = _alternation(self._canonical)
+        self._stopword_re = _alternation(self._fold(word) for word in (STOPWORDS if stopwords is None else stopwords))
+
+    @staticmethod
+    def _fold(text):
+        return " ".join(unicodedata.normalize("NFKC", text or "").lower().split())
+
+    def normalize(self, text):
+        text = self._fold(text)
+        if self._synonym_re:
+            text = self._synonym_re.sub(lambda match: f" {self._canonical[match.group()]} ", text)
+        if self._stopword_re:
+            text = self._stopword_re.sub(" ", text)
+        # 空白・記号・助詞「の」を除く（代表表記どうしが連結した形に揃える）
+        return re.sub(r"[\W_]+|の", "", text)
+
+
+def char_ngrams(text, sizes=NGRAM_SIZES):
+    """文字 n-gram の出現回数（文字数が最小の n 未満なら全体を 1 つの gram とする）"""
+    grams = Counter()
+    for size in sizes:
+        grams.update(text[i:i + size] for i in range(len(text) - size + 1))
+    if not grams and text:
+        grams[text] = 1
+    return grams
+
+
+class QueryIndex:
+    """結果キャッシュのキーごとの調査観点 TF-IDF 索引（調査対象ごとに分割）"""
+
+    def __init__(self, synonyms=None, stopwords=None):
+        self.normalizer = QueryNormalizer(synonyms, stopwords)
+        self._docs = {}
+        self._by_target = {}
+        self._df = Counter()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key, focus_area):
+        """キャッシュキー key（"調査対象の照合キー\\t調査観点"）の調査観点を登録（登録済みなら置き換え）"""
+        self.remove(key)
+        grams = char_ngrams(self.normalizer.normalize(focus_area))
+        self._docs[key] = grams
+        self._by_target.setdefault(key.split("\t", 1)[0], set()).add(key)
+        self._df.update(grams.keys())
+
+    def remove(self, key):
+        grams = self._docs.pop(key, None)
+        if grams is None:
+            return
+        keys = self._by_target[key.split("\t", 1)[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_target[key.split("\t", 1)[0]]
+        self._df.subtract(grams.keys())
+        for gram in grams:
+            if self._df[gram] <= 0:
+                del self._df[gram]
+
+    def _vector(self, grams):
+        total = len(self._docs) + 1
+        vector = {gram: (1 + math.log(count)) * (math.log(total / (1 + self._df[gram])) + 1)
+                  for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {gram: weight / norm for gram, weight in vector.items()}
+
+    def match(self, key, focus_area, threshold=DEFAULT_THRESHOLD, limit=3):
+        """同じ調査対象の登録済みキーのうち類似度 threshold 以上のもの [(キー, 類似度)]（類似度の高い順、key 自身は除く）"""
+        candidates = self._by_target.get(key.split("\t", 1)[0])
+        if not candidates:
+            return []
+        query = self._vector(char_ngrams(self.normalizer.normalize(focus_area)))
+        scored = []
+        for candidate in candidates:
+            if candidate == key:
+                continue
+            vector = self._vector(self._docs[candidate])
+            score = sum(weight * vector.get(gram, 0.0) for gram, weight in query.items())
+            if score >= threshold:
+                scored.append((candidate, min(score, 1.0)))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+
+def main(argv=None):
+    from .result_cache import get_result_cache
+
+    parser = argparse.ArgumentParser(description="結果キャッシュの完全一致・類似一致のヒット率")
+    parser.add_argument("--days", type=float, default=7, help="集計する直近の日数")
+    args = parser.parse_args(argv)
+
+    stats = get_result_cache().request_stats(args.days)
+    print(f"要求 {stats['requests']} 件（直近 {args.days:g} 日）")
+    print(f"  完全一致のヒット       {stats['hits']:6d} 件  {stats['hit_rate']:6.1%}")
+    print(f"  類似の結果を提示       {stats['similar_offers']:6d} 件  {stats['similar_offer_rate']:6.1%}（完全一致しなかった要求に対する割合）")
+    print(f"  提示した結果を利用     {stats['similar_accepted']:6d} 件  {stats['similar_accept_rate']:6.1%}（提示に対する割合）")
+    print(f"  エージェント実行を省略 {stats['hits'] + stats['similar_accepted']:6d} 件  {stats['effective_hit_rate']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
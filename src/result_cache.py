@@ -0,0 +1,432 @@
+"""調査結果キャッシュ
+
+(調査対象, 調査観点) ごとに最新の調査結果と事前生成したスライド（HTML / PPTX）を保持する。
+本体は Blob ストアに置き、ここではハッシュと更新時刻だけを SQLite で管理する。
+要求履歴から対象の人気度を求め、人気度の区分と結果のセクションごとの鮮度期限から
+再取得の間隔を決める（ウォッチリストの事前計算は src/watchlist.py）。
+同じキーを登録し直すと前回の結果との差分を変更履歴に残し、
+描画済みのスライド断片・デッキを入力のハッシュごとに保持して、入力の変わらないスライドの再描画を省く。
+完全一致しない要求には、同じ調査対象で調査観点の言い換えにあたる結果を類似度つきで提示できる
+（src/query_similarity.py。提示と利用の有無を記録し、ヒット率に含める）。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from . import autocomplete
+from .blob_store import get_blob_store
+from .company_index import get_company_index
+from .query_similarity import DEFAULT_THRESHOLD, QueryIndex
+from .result_diff import diff_results, diff_slides
+from .utils import get_setting
+
+
+DEFAULT_CACHE_PATH = os.path.join("data", "result_cache.db")
+DEFAULT_MAX_AGE_HOURS = 24 * 7
+DEFAULT_PRUNE_INTERVAL_SEC = 3600
+POPULARITY_WINDOW_DAYS = 7
+
+# 結果のセクションごとの鮮度期限（時間）。CACHE_SECTION_TTL_HOURS（JSON）で上書き可能
+DEFAULT_SECTION_TTL_HOURS = {
+    "company_profile": 24 * 30,
+    "industry_analysis": 24 * 7,
+    "current_challenges": 24 * 7,
+    "focus_area_analysis": 72,
+    "best_practices": 24 * 14,
+    "market_trends": 24,
+}
+
+# 人気度の区分（直近 POPULARITY_WINDOW_DAYS 日の要求数で判定）と鮮度期限の倍率。
+# CACHE_POPULARITY_TIERS（JSON）で上書き可能
+DEFAULT_POPULARITY_TIERS = [
+    {"name": "hot", "min_requests": 20, "ttl_multiplier": 0.5},
+    {"name": "warm", "min_requests": 5, "ttl_multiplier": 1.0},
+    {"name": "cold", "min_requests": 0, "ttl_multiplier": 3.0},
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cached_results (
+    cache_key TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    focus_area TEXT NOT NULL,
+    result_ref TEXT NOT NULL,
+    slide_html_ref TEXT,
+    slide_pptx_ref TEXT,
+    quality_score REAL,
+    source TEXT,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache_requests (
+    cache_key TEXT NOT NULL,
+    target TEXT NOT NULL,
+    focus_area TEXT NOT NULL,
+    requested_at REAL NOT NULL,
+    hit INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_requests_key ON cache_requests(cache_key, requested_at);
+CREATE TABLE IF NOT EXISTS result_changes (
+    cache_key TEXT NOT NULL,
+    changed_at REAL NOT NULL,
+    previous_ref TEXT NOT NULL,
+    result_ref TEXT NOT NULL,
+    changes TEXT NOT NULL,
+    changed_slides TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_changes_key ON result_changes(cache_key, changed_at);
+CREATE TABLE IF NOT EXISTS similar_matches (
+    id INTEGER PRIMARY KEY,
+    cache_key TEXT NOT NULL,
+    matched_key TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    requested_at REAL NOT NULL,
+    accepted INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_similar_matches_requested ON similar_matches(requested_at);
+CREATE TABLE IF NOT EXISTS slide_fragments (
+    fragment_key TEXT PRIMARY KEY,
+    fragment_ref TEXT NOT NULL,
+    used_at REAL NOT NULL
+);
+"""
+
+
+def _json_setting(key, default):
+    value = get_setting(key)
+    if value is None:
+        return default
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def normalize_focus_area(focus_area):
+    text = unicodedata.normalize("NFKC", focus_area or "").strip().lower()
+    return "".join(text.split())
+
+
+def cache_key(target, focus_area):
+    """キャッシュキー（企業名は企業マスタの正式名称に寄せ、読みがな・ローマ字・法人格の表記ゆれも吸収する）"""
+    canonical = get_company_index().canonical_name(target)
+    if canonical == target:
+        canonical = autocomplete.get_index("target").canonical(target) or target
+    return f"{autocomplete.search_key(canonical)}\t{normalize_focus_area(focus_area)}"
+
+
+class ResultCache:
+    """調査結果キャッシュと要求履歴"""
+
+    def __init__(self, path, section_ttl_hours=None, popularity_tiers=None, max_age_hours=DEFAULT_MAX_AGE_HOURS,
+                 similarity_threshold=DEFAULT_THRESHOLD, synonyms=None):
+        self.path = path
+        self.section_ttl_hours = {**DEFAULT_SECTION_TTL_HOURS, **(section_ttl_hours or {})}
+        self.popularity_tiers = sorted(popularity_tiers or DEFAULT_POPULARITY_TIERS,
+                                       key=lambda tier: tier["min_requests"], reverse=True)
+        self.max_age_hours = max_age_hours
+        self.similarity_threshold = similarity_threshold
+        self._synonyms = synonyms
+        self._query_index = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ---- 人気度・鮮度 ----
+
+    def popularity(self, key, now=None):
+        """直近の要求数"""
+        since = (now or time.time()) - POPULARITY_WINDOW_DAYS * 86400
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_requests WHERE cache_key = ? AND requested_at >= ?", (key, since)
+            ).fetchone()[0]
+
+    def tier_for(self, requests):
+        for tier in self.popularity_tiers:
+            if requests >= tier["min_requests"]:
+                return tier
+        return self.popularity_tiers[-1]
+
+    def refresh_interval_hours(self, requests, sections=None):
+        """人気度に応じた再取得間隔（sections のうち最も短いセクション期限 × 区分の倍率）。
+
+        調査は全セクションをまとめて取り直すため、sections を省くと最も短い期限（既定では market_trends）で決まる。
+        """
+        names = sections or list(self.section_ttl_hours)
+        unknown = [name for name in names if name not in self.section_ttl_hours]
+        if unknown:
+            raise ValueError(f"未知のセクションです: {', '.join(unknown)}")
+        return min(self.section_ttl_hours[name] for name in names) * self.tier_for(requests)["ttl_multiplier"]
+
+    def stale_sections(self, entry, requests=0, now=None):
+        """鮮度期限を過ぎたセクション名の一覧"""
+        age_hours = ((now or time.time()) - entry["refreshed_at"]) / 3600
+        multiplier = self.tier_for(requests)["ttl_multiplier"]
+        return [name for name, ttl in self.section_ttl_hours.items() if age_hours > ttl * multiplier]
+
+    # ---- 参照・登録 ----
+
+    def entry(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM cached_results WHERE cache_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def _usable(self, entry, now):
+        """最大保持期間内で、結果の Blob が残っているか"""
+        return bool(entry) and (now - entry["refreshed_at"]) / 3600 <= self.max_age_hours \
+            and get_blob_store().exists(entry["result_ref"])
+
+    def lookup(self, target, focus_area, record=True, now=None):
+        """最大保持期間内のキャッシュを返す（なければ None）。record なら要求履歴に記録"""
+        now = now or time.time()
+        key = cache_key(target, focus_area)
+        entry = self.entry(key)
+        if not self._usable(entry, now):
+            entry = None
+        if record:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO cache_requests (cache_key, target, focus_area, requested_at, hit) VALUES (?, ?, ?, ?, ?)",
+                    (key, target, focus_area, now, int(entry is not None)),
+                )
+        if entry:
+            entry["age_hours"] = (now - entry["refreshed_at"]) / 3600
+            entry["stale_sections"] = self.stale_sections(entry, self.popularity(key, now), now)
+        return entry
+
+    def _similarity_index(self):
+        """調査観点の類似度索引（初回にキャッシュ済みの全キーから作り、以降は put で更新）"""
+        if self._query_index is None:
+            with self._lock:
+                if self._query_index is None:
+                    index = QueryIndex(self._synonyms)
+                    for row in self._conn.execute("SELECT cache_key, focus_area FROM cached_results"):
+                        index.add(row["cache_key"], row["focus_area"])
+                    self._query_index = index
+        return self._query_index
+
+    def find_similar(self, target, focus_area, threshold=None, record=True, now=None):
+        """同じ調査対象で調査観点の言い換えにあたるキャッシュ（類似度 threshold 以上で最も近いもの。なければ None）。
+
+        返すエントリには lookup と同じ age_hours・stale_sections に加えて similarity を付け、
+        record なら提示として記録して match_id（resolve_similar に渡す）を付ける。
+        """
+        now = now or time.time()
+        key = cache_key(target, focus_area)
+        threshold = self.similarity_threshold if threshold is None else threshold
+        index = self._similarity_index()
+        with self._lock:
+            matches = index.match(key, focus_area, threshold)
+        for matched_key, similarity in matches:
+            entry = self.entry(matched_key)
+            if not self._usable(entry, now):
+                continue
+            entry["similarity"] = similarity
+            entry["age_hours"] = (now - entry["refreshed_at"]) / 3600
+            entry["stale_sections"] = self.stale_sections(entry, self.popularity(matched_key, now), now)
+            if record:
+                with self._lock, self._conn:
+                    entry["match_id"] = self._conn.execute(
+                        "INSERT INTO similar_matches (cache_key, matched_key, similarity, requested_at) "
+                        "VALUES (?, ?, ?, ?)", (key, matched_key, similarity, now),
+                    ).lastrowid
+            return entry
+        return None
+
+    def resolve_similar(self, match_id, accepted):
+        """提示した類似の結果が使われたか（accepted）を記録"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE similar_matches SET accepted = ? WHERE id = ?", (int(bool(accepted)), match_id))
+
+    def put(self, target, focus_area, result, slide_html=None, slide_pptx=None, source="interactive", now=None):
+        """調査結果（と事前生成スライド）を Blob ストアへ保存し、キャッシュに登録（前回の結果があれば差分を記録）"""
+        store = get_blob_store()
+        now = now or time.time()
+        key = cache_key(target, focus_area)
+        result_ref = store.put(result)
+        previous = self.entry(key)
+        change = None
+        if previous and previous["result_ref"] != result_ref:
+            old = store.get(previous["result_ref"])
+            if old is not None:
+                change = (
+                    key, now, previous["result_ref"], result_ref,
+                    json.dumps(diff_results(old, result), ensure_ascii=False, default=str),
+                    json.dumps(diff_slides(old, result, previous["target"], previous["focus_area"], target, focus_area)),
+                )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cached_results (cache_key, target, focus_area, result_ref, slide_html_ref, "
+                "slide_pptx_ref, quality_score, source, refreshed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, target, focus_area, result_ref,
+                    store.put(slide_html) if slide_html is not None else None,
+                    store.put(slide_pptx) if slide_pptx is not None else None,
+                    result.get("data_quality_score"), source, now,
+                ),
+            )
+            if change:
+                self._conn.execute(
+                    "INSERT INTO result_changes (cache_key, changed_at, previous_ref, result_ref, changes, "
+                    "changed_slides) VALUES (?, ?, ?, ?, ?, ?)", change)
+            if self._query_index is not None:
+                self._query_index.add(key, focus_area)
+
+    def latest_changes(self, target, focus_area):
+        """直近の再調査で記録した差分（changes / changed_slides / result_ref など。なければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM result_changes WHERE cache_key = ? ORDER BY changed_at DESC LIMIT 1",
+                (cache_key(target, focus_area),),
+            ).fetchone()
+        if not row:
+            return None
+        return {**dict(row), "changes": json.loads(row["changes"]), "changed_slides": json.loads(row["changed_slides"])}
+
+    # ---- 描画済みスライドの断片 ----
+
+    def fragments(self, keys):
+        """入力のハッシュ → 描画済みの断片（HTML / デッキのバイト列）。Blob が消えたものは含めない"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT fragment_key, fragment_ref FROM slide_fragments WHERE fragment_key IN "
+                f"({','.join('?' * len(keys))})", keys,
+            ).fetchall()
+        store = get_blob_store()
+        found = {}
+        for row in rows:
+            value = store.get(row["fragment_ref"])
+            if value is not None:
+                found[row["fragment_key"]] = value
+        if found:
+            with self._lock, self._conn:
+                self._conn.executemany("UPDATE slide_fragments SET used_at = ? WHERE fragment_key = ?",
+                                       [(time.time(), key) for key in found])
+        return found
+
+    def save_fragments(self, fragments, now=None):
+        """描画した断片を入力のハッシュごとに登録"""
+        store = get_blob_store()
+        rows = [(key, store.put(value), now or time.time()) for key, value in fragments.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO slide_fragments (fragment_key, fragment_ref, used_at) VALUES (?, ?, ?)", rows)
+
+    def popular_pairs(self, min_requests, limit=200, now=None):
+        """直近に min_requests 回以上要求された (target, focus_area, 要求数)"""
+        since = (now or time.time()) - POPULARITY_WINDOW_DAYS * 86400
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT target, focus_area, COUNT(*) AS requests FROM cache_requests WHERE requested_at >= ? "
+                "GROUP BY cache_key HAVING requests >= ? ORDER BY requests DESC LIMIT ?",
+                (since, min_requests, limit),
+            ).fetchall()
+        return [(row["target"], row["focus_area"], row["requests"]) for row in rows]
+
+    def referenced_blobs(self):
+        """キャッシュが参照する Blob のハッシュ（Blob ストアの掃除対象から除外する）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result_ref, slide_html_ref, slide_pptx_ref FROM cached_results").fetchall()
+            rows += self._conn.execute("SELECT fragment_ref FROM slide_fragments").fetchall()
+        return {ref for row in rows for ref in row if ref}
+
+    def prune_requests(self, now=None):
+        """集計期間を過ぎた要求履歴と、最大保持期間を過ぎたキャッシュ・変更履歴・使われていない断片を削除。
+
+        削除したキャッシュの Blob は referenced_blobs から外れ、Blob ストアの掃除で回収される。
+        """
+        now = now or time.time()
+        since = now - POPULARITY_WINDOW_DAYS * 86400
+        expired = now - self.max_age_hours * 3600
+        with self._lock, self._conn:
+            evicted = [row[0] for row in self._conn.execute(
+                "SELECT cache_key FROM cached_results WHERE refreshed_at < ?", (expired,))]
+            self._conn.execute("DELETE FROM cached_results WHERE refreshed_at < ?", (expired,))
+            if self._query_index is not None:
+                for key in evicted:
+                    self._query_index.remove(key)
+            self._conn.execute("DELETE FROM cache_requests WHERE requested_at < ?", (since,))
+            self._conn.execute("DELETE FROM similar_matches WHERE requested_at < ?", (since,))
+            self._conn.execute("DELETE FROM result_changes WHERE changed_at < ?", (expired,))
+            self._conn.execute("DELETE FROM slide_fragments WHERE used_at < ?", (expired,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cached_results").fetchone()[0]
+            fragments = self._conn.execute("SELECT COUNT(*) FROM slide_fragments").fetchone()[0]
+            hits, total = self._conn.execute(
+                "SELECT COALESCE(SUM(hit), 0), COUNT(*) FROM cache_requests").fetchone()
+        return {"entries": entries, "fragments": fragments, "requests": total, "hits": hits, "hit_rate": hits / total if total else 0.0}
+
+    def request_stats(self, days=POPULARITY_WINDOW_DAYS, now=None):
+        """直近 days 日の要求数・完全一致のヒット数・類似の結果の提示数と利用数、各割合"""
+        since = (now or time.time()) - days * 86400
+        with self._lock:
+            hits, requests = self._conn.execute(
+                "SELECT COALESCE(SUM(hit), 0), COUNT(*) FROM cache_requests WHERE requested_at >= ?", (since,)
+            ).fetchone()
+            offers, accepted = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(accepted), 0) FROM similar_matches WHERE requested_at >= ?", (since,)
+            ).fetchone()
+        misses = requests - hits
+        return {
+            "requests": requests,
+            "hits": hits,
+            "hit_rate": hits / requests if requests else 0.0,
+            "similar_offers": offers,
+            "similar_offer_rate": offers / misses if misses else 0.0,
+            "similar_accepted": accepted,
+            "similar_accept_rate": accepted / offers if offers else 0.0,
+            "effective_hit_rate": (hits + accepted) / requests if requests else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_pruner_thread = None
+
+
+def get_result_cache():
+    """プロセス共通の結果キャッシュを取得（RESULT_CACHE_PATH 等）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    get_setting("RESULT_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    section_ttl_hours=_json_setting("CACHE_SECTION_TTL_HOURS", None),
+                    popularity_tiers=_json_setting("CACHE_POPULARITY_TIERS", None),
+                    max_age_hours=float(get_setting("CACHE_MAX_AGE_HOURS", DEFAULT_MAX_AGE_HOURS)),
+                    similarity_threshold=float(get_setting("QUERY_SIMILARITY_THRESHOLD", DEFAULT_THRESHOLD)),
+                    synonyms=_json_setting("QUERY_SYNONYMS", None),
+                )
+                get_blob_store().add_reference_source(_cache.referenced_blobs)
+    return _cache
+
+
+def _prune_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            get_result_cache().prune_requests()
+        except Exception:
+            pass
+
+
+def start_pruner():
+    """期限切れのキャッシュ・履歴を定期的に削除するスレッドを起動（プロセスで1回のみ）"""
+    global _pruner_thread
+    get_result_cache()
+    with _cache_lock:
+        if _pruner_thread is None:
+            interval = float(get_setting("CACHE_PRUNE_INTERVAL_SEC", DEFAULT_PRUNE_INTERVAL_SEC))
+            _pruner_thread = threading.Thread(target=_prune_loop, args=(interval,), name="cache-pruner", daemon=True)
+            _pruner_thread.start()
@@ -0,0 +1,99 @@
+"""再調査結果の差分
+
+同じ (調査対象, 調査観点) の前回の解析済み結果と新しい結果を項目単位で比較する。
+差分は結果キャッシュに履歴として記録し（src/result_cache.py）、画面の「前回からの変更」表示に使う。
+スライドは入力のハッシュで変更の有無を判定し、変わらないスライドは描画済みの断片を再利用する
+（src/slide_generator.py の SLIDE_INPUT_KEYS）。
+"""
+import re
+
+from .slide_generator import build_slide_context, changed_slides
+
+
+# 実行ごとに変わるメタ情報（内容の変更としては扱わない）
+IGNORED_KEYS = {"raw_response", "research_status", "search_count", "data_quality_score", "error_reason"}
+
+SECTION_LABELS = {
+    "company_profile": "企業基本情報",
+    "industry_analysis": "業界分析",
+    "current_challenges": "主要課題",
+    "focus_area_analysis": "調査観点の取り組み",
+    "best_practices": "先進事例",
+    "market_trends": "業界トレンド",
+    "industry_metrics": "業界メトリクス",
+    "industry_voice": "業界の声",
+}
+
+CHANGE_LABELS = {"added": "追加", "removed": "削除", "changed": "変更"}
+
+
+def _change(path, kind, old, new):
+    return {"path": path, "section": re.split(r"[.\[]", path, 1)[0], "change": kind, "old": old, "new": new}
+
+
+def _diff(old, new, path, changes):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in list(old) + [key for key in new if key not in old]:
+            child = f"{path}.{key}" if path else str(key)
+            if key not in new:
+                changes.append(_change(child, "removed", old[key], None))
+            elif key not in old:
+                changes.append(_change(child, "added", None, new[key]))
+            else:
+                _diff(old[key], new[key], child, changes)
+    elif isinstance(old, list) and isinstance(new, list):
+        for index in range(max(len(old), len(new))):
+            child = f"{path}[{index}]"
+            if index >= len(new):
+                changes.append(_change(child, "removed", old[index], None))
+            elif index >= len(old):
+                changes.append(_change(child, "added", None, new[index]))
+            else:
+                _diff(old[index], new[index], child, changes)
+    elif old != new:
+        changes.append(_change(path, "changed", old, new))
+
+
+def diff_results(old, new):
+    """解析済み結果の項目単位の差分（path / section / change / old / new の dict のリスト）"""
+    changes = []
+    _diff({k: v for k, v in (old or {}).items() if k not in IGNORED_KEYS},
+          {k: v for k, v in (new or {}).items() if k not in IGNORED_KEYS}, "", changes)
+    return changes
+
+
+def diff_slides(old, new, old_target, old_focus_area, target, focus_area):
+    """入力が変わったスライドの番号（0 始まり）"""
+    return changed_slides(build_slide_context(old or {}, old_target, old_focus_area),
+                          build_slide_context(new or {}, target, focus_area))
+
+
+def summarize_changes(changes):
+    """セクションごとの変更件数 [(セクション名, 表示名, 件数)]（結果の項目順）"""
+    counts = {}
+    for change in changes:
+        counts[change["section"]] = counts.get(change["section"], 0) + 1
+    order = list(SECTION_LABELS)
+    sections = sorted(counts, key=lambda name: order.index(name) if name in order else len(order))
+    return [(name, SECTION_LABELS.get(name, name), counts[name]) for name in sections]
+
+
+def format_path(path):
+    """差分表示用の項目名（先頭のセクション名を表示名に置き換える）"""
+    section = re.split(r"[.\[]", path, 1)[0]
+    rest = path[len(section):].lstrip(".")
+    label = SECTION_LABELS.get(section, section)
+    return f"{label} › {rest}" if rest else label
+
+
+def format_value(value, limit=80):
+    """差分表示用に値を 1 行の文字列へ"""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        text = " / ".join(f"{k}: {v}" for k, v in value.items())
+    elif isinstance(value, list):
+        text = " / ".join(map(str, value))
+    else:
+        text = str(value)
+    return text if len(text) <= limit else text[: limit - 1] + "…"
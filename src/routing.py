@@ -0,0 +1,303 @@
+"""複数の Foundry エンドポイント／エージェントへのレイテンシ考慮ルーティング
+
+AZURE_AGENT_BACKENDS（JSON）に (endpoint, agent_id) の組を複数登録し、実行ごとに最適な組へ振り分ける。
+未設定時は AZURE_AI_ENDPOINT / AZURE_AGENT_ID の 1 組のみ。
+
+    AZURE_AGENT_BACKENDS = '[{"name": "east", "endpoint": "https://...", "agent_id": "asst_...", "max_concurrency": 4}, ...]'
+
+- 組ごとに EWMA のレイテンシ・エラー率、429 の回数、実行中の件数を記録する
+- 期待待ち時間（EWMA レイテンシ × (1 + 実行中件数) ÷ 成功率）が最小の組を選ぶ
+- 429 は Retry-After（なければ指数的に延長）の間、連続エラーは一定時間その組を外す
+- 再試行可能なエラー（429・5xx・通信エラー）は別の組で実行し直す（バッチの途中でも切り替わる）
+- クライアント生成は差し替え可能（AZURE_AGENT_CLIENT_FACTORY="module:function" または set_client_factory）。
+  ローカル検証では benchmarks.fake_agent:create_fake_client で fake:// エンドポイントを使える
+"""
+import importlib
+import json
+import threading
+import time
+
+from .utils import get_setting
+
+
+EWMA_ALPHA = 0.2
+DEFAULT_BACKEND_CONCURRENCY = 4
+DEFAULT_THROTTLE_COOLDOWN_SEC = 5.0
+MAX_THROTTLE_COOLDOWN_SEC = 60.0
+# この回数連続で失敗した組は CIRCUIT_OPEN_SEC の間外す
+CIRCUIT_ERROR_THRESHOLD = 3
+CIRCUIT_OPEN_SEC = 30.0
+# 全ての組が休止中の場合に待つ上限（秒）
+MAX_COOLDOWN_WAIT_SEC = 30.0
+
+_RETRIABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class NoBackendAvailableError(RuntimeError):
+    """利用できるバックエンドがない"""
+
+
+class BackendThrottledError(RuntimeError):
+    """バックエンドが 429 相当（run の rate_limit_exceeded を含む）を返した"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.status_code = 429
+        self.retry_after = retry_after
+
+
+def status_code_of(error):
+    """例外から HTTP ステータスを取り出す（なければ None）"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_of(error):
+    """例外の Retry-After（秒）。なければ None"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retriable(error):
+    """別のバックエンドで再実行する価値のあるエラーか"""
+    status = status_code_of(error)
+    if status is not None:
+        return status in _RETRIABLE_STATUS
+    # ステータスのない例外は通信エラー（ServiceRequestError 等）とみなす
+    return isinstance(error, (ConnectionError, TimeoutError)) or \
+        type(error).__name__ in ("ServiceRequestError", "ServiceResponseError")
+
+
+class Backend:
+    """1 つの (endpoint, agent_id) と、その観測値"""
+
+    def __init__(self, name, endpoint, agent_id, max_concurrency=DEFAULT_BACKEND_CONCURRENCY):
+        self.name = name
+        self.endpoint = endpoint
+        self.agent_id = agent_id
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.ewma_latency = None
+        self.ewma_error = 0.0
+        self.inflight = 0
+        self.consecutive_errors = 0
+        self.consecutive_throttles = 0
+        self.unavailable_until = 0.0
+        self.counters = {"requests": 0, "successes": 0, "errors": 0, "throttled": 0}
+
+    def expected_latency(self, default):
+        """期待待ち時間（小さいほど優先）"""
+        latency = self.ewma_latency if self.ewma_latency is not None else default
+        return latency * (1 + self.inflight) / max(0.05, 1.0 - self.ewma_error)
+
+    def status(self, now):
+        return {
+            "name": self.name,
+            "endpoint": self.endpoint,
+            "agent_id": self.agent_id,
+            "ewma_latency_sec": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "error_rate": round(self.ewma_error, 3),
+            "inflight": self.inflight,
+            "max_concurrency": self.max_concurrency,
+            "cooldown_sec": round(max(0.0, self.unavailable_until - now), 1),
+            **self.counters,
+        }
+
+
+class BackendRouter:
+    """観測値に基づいて実行先のバックエンドを選ぶ"""
+
+    def __init__(self, backends, clock=time.monotonic):
+        if not backends:
+            raise NoBackendAvailableError("バックエンドが設定されていません（AZURE_AGENT_BACKENDS / AZURE_AI_ENDPOINT）")
+        self.backends = list(backends)
+        self._clock = clock
+        self._cond = threading.Condition()
+
+    @property
+    def total_concurrency(self):
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    def _default_latency(self):
+        # 未計測の組は計測済みの最小値とみなし、最初の数件で必ず試される
+        known = [backend.ewma_latency for backend in self.backends if backend.ewma_latency is not None]
+        return min(known) if known else 1.0
+
+    def _choose(self, candidates, prefer=None):
+        default = self._default_latency()
+        for backend in candidates:
+            if backend.name == prefer:
+                return backend
+        return min(candidates, key=lambda b: b.expected_latency(default))
+
+    def best(self):
+        """現時点で最適なバックエンド（実行中件数は加算しない。事前準備用）"""
+        with self._cond:
+            now = self._clock()
+            ready = [backend for backend in self.backends if backend.unavailable_until <= now] or self.backends
+            open_ = [backend for backend in ready if backend.inflight < backend.max_concurrency] or ready
+            return self._choose(open_)
+
+    def acquire(self, exclude=(), prefer=None):
+        """最適なバックエンドを選んで実行中件数を加算する。
+
+        prefer のバックエンドが空いていれば優先する（事前作成したスレッドを使うため）。
+        空きがなければ解放または休止明けまで待つ。全て除外済み、または休止明けが
+        MAX_COOLDOWN_WAIT_SEC より先なら None。
+        """
+        with self._cond:
+            while True:
+                now = self._clock()
+                candidates = [backend for backend in self.backends if backend.name not in exclude]
+                if not candidates:
+                    return None
+                ready = [backend for backend in candidates if backend.unavailable_until <= now]
+                open_ = [backend for backend in ready if backend.inflight < backend.max_concurrency]
+                if open_:
+                    backend = self._choose(open_, prefer)
+                    backend.inflight += 1
+                    backend.counters["requests"] += 1
+                    return backend
+                cooling = [backend.unavailable_until - now for backend in candidates if backend not in ready]
+                timeout = min(cooling) if cooling else None
+                if not ready and timeout > MAX_COOLDOWN_WAIT_SEC:
+                    return None
+                self._cond.wait(timeout)
+
+    def record_success(self, backend, latency_sec):
+        with self._cond:
+            self._cond.notify_all()
+            backend.inflight -= 1
+            backend.ewma_latency = latency_sec if backend.ewma_latency is None else \
+                EWMA_ALPHA * latency_sec + (1 - EWMA_ALPHA) * backend.ewma_latency
+            backend.ewma_error *= 1 - EWMA_ALPHA
+            backend.consecutive_errors = 0
+            backend.consecutive_throttles = 0
+            backend.counters["successes"] += 1
+
+    def record_failure(self, backend, error):
+        with self._cond:
+            self._cond.notify_all()
+            backend.inflight -= 1
+            backend.ewma_error = EWMA_ALPHA + (1 - EWMA_ALPHA) * backend.ewma_error
+            backend.counters["errors"] += 1
+            now = self._clock()
+            if status_code_of(error) == 429:
+                backend.counters["throttled"] += 1
+                backend.consecutive_throttles += 1
+                cooldown = retry_after_of(error) or min(
+                    MAX_THROTTLE_COOLDOWN_SEC,
+                    DEFAULT_THROTTLE_COOLDOWN_SEC * 2 ** (backend.consecutive_throttles - 1))
+                backend.unavailable_until = max(backend.unavailable_until, now + cooldown)
+            else:
+                backend.consecutive_errors += 1
+                if backend.consecutive_errors >= CIRCUIT_ERROR_THRESHOLD:
+                    backend.unavailable_until = max(backend.unavailable_until, now + CIRCUIT_OPEN_SEC)
+
+    def execute(self, func, max_attempts=None, prefer=None):
+        """func(backend) を最適なバックエンドで実行し (結果, backend) を返す。
+
+        再試行可能なエラーは未使用のバックエンドで実行し直す。
+        """
+        max_attempts = max_attempts or len(self.backends)
+        tried = set()
+        last_error = None
+        for _ in range(max_attempts):
+            backend = self.acquire(exclude=tried, prefer=prefer)
+            if backend is None:
+                break
+            started = self._clock()
+            try:
+                result = func(backend)
+            except Exception as e:
+                self.record_failure(backend, e)
+                if not is_retriable(e):
+                    raise
+                tried.add(backend.name)
+                last_error = e
+                continue
+            self.record_success(backend, self._clock() - started)
+            return result, backend
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailableError("全てのバックエンドが休止中です")
+
+    def status(self):
+        with self._cond:
+            now = self._clock()
+            return [backend.status(now) for backend in self.backends]
+
+
+def load_backends():
+    """設定からバックエンド一覧を読み込む"""
+    configured = get_setting("AZURE_AGENT_BACKENDS")
+    default_concurrency = int(get_setting("AGENT_BACKEND_CONCURRENCY", DEFAULT_BACKEND_CONCURRENCY))
+    if configured:
+        entries = json.loads(configured) if isinstance(configured, str) else configured
+        return [
+            Backend(entry.get("name") or f"backend{i}", entry["endpoint"], entry["agent_id"],
+                    entry.get("max_concurrency", default_concurrency))
+            for i, entry in enumerate(entries)
+        ]
+    endpoint = get_setting("AZURE_AI_ENDPOINT")
+    agent_id = get_setting("AZURE_AGENT_ID")
+    if endpoint and agent_id:
+        return [Backend("default", endpoint, agent_id, default_concurrency)]
+    return []
+
+
+def _default_client_factory(backend):
+    from azure.ai.projects import AIProjectClient
+
+    from .credentials import get_credential_manager
+
+    return AIProjectClient(credential=get_credential_manager().get_credential(), endpoint=backend.endpoint)
+
+
+_client_factory = None
+_router = None
+_router_lock = threading.Lock()
+
+
+def set_client_factory(factory):
+    """backend を受け取り AIProjectClient 互換のオブジェクトを返す関数を設定（None で既定に戻す）"""
+    global _client_factory
+    _client_factory = factory
+
+
+def create_client(backend):
+    """バックエンド用のプロジェクトクライアントを生成"""
+    factory = _client_factory
+    if factory is None:
+        spec = get_setting("AZURE_AGENT_CLIENT_FACTORY")
+        if spec:
+            module_name, _, attr = spec.partition(":")
+            factory = getattr(importlib.import_module(module_name), attr)
+        else:
+            factory = _default_client_factory
+    return factory(backend)
+
+
+def get_router():
+    """プロセス共通のルーターを取得（バックエンド未設定なら NoBackendAvailableError）"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = BackendRouter(load_backends())
+    return _router
+
+
+def backend_status():
+    """バックエンドごとの観測値（未設定なら空）"""
+    try:
+        return get_router().status()
+    except NoBackendAvailableError:
+        return []
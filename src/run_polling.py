@@ -0,0 +1,126 @@
+"""エージェント run の適応的ポーリング
+
+SDK の runs.create_and_process は 1 秒の固定間隔でポーリングするため、短い run も最大 1 秒
+余計に待つ。ここでは
+
+- 最初は短い間隔で確認し、経過とともに間隔を伸ばす（RUN_POLL_INITIAL_SEC × RUN_POLL_BACKOFF^n、上限 RUN_POLL_MAX_SEC）。
+  上限を 1 秒より長くすると長い run の確認回数は減るが、完了検知の遅れがその分増える
+- 応答の Retry-After / retry-after-ms をサーバーからの待ち時間の指定として尊重する
+- 429・一時的なエラーは待ってから再試行し、期限（RUN_TIMEOUT_SEC）を過ぎたら run をキャンセルする
+- ツール出力の提出を求められた（requires_action）run は、このアプリでは応答できないためキャンセルする
+- 状態・経過時間をポーリングのたびにコールバックへ通知する（進捗表示用）
+"""
+import time
+
+from .routing import is_retriable, retry_after_of
+from .utils import get_setting
+
+
+DEFAULT_INITIAL_INTERVAL_SEC = 0.25
+DEFAULT_MAX_INTERVAL_SEC = 1.0
+DEFAULT_BACKOFF = 1.3
+DEFAULT_RUN_TIMEOUT_SEC = 600
+
+ACTIVE_STATUSES = {"queued", "in_progress", "cancelling"}
+
+
+class RunTimeoutError(RuntimeError):
+    """run が期限内に終了しなかった（run はキャンセル済み）"""
+
+
+class RunActionRequiredError(RuntimeError):
+    """run がツール出力の提出を求めた（run はキャンセル済み）"""
+
+
+def run_status(run):
+    """RunStatus（enum）/ 文字列のどちらでも小文字の状態名を返す"""
+    status = getattr(run, "status", None)
+    return str(getattr(status, "value", status)).lower()
+
+
+def _hint_from_headers(headers):
+    """Retry-After 系ヘッダーの秒数（なければ None）"""
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name) or headers.get(name.title())
+        if value is not None:
+            try:
+                return float(value) * scale
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def _get_with_headers(runs, thread_id, run_id):
+    """runs.get を呼び、(run, Retry-After 秒) を返す。cls を解さないクライアントでは ヒントなし"""
+    def with_headers(pipeline_response, deserialized, _):
+        headers = getattr(getattr(pipeline_response, "http_response", None), "headers", None)
+        return deserialized, _hint_from_headers(headers)
+
+    result = runs.get(thread_id=thread_id, run_id=run_id, cls=with_headers)
+    return result if isinstance(result, tuple) else (result, None)
+
+
+def _cancel(runs, thread_id, run):
+    try:
+        runs.cancel(thread_id=thread_id, run_id=run.id)
+    except Exception:
+        pass
+
+
+def polling_settings():
+    return {
+        "initial_interval": float(get_setting("RUN_POLL_INITIAL_SEC", DEFAULT_INITIAL_INTERVAL_SEC)),
+        "max_interval": float(get_setting("RUN_POLL_MAX_SEC", DEFAULT_MAX_INTERVAL_SEC)),
+        "backoff": float(get_setting("RUN_POLL_BACKOFF", DEFAULT_BACKOFF)),
+        "timeout": float(get_setting("RUN_TIMEOUT_SEC", DEFAULT_RUN_TIMEOUT_SEC)),
+    }
+
+
+def wait_for_run(runs, thread_id, run, on_status=None, initial_interval=DEFAULT_INITIAL_INTERVAL_SEC,
+                 max_interval=DEFAULT_MAX_INTERVAL_SEC, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_RUN_TIMEOUT_SEC,
+                 sleep=time.sleep, clock=time.monotonic):
+    """run が終了状態になるまでポーリングして最終の run を返す。
+
+    on_status(status, elapsed_sec, polls) はポーリングのたびに呼ばれる。
+    期限を過ぎた場合は run をキャンセルして RunTimeoutError、
+    requires_action になった場合は run をキャンセルして RunActionRequiredError。
+    """
+    started = clock()
+    interval = initial_interval
+    polls = 0
+    status = run_status(run)
+    while True:
+        elapsed = clock() - started
+        if on_status:
+            on_status(status, elapsed, polls)
+        if status == "requires_action":
+            _cancel(runs, thread_id, run)
+            raise RunActionRequiredError("run がツール出力の提出を求めたため中止しました（required_action: "
+                                         f"{getattr(getattr(run, 'required_action', None), 'type', '不明')}）")
+        if status not in ACTIVE_STATUSES:
+            return run
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            _cancel(runs, thread_id, run)
+            raise RunTimeoutError(f"run が {timeout:.0f} 秒以内に完了しませんでした（最終状態: {status}）")
+        sleep(min(interval, remaining))
+        polls += 1
+        try:
+            run, hint = _get_with_headers(runs, thread_id, run.id)
+        except Exception as e:
+            if not is_retriable(e):
+                raise
+            hint = retry_after_of(e)
+        status = run_status(run)
+        interval = min(max_interval, interval * backoff)
+        if hint is not None:
+            # サーバー指定の待ち時間は上限を超えても尊重する
+            interval = max(interval, hint)
+
+
+def create_and_wait(runs, thread_id, agent_id, on_status=None, **overrides):
+    """runs.create + wait_for_run（create_and_process の置き換え）"""
+    run = runs.create(thread_id=thread_id, agent_id=agent_id)
+    return wait_for_run(runs, thread_id, run, on_status=on_status, **{**polling_settings(), **overrides})
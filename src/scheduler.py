@@ -0,0 +1,281 @@
+"""エージェント実行スケジューラ
+
+1 つの Foundry エージェントを対話利用・バッチ・バックグラウンド更新で共有するための実行枠管理。
+
+- 優先度クラス: interactive > batch > background（上位クラスの待ちがあれば常に先に割り当てる）
+- 同一クラス内ではユーザー単位のラウンドロビン（1ユーザーの大量投入が他ユーザーを待たせない）
+- 全体の同時実行数上限。うち AGENT_INTERACTIVE_RESERVE 枠は interactive 専用
+- 日次のトークン／コスト予算を実行開始前に判定（実行中の見積もり分も含めて計上）
+- キュー長・待ち時間・予算消化を metrics() で取得できる
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date
+
+from .utils import get_setting
+
+
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_INTERACTIVE_RESERVE = 1
+DEFAULT_ESTIMATED_TOKENS = 20000
+DEFAULT_COST_PER_1K_TOKENS = 0.01
+DEFAULT_QUEUE_TIMEOUT_SEC = 600
+# interactive 以外のクラスが使える日次予算の割合（残りは対話利用のために確保）
+DEFAULT_NON_INTERACTIVE_BUDGET_RATIO = 0.8
+# 待ち時間の統計に使う直近サンプル数（クラスごと）
+WAIT_SAMPLE_SIZE = 1000
+
+
+class BudgetExceededError(RuntimeError):
+    """日次のトークン／コスト予算を超えるため実行できない"""
+
+
+class SchedulerTimeoutError(TimeoutError):
+    """実行枠の待ち時間が上限を超えた"""
+
+
+def _percentile(values, ratio):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class Ticket:
+    """実行枠の要求。acquire で返り、release（またはコンテキスト終了）で枠を返す"""
+
+    def __init__(self, scheduler, user, priority, estimated_tokens, seq):
+        self.scheduler = scheduler
+        self.user = user
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens = None
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.state = "queued"
+        self.error = None
+
+    @property
+    def wait_sec(self):
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+    def record_usage(self, tokens):
+        """実際の消費トークン数を記録（未記録の場合は見積もり値で計上）"""
+        if tokens is not None:
+            self.actual_tokens = int(tokens)
+
+    def release(self):
+        self.scheduler._release(self)
+
+
+class AgentScheduler:
+    """優先度・公平性・予算付きの実行枠スケジューラ"""
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, interactive_reserve=DEFAULT_INTERACTIVE_RESERVE,
+                 daily_token_budget=0, daily_cost_budget=0.0, cost_per_1k_tokens=DEFAULT_COST_PER_1K_TOKENS,
+                 non_interactive_budget_ratio=DEFAULT_NON_INTERACTIVE_BUDGET_RATIO, today=date.today):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.interactive_reserve = min(int(interactive_reserve), self.max_concurrency - 1)
+        self.daily_token_budget = int(daily_token_budget or 0)
+        self.daily_cost_budget = float(daily_cost_budget or 0.0)
+        self.cost_per_1k_tokens = float(cost_per_1k_tokens)
+        self.non_interactive_budget_ratio = float(non_interactive_budget_ratio)
+        self._today = today
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # クラスごとに user -> deque[Ticket]。OrderedDict の順序をラウンドロビンに使う
+        self._queues = {name: OrderedDict() for name in PRIORITIES}
+        self._running = set()
+        self._day = today()
+        self._used_tokens = 0
+        self._waits = {name: deque(maxlen=WAIT_SAMPLE_SIZE) for name in PRIORITIES}
+        self._counters = {"started": 0, "completed": 0, "rejected_budget": 0, "timeouts": 0}
+
+    # ---- 予算 ----
+
+    def _token_limit(self, priority):
+        """クラスごとの日次トークン上限（トークン予算・コスト予算の厳しい方。0 は無制限）"""
+        limits = []
+        if self.daily_token_budget:
+            limits.append(self.daily_token_budget)
+        if self.daily_cost_budget and self.cost_per_1k_tokens:
+            limits.append(self.daily_cost_budget / self.cost_per_1k_tokens * 1000)
+        if not limits:
+            return None
+        limit = min(limits)
+        return limit if priority == "interactive" else limit * self.non_interactive_budget_ratio
+
+    def _committed_tokens(self):
+        """本日の消費済みトークン＋実行中の見積もり"""
+        return self._used_tokens + sum(ticket.estimated_tokens for ticket in self._running)
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used_tokens = 0
+
+    def _check_budget(self, ticket):
+        limit = self._token_limit(ticket.priority)
+        if limit is not None and self._committed_tokens() + ticket.estimated_tokens > limit:
+            self._counters["rejected_budget"] += 1
+            raise BudgetExceededError(
+                f"本日の実行予算を超えるため開始できません（{ticket.priority}: "
+                f"使用 {self._committed_tokens():,} + 見積 {ticket.estimated_tokens:,} > 上限 {int(limit):,} トークン）"
+            )
+
+    # ---- 割り当て ----
+
+    def _next_ticket(self):
+        non_interactive_open = len(self._running) < self.max_concurrency - self.interactive_reserve
+        for name in PRIORITIES:
+            if name != "interactive" and not non_interactive_open:
+                break
+            queue = self._queues[name]
+            if not queue:
+                continue
+            user, tickets = next(iter(queue.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                queue.move_to_end(user)
+            else:
+                del queue[user]
+            return ticket
+        return None
+
+    def _dispatch(self):
+        self._roll_day()
+        while len(self._running) < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            try:
+                self._check_budget(ticket)
+            except BudgetExceededError as e:
+                ticket.state, ticket.error = "rejected", e
+                continue
+            ticket.state = "running"
+            ticket.started_at = time.monotonic()
+            self._running.add(ticket)
+            self._waits[ticket.priority].append(ticket.wait_sec)
+            self._counters["started"] += 1
+        self._cond.notify_all()
+
+    def _remove_queued(self, ticket):
+        tickets = self._queues[ticket.priority].get(ticket.user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._queues[ticket.priority][ticket.user]
+
+    def acquire(self, user, priority="interactive", estimated_tokens=DEFAULT_ESTIMATED_TOKENS, timeout=None):
+        """実行枠を取得するまで待つ。予算超過なら BudgetExceededError、待ち時間超過なら SchedulerTimeoutError"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知の優先度クラスです: {priority}")
+        ticket = Ticket(self, user or "anonymous", priority, int(estimated_tokens), next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._roll_day()
+            self._check_budget(ticket)
+            self._queues[priority].setdefault(ticket.user, deque()).append(ticket)
+            self._dispatch()
+            while ticket.state == "queued":
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._remove_queued(ticket)
+                    self._counters["timeouts"] += 1
+                    raise SchedulerTimeoutError(f"実行待ちが {timeout:.0f} 秒を超えました（{priority}）")
+                self._cond.wait(remaining)
+            if ticket.state == "rejected":
+                raise ticket.error
+        return ticket
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket.state != "running":
+                return
+            ticket.state = "done"
+            self._running.discard(ticket)
+            self._roll_day()
+            self._used_tokens += ticket.actual_tokens if ticket.actual_tokens is not None else ticket.estimated_tokens
+            self._counters["completed"] += 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user, priority="interactive", estimated_tokens=DEFAULT_ESTIMATED_TOKENS, timeout=None):
+        """with scheduler.slot(user, "batch") as ticket: ... の形で実行枠を使う"""
+        ticket = self.acquire(user, priority, estimated_tokens, timeout)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    # ---- メトリクス ----
+
+    def metrics(self):
+        """キュー長・実行数・待ち時間（秒）・予算消化"""
+        with self._cond:
+            self._roll_day()
+            token_limit = self._token_limit("interactive")
+            return {
+                "running": len(self._running),
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": {name: sum(len(q) for q in queue.values()) for name, queue in self._queues.items()},
+                "queued_users": {name: len(queue) for name, queue in self._queues.items()},
+                "wait_sec": {
+                    name: {
+                        "count": len(waits),
+                        "p50": _percentile(waits, 0.5),
+                        "p95": _percentile(waits, 0.95),
+                        "max": max(waits) if waits else None,
+                    }
+                    for name, waits in self._waits.items()
+                },
+                "tokens_used_today": self._used_tokens,
+                "tokens_committed": self._committed_tokens(),
+                "token_limit_today": int(token_limit) if token_limit is not None else None,
+                "cost_used_today": round(self._used_tokens / 1000 * self.cost_per_1k_tokens, 4),
+                **self._counters,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _backend_concurrency():
+    """AGENT_MAX_CONCURRENCY 未指定時は全バックエンドの同時実行数の合計（src/routing.py）"""
+    from .routing import load_backends
+
+    backends = load_backends()
+    return sum(backend.max_concurrency for backend in backends) if backends else DEFAULT_MAX_CONCURRENCY
+
+
+def get_scheduler():
+    """プロセス共通のスケジューラを取得（設定は AGENT_MAX_CONCURRENCY 等）"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AgentScheduler(
+                    max_concurrency=int(get_setting("AGENT_MAX_CONCURRENCY", _backend_concurrency())),
+                    interactive_reserve=int(get_setting("AGENT_INTERACTIVE_RESERVE", DEFAULT_INTERACTIVE_RESERVE)),
+                    daily_token_budget=int(get_setting("DAILY_TOKEN_BUDGET", 0)),
+                    daily_cost_budget=float(get_setting("DAILY_COST_BUDGET", 0)),
+                    cost_per_1k_tokens=float(get_setting("COST_PER_1K_TOKENS", DEFAULT_COST_PER_1K_TOKENS)),
+                )
+    return _scheduler
+
+
+def estimated_tokens_per_run():
+    return int(get_setting("ESTIMATED_TOKENS_PER_RUN", DEFAULT_ESTIMATED_TOKENS))
+
+
+def queue_timeout_sec():
+    return float(get_setting("SCHEDULER_QUEUE_TIMEOUT_SEC", DEFAULT_QUEUE_TIMEOUT_SEC))
